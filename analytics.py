@@ -0,0 +1,422 @@
+"""体重历史的列式内存缓存
+
+按日期保存三列紧凑的定长数组：
+    days     array('i')  日期序数（date.toordinal()），升序
+    morning  array('d')  早晨体重，缺失为NaN
+    evening  array('d')  晚上体重，缺失为NaN
+
+每个有记录的日期只占20字节，统计、图表等只需读一次数据库，
+之后的区间最值、均值和滑动窗口都直接在数组上计算。
+任意日期区间的均值和最值由RangeIndex（前缀和+稀疏表）在O(1)时间内给出。
+本模块只依赖标准库，不访问数据库，由WeightDatabase负责加载和保持同步。
+"""
+import math
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+
+NAN = float('nan')
+
+SERIES = ('morning', 'evening')
+
+
+def to_ordinal(value):
+    """将date对象或YYYY/MM/DD字符串转换为日期序数"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = datetime.strptime(value.strip(), '%Y/%m/%d').date()
+    return value.toordinal()
+
+
+def from_ordinal(ordinal):
+    """将日期序数转换为YYYY/MM/DD字符串"""
+    return date.fromordinal(ordinal).strftime('%Y/%m/%d')
+
+
+def _present(value):
+    return not math.isnan(value)
+
+
+class RangeIndex:
+    """单列体重的前缀和与稀疏表
+
+    sums[i]/counts[i] 为前i个有效值的和与个数，区间均值只需两次相减；
+    mins[k][i]/maxs[k][i] 为从i开始2**k个元素的最值，区间最值由两个重叠的块得出。
+    缺失值在前缀和中不计入，在稀疏表中以正负无穷代替。
+    """
+
+    def __init__(self, column):
+        self.sums = array('d', [0.0])
+        self.counts = array('i', [0])
+        self.mins = [array('d')]
+        self.maxs = [array('d')]
+        for value in column:
+            self.append(value)
+
+    def __len__(self):
+        return len(self.mins[0])
+
+    def append(self, value):
+        """在末尾追加一个值，O(log n)"""
+        present = _present(value)
+        self.sums.append(self.sums[-1] + (value if present else 0.0))
+        self.counts.append(self.counts[-1] + (1 if present else 0))
+        self.mins[0].append(value if present else math.inf)
+        self.maxs[0].append(value if present else -math.inf)
+        self._update_tail()
+
+    def replace_last(self, value):
+        """替换最后一个值（例如当天的体重被修改），O(log n)"""
+        present = _present(value)
+        self.sums[-1] = self.sums[-2] + (value if present else 0.0)
+        self.counts[-1] = self.counts[-2] + (1 if present else 0)
+        self.mins[0][-1] = value if present else math.inf
+        self.maxs[0][-1] = value if present else -math.inf
+        self._update_tail()
+
+    def _update_tail(self):
+        """重新计算各层中覆盖最后一个元素的块"""
+        size = len(self)
+        level = 1
+        while (1 << level) <= size:
+            if level == len(self.mins):
+                self.mins.append(array('d'))
+                self.maxs.append(array('d'))
+            index = size - (1 << level)
+            half = 1 << (level - 1)
+            lower_mins, lower_maxs = self.mins[level - 1], self.maxs[level - 1]
+            low_value = min(lower_mins[index], lower_mins[index + half])
+            high_value = max(lower_maxs[index], lower_maxs[index + half])
+            if index < len(self.mins[level]):
+                self.mins[level][index] = low_value
+                self.maxs[level][index] = high_value
+            else:
+                self.mins[level].append(low_value)
+                self.maxs[level].append(high_value)
+            level += 1
+
+    def query(self, low, high):
+        """下标区间 [low, high) 的 (个数, 和, 最小值, 最大值)，区间为空时最值为正负无穷"""
+        if low >= high:
+            return 0, 0.0, math.inf, -math.inf
+        level = (high - low).bit_length() - 1
+        other = high - (1 << level)
+        return (
+            self.counts[high] - self.counts[low],
+            self.sums[high] - self.sums[low],
+            min(self.mins[level][low], self.mins[level][other]),
+            max(self.maxs[level][low], self.maxs[level][other]),
+        )
+
+
+class WeightColumns:
+    """按日期排列的早晨/晚上体重列"""
+
+    def __init__(self):
+        self.days = array('i')
+        self.morning = array('d')
+        self.evening = array('d')
+        # set()在后台写入线程中执行，读取方法持有同一把锁；统计方法之间会相互调用，所以用可重入锁
+        self._lock = threading.RLock()
+        # 按时间段名称缓存的RangeIndex，首次区间查询时创建
+        self._indexes = {}
+
+    @classmethod
+    def from_records(cls, records):
+        """从按日期升序的 (日期, 时间类型, 体重) 记录构建，records可以是生成器"""
+        columns = cls()
+        for date_str, weight_type, weight in records:
+            columns.set(to_ordinal(date_str), weight_type, weight)
+        return columns
+
+    @classmethod
+    def from_daily(cls, rows, exclude_flagged=False):
+        """从按日期升序的 (日期, 早晨, 晚上, 早晨是否异常, 晚上是否异常) 行构建，每天一行直接追加"""
+        columns = cls()
+        for date_str, morning, evening, morning_flagged, evening_flagged in rows:
+            if exclude_flagged:
+                morning = None if morning_flagged else morning
+                evening = None if evening_flagged else evening
+            if morning is None and evening is None:
+                continue
+            columns.days.append(to_ordinal(date_str))
+            columns.morning.append(NAN if morning is None else morning)
+            columns.evening.append(NAN if evening is None else evening)
+        return columns
+
+    def __len__(self):
+        return len(self.days)
+
+    def memory_bytes(self):
+        """三列数组占用的字节数"""
+        return sum(column.itemsize * len(column) for column in (self.days, self.morning, self.evening))
+
+    def set(self, day, weight_type, weight):
+        """写入或覆盖某天某个时间段的体重，保持日期有序"""
+        if weight_type not in SERIES:
+            return
+        day = to_ordinal(day)
+        with self._lock:
+            index = bisect_left(self.days, day)
+            appended = index == len(self.days)
+            if appended or self.days[index] != day:
+                # 新日期通常是最后一天，append的开销是常数
+                self.days.insert(index, day)
+                self.morning.insert(index, NAN)
+                self.evening.insert(index, NAN)
+            getattr(self, weight_type)[index] = float(weight)
+            self._update_indexes(index, appended)
+
+    def _update_indexes(self, index, appended):
+        """保持区间索引与数据一致：末尾的变化增量更新，其他位置的变化丢弃索引"""
+        if not self._indexes:
+            return
+        if index != len(self.days) - 1:
+            self._indexes.clear()
+            return
+        for name, range_index in self._indexes.items():
+            value = getattr(self, name)[index]
+            if appended:
+                range_index.append(value)
+            else:
+                range_index.replace_last(value)
+
+    def _range_index(self, series):
+        range_index = self._indexes.get(series)
+        if range_index is None:
+            range_index = self._indexes[series] = RangeIndex(getattr(self, series))
+        return range_index
+
+    def range_stats(self, start=None, end=None, series=SERIES):
+        """日期区间 [start, end] 内的统计，O(1)（不计日期二分查找的O(log n)）
+
+        Returns:
+            dict: count、mean、min、max，以及区间内实际的第一个和最后一个日期；
+                  区间内没有数据时返回None
+        """
+        if isinstance(series, str):
+            series = (series,)
+        with self._lock:
+            low, high = self._bounds(start, end)
+            count, total, lowest, highest = 0, 0.0, math.inf, -math.inf
+            for name in series:
+                part_count, part_total, part_min, part_max = self._range_index(name).query(low, high)
+                count += part_count
+                total += part_total
+                lowest = min(lowest, part_min)
+                highest = max(highest, part_max)
+            if not count:
+                return None
+            return {
+                'count': count,
+                'mean': total / count,
+                'min': lowest,
+                'max': highest,
+                'first_date': from_ordinal(self.days[low]),
+                'last_date': from_ordinal(self.days[high - 1]),
+            }
+
+    def _bounds(self, start=None, end=None):
+        """返回日期区间 [start, end] 对应的下标范围"""
+        low = 0 if start is None else bisect_left(self.days, to_ordinal(start))
+        high = len(self.days) if end is None else bisect_right(self.days, to_ordinal(end))
+        return low, high
+
+    def _iter_values(self, start, end, series):
+        low, high = self._bounds(start, end)
+        if isinstance(series, str):
+            series = (series,)
+        for name in series:
+            column = getattr(self, name)
+            for index in range(low, high):
+                value = column[index]
+                if _present(value):
+                    yield value
+
+    def values(self, start=None, end=None, series=SERIES):
+        """区间内的所有有效体重，series为要包含的时间段"""
+        with self._lock:
+            return list(self._iter_values(start, end, series))
+
+    def summary(self, start=None, end=None, series=SERIES):
+        """一次遍历计算区间内的 (数量, 最小值, 最大值, 平均值)，没有数据时返回None"""
+        count = 0
+        total = 0.0
+        lowest = math.inf
+        highest = -math.inf
+        with self._lock:
+            for value in self._iter_values(start, end, series):
+                count += 1
+                total += value
+                if value < lowest:
+                    lowest = value
+                if value > highest:
+                    highest = value
+        if not count:
+            return None
+        return count, lowest, highest, total / count
+
+    def minimum(self, start=None, end=None, series=SERIES):
+        summary = self.summary(start, end, series)
+        return summary[1] if summary else None
+
+    def maximum(self, start=None, end=None, series=SERIES):
+        summary = self.summary(start, end, series)
+        return summary[2] if summary else None
+
+    def mean(self, start=None, end=None, series=SERIES):
+        summary = self.summary(start, end, series)
+        return summary[3] if summary else None
+
+    def count(self, start=None, end=None, series=SERIES):
+        summary = self.summary(start, end, series)
+        return summary[0] if summary else 0
+
+    def primary(self, index):
+        """某天的代表体重：优先早晨，没有早晨记录时用晚上"""
+        value = self.morning[index]
+        if _present(value):
+            return value
+        value = self.evening[index]
+        return value if _present(value) else None
+
+    def primary_on(self, day):
+        """指定日期的代表体重，没有记录时返回None"""
+        day = to_ordinal(day)
+        with self._lock:
+            index = bisect_left(self.days, day)
+            if index == len(self.days) or self.days[index] != day:
+                return None
+            return self.primary(index)
+
+    def rolling_mean(self, window_days, series='morning'):
+        """每个日期向前window_days天（包含当天）的滑动平均
+
+        Returns:
+            array('d'): 与days等长，窗口内没有数据时为NaN
+        """
+        with self._lock:
+            column = getattr(self, series)
+            result = array('d', [NAN]) * len(self.days)
+            total = 0.0
+            count = 0
+            low = 0
+            for high, day in enumerate(self.days):
+                value = column[high]
+                if _present(value):
+                    total += value
+                    count += 1
+                while self.days[low] <= day - window_days:
+                    dropped = column[low]
+                    if _present(dropped):
+                        total -= dropped
+                        count -= 1
+                    low += 1
+                if count:
+                    result[high] = total / count
+            return result
+
+    def statistics(self):
+        """与WeightDatabase.get_weight_statistics返回格式相同的全局统计"""
+        with self._lock:
+            summary = self.summary()
+            if summary is None:
+                return None
+            _, lightest, heaviest, average = summary
+            return {
+                'initial_weight': self.primary(0),
+                'lightest_weight': lightest,
+                'heaviest_weight': heaviest,
+                'average_weight': average,
+                'weight_difference': heaviest - lightest,
+            }
+
+    def chart_data(self, days=30):
+        """与WeightDatabase.get_chart_data返回格式相同的最近days个日期的数据"""
+        morning_weights = []
+        evening_weights = []
+        labels = []
+        with self._lock:
+            for index in range(max(0, len(self.days) - days), len(self.days)):
+                value = self.primary(index)
+                if value is not None:
+                    morning_weights.append(value)
+                    labels.append(from_ordinal(self.days[index]))
+                if _present(self.evening[index]):
+                    evening_weights.append(self.evening[index])
+        return {
+            'morning_weights': morning_weights,
+            'evening_weights': evening_weights,
+            'labels': labels,
+        }
+
+
+class StreamingStats:
+    """指数加权的均值和方差，每次更新O(1)，近期的数据权重更大"""
+
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+
+    def update(self, value):
+        if self.count == 0:
+            self.mean = value
+            self.variance = 0.0
+        else:
+            diff = value - self.mean
+            increment = self.alpha * diff
+            self.mean += increment
+            self.variance = (1 - self.alpha) * (self.variance + diff * increment)
+        self.count += 1
+
+    @property
+    def sigma(self):
+        return math.sqrt(self.variance)
+
+
+class OutlierDetector:
+    """按早晨/晚上分别维护近期体重的均值和方差，判断新体重是否明显偏离
+
+    偏离超过k_sigma个标准差时视为异常。为避免体重很平稳时标准差过小而频繁误报，
+    标准差不低于min_sigma；样本少于warmup个时不做判断。
+    """
+
+    K_SIGMA = 4.0
+    MIN_SIGMA = 1.5
+    WARMUP = 5
+
+    def __init__(self, alpha=0.1, k_sigma=K_SIGMA, min_sigma=MIN_SIGMA):
+        self.k_sigma = k_sigma
+        self.min_sigma = min_sigma
+        self.stats = {name: StreamingStats(alpha) for name in SERIES}
+
+    @classmethod
+    def from_columns(cls, columns, **kwargs):
+        """按日期顺序回放WeightColumns中的历史体重"""
+        detector = cls(**kwargs)
+        for index in range(len(columns.days)):
+            for name in SERIES:
+                value = getattr(columns, name)[index]
+                if _present(value):
+                    detector.stats[name].update(value)
+        return detector
+
+    def check(self, weight_type, weight):
+        """返回异常信息 {'expected', 'sigma', 'z'}，没有异常或数据不足时返回None"""
+        stats = self.stats.get(weight_type)
+        if stats is None or stats.count < self.WARMUP:
+            return None
+        sigma = max(stats.sigma, self.min_sigma)
+        z = (weight - stats.mean) / sigma
+        if abs(z) <= self.k_sigma:
+            return None
+        return {'expected': stats.mean, 'sigma': sigma, 'z': z}
+
+    def update(self, weight_type, weight):
+        stats = self.stats.get(weight_type)
+        if stats is not None:
+            stats.update(weight)
@@ -0,0 +1,10 @@
+"""性能基准测试
+
+在仓库根目录下运行，例如：
+
+    python -m benchmarks.bench_core --years 1 10 50
+    python -m benchmarks.bench_chart --points 10 1000 100000
+    python -m benchmarks.load_test --workers 8 --duration 10
+
+结果以JSON格式写入 benchmarks/results/，可以用 benchmarks.compare 对比两次运行。
+"""
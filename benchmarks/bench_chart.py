@@ -0,0 +1,125 @@
+"""SimpleChart绘制基准测试（无界面）
+
+    python -m benchmarks.bench_chart --points 10 100 1000 10000 100000
+
+使用kivy的mock OpenGL后端，不创建窗口，只测量在Python中构建画布指令的开销：
+set_data（计算范围并绘制）和尺寸变化触发的重绘耗时，以及画布指令数和顶点数。
+GPU上传和实际光栅化不在测量范围内。
+render_png测量reports用Pillow按相同布局渲染同一组数据的耗时（不写入文件）。
+"""
+import argparse
+import os
+import random
+from collections import Counter
+
+# 必须在导入kivy之前设置
+os.environ.setdefault('KIVY_GL_BACKEND', 'mock')
+
+from benchmarks import common
+
+import main
+import reports
+
+from kivy.graphics import InstructionGroup, Line, Rectangle
+
+DEFAULT_POINTS = [10, 100, 1000, 10000, 100000]
+CHART_SIZE = (1080, 900)
+RESIZED_CHART_SIZE = (900, 700)
+
+
+def generate_series(count, seed):
+    """生成体重随机游走序列"""
+    rng = random.Random(seed)
+    weight = 180.0
+    series = []
+    for _ in range(count):
+        weight = max(90.0, weight + rng.gauss(-0.05, 0.6))
+        series.append(round(weight, 1))
+    return series
+
+
+def count_instructions(canvas):
+    """统计画布中的指令数（按类型）和顶点数"""
+    kinds = Counter()
+    vertices = 0
+    pending = list(canvas.children)
+    while pending:
+        instruction = pending.pop()
+        if isinstance(instruction, InstructionGroup) and instruction.children:
+            pending.extend(instruction.children)
+        kinds[type(instruction).__name__] += 1
+        if isinstance(instruction, Line):
+            vertices += len(instruction.points) // 2
+        elif isinstance(instruction, Rectangle):
+            vertices += 4
+    return {
+        'instructions': sum(kinds.values()),
+        'vertices': vertices,
+        'by_type': dict(sorted(kinds.items())),
+    }
+
+
+def run_size(count, repeat, seed):
+    series = generate_series(count, seed)
+    labels = [str(i + 1) for i in range(count)]
+
+    chart = main.SimpleChart()
+    chart.size = CHART_SIZE
+    chart.set_data(series, labels)
+    canvas_stats = count_instructions(chart.canvas)
+
+    sizes = [RESIZED_CHART_SIZE, CHART_SIZE]
+
+    def resize():
+        # 修改size会触发on_size，进而重绘整个图表
+        sizes.reverse()
+        chart.size = sizes[0]
+
+    cases = []
+    for name, func in [
+        ('set_data', lambda: chart.set_data(series, labels)),
+        ('draw_chart', chart.draw_chart),
+        ('on_size', resize),
+        ('render_png', lambda: reports.render_chart(series, labels, size=CHART_SIZE)),
+    ]:
+        stats = common.measure(func, repeat=repeat)
+        stats['name'] = name
+        cases.append(stats)
+
+    print(f"  {count} 点: {canvas_stats['instructions']} 条指令, {canvas_stats['vertices']} 个顶点, "
+          f"set_data {cases[0]['median_ms']:.2f} ms, on_size {cases[2]['median_ms']:.2f} ms")
+    return dict(points=count, **canvas_stats, cases=cases)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='SimpleChart无界面绘制基准测试')
+    parser.add_argument('--points', type=int, nargs='+', default=DEFAULT_POINTS)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=20240101)
+    parser.add_argument('--output', help='结果JSON路径，默认写入benchmarks/results/')
+    args = parser.parse_args(argv)
+
+    results = [run_size(count, args.repeat, args.seed) for count in args.points]
+
+    common.print_table(
+        [
+            {
+                'points': r['points'],
+                'instructions': r['instructions'],
+                'vertices': r['vertices'],
+                **{f"{c['name']}_ms": f"{c['median_ms']:.2f}" for c in r['cases']},
+            }
+            for r in results
+        ],
+        ['points', 'instructions', 'vertices', 'set_data_ms', 'draw_chart_ms', 'on_size_ms', 'render_png_ms'],
+    )
+    output = common.write_results(
+        'chart',
+        {'points': args.points, 'repeat': args.repeat, 'seed': args.seed, 'size': CHART_SIZE},
+        results, args.output,
+    )
+    print(f"结果已写入 {output}")
+
+
+if __name__ == '__main__':
+    main_cli()
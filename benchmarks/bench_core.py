@@ -0,0 +1,264 @@
+"""WeightDatabase、日期函数和导入导出的基准测试
+
+    python -m benchmarks.bench_core --years 1 10 50 --repeat 5
+
+对每个数据规模生成一个合成数据库，测量WeightDatabase的每个公开方法、
+format_date/parse_date以及Excel和备份格式导出/导入流程的耗时和Python堆内存峰值，
+并记录两种格式导出文件的大小。
+"""
+import argparse
+import csv
+import inspect
+import itertools
+import os
+import shutil
+import tempfile
+import types
+from datetime import date, timedelta
+
+from benchmarks import common
+from benchmarks import datagen
+
+import main
+
+
+def _future_dates():
+    """为插入测试生成不与合成数据重叠的日期"""
+    for offset in itertools.count(1):
+        yield (datagen.END_DATE + timedelta(days=offset)).strftime('%Y/%m/%d')
+
+
+def database_cases(db, work_dir):
+    """返回 [(名称, 无参函数)]，名称以被测方法名开头"""
+    new_dates = _future_dates()
+    last_date = datagen.END_DATE.strftime('%Y/%m/%d')
+    first_page = db.get_records_page(None, 50)
+    middle_records = db.get_records_page(None, 10000)
+    middle_cursor = middle_records[len(middle_records) // 2] if middle_records else None
+    diary_page = db.get_diary_page(None, 20)
+    diary_cursor = diary_page[-1] if diary_page else None
+    # 归档分界日期为合成数据最后一天的一年前
+    archive_keep_days = max(1, (date.today() - datagen.END_DATE).days + 365)
+    import_payload = {
+        'weight_records': db.get_all_records(),
+        'diary_entries': db.get_all_diary_entries(),
+    }
+
+    def snapshot_reads():
+        with db.read_snapshot():
+            db.get_weight_statistics()
+            db.get_chart_data(30)
+
+    def reload_analytics():
+        db._analytics = None
+        db.get_analytics()
+
+    def get_connection():
+        db.get_connection().close()
+
+    def resolve_export_dir():
+        db.invalidate_export_dir()
+        db.get_export_dir()
+
+    return [
+        ('get_db_path', db.get_db_path),
+        ('get_export_path', lambda: db.get_export_path('weight_data_export.xlsx')),
+        ('get_export_dir[cached]', db.get_export_dir),
+        ('invalidate_export_dir', db.invalidate_export_dir),
+        ('get_export_dir[resolve]', resolve_export_dir),
+        ('set_export_dir', lambda: db.set_export_dir('')),
+        ('init_database', db.init_database),
+        ('get_connection', get_connection),
+        ('read_snapshot[stats+chart]', snapshot_reads),
+        ('add_weight_record[update]', lambda: db.add_weight_record(last_date, 'morning', 150.0)),
+        ('add_weight_record[insert]', lambda: db.add_weight_record(next(new_dates), 'morning', 150.0)),
+        ('add_record', lambda: db.add_record(last_date, 'evening', 151.0)),
+        ('add_diary_entry', lambda: db.add_diary_entry(last_date, '燕麦牛奶', '坚持就是胜利')),
+        ('get_today_diary_entry', db.get_today_diary_entry),
+        ('get_recent_records', lambda: db.get_recent_records(7)),
+        ('get_records_page[first]', lambda: db.get_records_page(None, 50)),
+        ('get_records_page[middle]', lambda: db.get_records_page(middle_cursor, 50)),
+        ('get_all_records', db.get_all_records),
+        ('get_recent_diary_entries', lambda: db.get_recent_diary_entries(10)),
+        ('get_diary_page[first]', lambda: db.get_diary_page(None, 20)),
+        ('get_diary_page[second]', lambda: db.get_diary_page(diary_cursor, 20)),
+        ('search_diary[fts]', lambda: db.search_diary('鸡胸肉沙拉', 20)),
+        ('search_diary[like]', lambda: db.search_diary('玉米', 20)),
+        ('get_all_diary_entries', db.get_all_diary_entries),
+        ('iter_records[all]', lambda: sum(1 for _ in db.iter_records())),
+        ('iter_records[1y]', lambda: sum(1 for _ in db.iter_records(since=date(2024, 1, 1)))),
+        ('iter_daily_weights[all]', lambda: sum(1 for _ in db.iter_daily_weights())),
+        ('iter_daily_weights[1y]', lambda: sum(1 for _ in db.iter_daily_weights(since=date(2024, 1, 1)))),
+        ('iter_monthly_summary', lambda: sum(1 for _ in db.iter_monthly_summary())),
+        ('iter_diary_entries[all]', lambda: sum(1 for _ in db.iter_diary_entries())),
+        ('iter_table_rows[weight_records]', lambda: sum(1 for _ in db.iter_table_rows('weight_records'))),
+        ('get_export_summary', db.get_export_summary),
+        ('get_generation', db.get_generation),
+        ('get_import_ledger', db.get_import_ledger),
+        ('run_maintenance', db.run_maintenance),
+        ('get_db_stats', db.get_db_stats),
+        ('get_analytics[cached]', db.get_analytics),
+        ('get_analytics[reload]', reload_analytics),
+        ('get_weight_statistics', db.get_weight_statistics),
+        ('get_rollups[week]', lambda: db.get_rollups('week')),
+        ('get_rollups[month]', lambda: db.get_rollups('month')),
+        ('get_rollup_chart_data[week]', lambda: db.get_rollup_chart_data('week')),
+        ('rebuild_rollups', db.rebuild_rollups),
+        ('range_stats[week]', lambda: db.range_stats(date(2024, 12, 25), datagen.END_DATE)),
+        ('range_stats[all]', db.range_stats),
+        ('get_forecast', lambda: db.get_forecast(120.0)),
+        ('check_weight', lambda: db.check_weight('morning', 150.0)),
+        ('set_exclude_flagged', lambda: db.set_exclude_flagged(False)),
+        ('get_chart_data[30]', lambda: db.get_chart_data(30)),
+        ('get_chart_data[all]', lambda: db.get_chart_data(365 * 100)),
+        ('import_data', lambda: db.import_data(import_payload)),
+        # 以下用例在归档后运行：主库只保留最后一年，读取时合并冷热两层
+        ('archive_old_records', lambda: db.archive_old_records(archive_keep_days)),
+        ('get_archive_info', db.get_archive_info),
+        ('get_records_page[first,archived]', lambda: db.get_records_page(None, 50)),
+        ('get_records_page[middle,archived]', lambda: db.get_records_page(middle_cursor, 50)),
+        ('iter_records[all,archived]', lambda: sum(1 for _ in db.iter_records())),
+        ('search_diary[fts,archived]', lambda: db.search_diary('鸡胸肉沙拉', 20)),
+        ('get_export_summary[archived]', db.get_export_summary),
+    ]
+
+
+DATE_CASES = [
+    ('format_date[date]', lambda: main.format_date(date(2024, 1, 1))),
+    ('format_date[iso]', lambda: main.format_date('2024-01-01')),
+    ('format_date[excel]', lambda: main.format_date('45292')),
+    ('parse_date[slash]', lambda: main.parse_date('2024/01/01')),
+    ('parse_date[dmy]', lambda: main.parse_date('01.01.2024')),
+    ('parse_date[excel]', lambda: main.parse_date('45292')),
+]
+
+
+def pipeline_cases(db, work_dir):
+    backup_path = os.path.join(work_dir, 'weight_data_export' + main.BACKUP_EXTENSION)
+    main.export_backup(db, backup_path)
+
+    def backup_round_trip():
+        _, rows = main.open_backup(backup_path)
+        db.restore_rows(rows)
+
+    cases = [
+        ('export_backup', lambda: main.export_backup(db, backup_path)),
+        ('open_backup', lambda: sum(1 for _ in main.open_backup(backup_path)[1])),
+        ('restore_rows[read+write]', backup_round_trip),
+    ]
+
+    csv_path = os.path.join(work_dir, 'weights.csv')
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Date', 'Time', 'Weight(kg)'])
+        for date_str, weight_type, weight in db.iter_records():
+            writer.writerow([date_str.replace('/', '-'), '07:30' if weight_type == 'morning' else '21:00',
+                             round(weight / 2, 2)])
+
+    csv_fingerprint = main.file_fingerprint(csv_path)
+    db.import_rows(main.importers.read_rows(csv_path)[1], replace=False, source=csv_fingerprint)
+
+    cases += [
+        ('file_fingerprint[csv]', lambda: main.file_fingerprint(csv_path)),
+        ('check_import_file', lambda: db.check_import_file(csv_path)),
+        ('record_export', lambda: db.record_export(csv_path, db.get_generation(), 0, 0)),
+        ('detect_format[csv]', lambda: main.importers.detect_format(csv_path)),
+        ('read_rows[csv]', lambda: sum(1 for _ in main.importers.read_rows(csv_path)[1])),
+        ('import_rows[csv,merge]', lambda: db.import_rows(main.importers.read_rows(csv_path)[1], replace=False)),
+    ]
+
+    if not main.openpyxl_available:
+        return cases, 'openpyxl未安装，跳过Excel导入导出'
+
+    export_path = os.path.join(work_dir, 'weight_data_export.xlsx')
+    main.export_workbook(db, export_path)
+
+    return cases + [
+        ('export_workbook', lambda: main.export_workbook(db, export_path)),
+        ('read_rows[xlsx]', lambda: sum(1 for _ in main.importers.read_rows(export_path)[1])),
+        ('import_rows[xlsx,replace]', lambda: db.import_rows(main.importers.read_rows(export_path)[1])),
+    ], None
+
+
+def export_file_sizes(work_dir):
+    """各格式导出文件的大小（字节），用于比较Excel和备份格式"""
+    sizes = {}
+    for file_format, filename in main.EXPORT_FILENAMES.items():
+        path = os.path.join(work_dir, filename)
+        if os.path.exists(path):
+            sizes[file_format] = os.path.getsize(path)
+    return sizes
+
+
+def uncovered_methods(case_names):
+    """列出没有被任何用例覆盖的WeightDatabase公开方法"""
+    covered = {name.split('[')[0] for name in case_names}
+    public = {
+        name for name, member in inspect.getmembers(main.WeightDatabase)
+        if not name.startswith('_') and callable(member)
+    }
+    return sorted(public - covered)
+
+
+def run_size(years, repeat, seed):
+    work_dir = tempfile.mkdtemp(prefix=f'weight_bench_{years}y_')
+    try:
+        db_path = os.path.join(work_dir, 'weight_data.db')
+        weight_count, diary_count = datagen.create_database(db_path, years, seed)
+        app_stub = types.SimpleNamespace(user_data_dir=work_dir)
+        db = main.WeightDatabase(app_stub, db_path=db_path)
+
+        results = []
+        cases = [('database', case) for case in database_cases(db, work_dir)]
+        cases += [('date', case) for case in DATE_CASES]
+        pipelines, skipped = pipeline_cases(db, work_dir)
+        cases += [('pipeline', case) for case in pipelines]
+
+        for group, (name, func) in cases:
+            stats = common.measure(func, repeat=repeat)
+            stats.update({'group': group, 'name': name})
+            results.append(stats)
+            print(f"  {years}y {name}: {stats['median_ms']:.3f} ms, 峰值 {stats['peak_kb']:.1f} KB")
+
+        file_sizes = export_file_sizes(work_dir)
+        for file_format, size in file_sizes.items():
+            print(f"  {years}y 导出文件[{file_format}]: {size / 1024:.1f} KB")
+
+        return {
+            'years': years,
+            'weight_records': weight_count,
+            'diary_entries': diary_count,
+            'db_size_bytes': os.path.getsize(db_path),
+            'export_file_sizes': file_sizes,
+            'skipped': skipped,
+            'uncovered_methods': uncovered_methods(name for _, (name, _) in cases),
+            'cases': results,
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='WeightDatabase和导入导出基准测试')
+    parser.add_argument('--years', type=float, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=datagen.DEFAULT_SEED)
+    parser.add_argument('--output', help='结果JSON路径，默认写入benchmarks/results/')
+    args = parser.parse_args(argv)
+
+    sizes = []
+    for years in args.years:
+        print(f"数据规模: {years} 年")
+        size_result = run_size(years, args.repeat, args.seed)
+        if size_result['uncovered_methods']:
+            print(f"  警告: 以下方法没有基准用例: {', '.join(size_result['uncovered_methods'])}")
+        sizes.append(size_result)
+
+    output = common.write_results(
+        'core', {'years': args.years, 'repeat': args.repeat, 'seed': args.seed}, sizes, args.output
+    )
+    print(f"结果已写入 {output}")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,151 @@
+"""文件夹批量导入的并行扩展性基准测试
+
+    python -m benchmarks.bench_import --files 8 --years 2 --workers 1 2 4 8
+
+生成files个导入文件（每个文件包含years年的体重记录和日记，各文件的日期互不重叠），
+对每个工作进程数分别导入到新建的空数据库，输出总耗时、每秒导入的记录数和相对单进程的加速比。
+读取和校验在进程池中并行，数据库写入始终只有一个写入者，加速比受写入部分的耗时限制。
+"""
+import argparse
+import csv
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks import common
+from benchmarks import datagen
+
+import main
+
+DEFAULT_WORKERS = [1, 2, 4, 8]
+WEIGHT_TYPE_NAMES = {'morning': '早晨', 'evening': '晚上'}
+
+
+def _shift(date_str, years):
+    """把日期向前平移years年，使各文件的日期互不重叠"""
+    day = datetime.strptime(date_str, '%Y/%m/%d').date()
+    return (day - timedelta(days=int(round(years * 365.25)))).strftime('%Y/%m/%d')
+
+
+def generate_files(work_dir, files, years, file_format, seed):
+    """生成导入文件，返回 (文件路径列表, 体重记录总数, 日记总数)"""
+    from openpyxl import Workbook
+
+    paths = []
+    weight_count = diary_count = 0
+    for index in range(files):
+        offset = index * years
+        weights = [
+            (_shift(day, offset), WEIGHT_TYPE_NAMES[weight_type], weight)
+            for day, weight_type, weight in datagen.generate_weight_rows(years, seed + index)
+        ]
+        diary = [
+            (_shift(day, offset), food, thoughts)
+            for day, food, thoughts in datagen.generate_diary_rows(years, seed + index)
+        ]
+        weight_count += len(weights)
+        diary_count += len(diary)
+
+        path = os.path.join(work_dir, f"import_{index:03d}.{file_format}")
+        if file_format == 'xlsx':
+            workbook = Workbook(write_only=True)
+            for title, headers, rows in (
+                ('体重记录', main.WEIGHT_SHEET_COLUMNS, weights),
+                ('减肥日记', main.DIARY_SHEET_COLUMNS, diary),
+            ):
+                worksheet = workbook.create_sheet(title)
+                worksheet.append(headers)
+                for row in rows:
+                    worksheet.append(row)
+            workbook.save(path)
+        else:
+            # CSV只能包含一种表，这里只写体重记录
+            diary_count -= len(diary)
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(main.WEIGHT_SHEET_COLUMNS)
+                writer.writerows(weights)
+        paths.append(path)
+    return paths, weight_count, diary_count
+
+
+def run_workers(work_dir, workers, repeat):
+    """用指定的工作进程数导入整个文件夹repeat次，每次导入到新建的空数据库"""
+    timings = []
+    report = None
+    for attempt in range(repeat):
+        db_path = os.path.join(work_dir, f"bench_{workers}_{attempt}.db")
+        db = main.WeightDatabase(db_path=db_path)
+        start = time.perf_counter()
+        report = main.import_folder(db, os.path.join(work_dir, 'files'), max_workers=workers)
+        timings.append(time.perf_counter() - start)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    seconds = min(timings)
+    rows = report['weight_count'] + report['diary_count']
+    failed = [item['path'] for item in report['files'] if item['status'] != 'imported']
+    print(f"  {workers} 个进程: {seconds * 1000.0:.0f} ms, {rows / seconds:.0f} 条/秒"
+          + (f", {len(failed)} 个文件失败" if failed else ""))
+    return {
+        'workers': workers,
+        'min_ms': seconds * 1000.0,
+        'timings_ms': [t * 1000.0 for t in timings],
+        'rows': rows,
+        'rows_per_sec': rows / seconds,
+        'failed_files': len(failed),
+    }
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='文件夹批量导入并行扩展性基准测试')
+    parser.add_argument('--files', type=int, default=8)
+    parser.add_argument('--years', type=float, default=2, help='每个文件包含的年数')
+    parser.add_argument('--format', choices=['xlsx', 'csv'], default='xlsx')
+    parser.add_argument('--workers', type=int, nargs='+', default=DEFAULT_WORKERS)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=datagen.DEFAULT_SEED)
+    parser.add_argument('--output', help='结果JSON路径，默认写入benchmarks/results/')
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix='weight_import_')
+    try:
+        files_dir = os.path.join(work_dir, 'files')
+        os.makedirs(files_dir)
+        paths, weight_count, diary_count = generate_files(
+            files_dir, args.files, args.years, args.format, args.seed
+        )
+        print(f"{len(paths)} 个{args.format}文件: {weight_count} 条体重记录, {diary_count} 条日记, "
+              f"CPU核数 {os.cpu_count()}")
+        results = [run_workers(work_dir, workers, args.repeat) for workers in args.workers]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = results[0]['min_ms']
+    for result in results:
+        result['speedup'] = baseline / result['min_ms']
+
+    common.print_table(
+        [
+            {
+                'workers': r['workers'],
+                'min_ms': f"{r['min_ms']:.0f}",
+                'rows/s': f"{r['rows_per_sec']:.0f}",
+                'speedup': f"{r['speedup']:.2f}x",
+            }
+            for r in results
+        ],
+        ['workers', 'min_ms', 'rows/s', 'speedup'],
+    )
+
+    params = {key: value for key, value in vars(args).items() if key != 'output'}
+    params['cpu_count'] = os.cpu_count()
+    output = common.write_results('import', params, results, args.output)
+    print(f"结果已写入 {output}")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,105 @@
+"""基准测试公共工具：无界面运行环境、计时、内存测量和结果输出
+
+必须在导入kivy或main之前导入本模块。
+"""
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# 无界面运行：不解析命令行参数，不输出kivy日志
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+os.environ.setdefault('KIVY_NO_FILELOG', '1')
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def measure(func, repeat=5, warmup=1, track_memory=True):
+    """多次调用func，返回耗时统计（毫秒）和Python堆内存峰值（KB）
+
+    内存峰值通过tracemalloc在单独的一次调用中测量，不影响计时。
+    只统计Python对象的分配，SQLite等C扩展内部的内存不计入。
+    """
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000.0)
+
+    result = {
+        'repeat': repeat,
+        'min_ms': min(timings),
+        'median_ms': statistics.median(timings),
+        'mean_ms': statistics.mean(timings),
+        'max_ms': max(timings),
+    }
+
+    if track_memory:
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        result['peak_kb'] = peak / 1024.0
+
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'git_commit': git_commit(),
+    }
+
+
+def write_results(suite, params, results, output=None):
+    """将结果写入JSON文件，返回文件路径"""
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{suite}-{stamp}.json")
+
+    data = {
+        'suite': suite,
+        'created_at': time.strftime('%Y/%m/%d %H:%M:%S'),
+        'environment': environment(),
+        'params': params,
+        'results': results,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return output
+
+
+def print_table(rows, columns):
+    """以对齐的文本表格打印结果"""
+    widths = [max([len(str(col))] + [len(str(row.get(col, ''))) for row in rows]) for col in columns]
+    print("  ".join(str(col).ljust(width) for col, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row.get(col, '')).ljust(width) for col, width in zip(columns, widths)))
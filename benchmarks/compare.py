@@ -0,0 +1,54 @@
+"""对比两次基准测试的结果
+
+    python -m benchmarks.compare benchmarks/results/core-旧.json benchmarks/results/core-新.json
+
+按用例名称匹配，输出中位数耗时及新旧比值（比值小于1表示变快）。
+"""
+import argparse
+import json
+
+from benchmarks import common
+
+
+def _index(data):
+    """将结果展开为 {(规模, 用例名): 结果}"""
+    indexed = {}
+    for entry in data['results']:
+        scale = entry.get('years', entry.get('points', entry.get('label', '')))
+        for case in entry.get('cases', []):
+            indexed[(str(scale), case['name'])] = case
+        # 压力测试的结果按操作名记录
+        for name, case in entry.get('operations', {}).items():
+            indexed[(str(scale), name)] = case
+    return indexed
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='对比两次基准测试结果')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--metric', default='median_ms')
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = _index(json.load(f))
+    with open(args.candidate, encoding='utf-8') as f:
+        candidate = _index(json.load(f))
+
+    rows = []
+    for key in sorted(set(baseline) | set(candidate)):
+        old = baseline.get(key, {}).get(args.metric)
+        new = candidate.get(key, {}).get(args.metric)
+        ratio = f"{new / old:.2f}" if old and new is not None else '-'
+        rows.append({
+            'scale': key[0],
+            'case': key[1],
+            'baseline': f"{old:.3f}" if old is not None else '-',
+            'candidate': f"{new:.3f}" if new is not None else '-',
+            'ratio': ratio,
+        })
+    common.print_table(rows, ['scale', 'case', 'baseline', 'candidate', 'ratio'])
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,107 @@
+"""可复现的合成数据生成器
+
+按给定的年数生成每天早晚两次的体重记录和日记，相同的种子总是生成相同的数据。
+结束日期固定，保证不同日期运行的结果一致。
+
+    python -m benchmarks.datagen --years 10 --output /tmp/weight_10y.db
+"""
+import argparse
+import os
+import random
+import sqlite3
+from datetime import date, timedelta
+
+from benchmarks import common  # noqa: F401  必须先于main导入
+
+DEFAULT_SEED = 20240101
+END_DATE = date(2024, 12, 31)
+
+# 每天缺少某次体重记录的概率
+MISSING_RATE = 0.05
+# 某天写了日记的概率
+DIARY_RATE = 0.8
+
+FOODS = [
+    '燕麦牛奶', '全麦面包', '水煮蛋', '鸡胸肉沙拉', '糙米饭', '清炒西兰花', '番茄炒蛋',
+    '三文鱼', '红薯', '玉米', '酸奶', '苹果', '香蕉', '豆腐汤', '蒸鱼', '牛肉面', '饺子',
+]
+THOUGHTS = [
+    '今天跑步五公里，感觉不错', '晚上有点饿，忍住了没吃零食', '体重下降了，很开心',
+    '聚餐吃多了，明天要控制', '坚持就是胜利', '睡眠不足，状态一般', '游泳一小时',
+    '平台期，需要调整饮食', '喝水两升', '走了一万步',
+]
+
+
+def _dates(years):
+    days = int(round(years * 365.25))
+    start = END_DATE - timedelta(days=days - 1)
+    for offset in range(days):
+        yield start + timedelta(days=offset)
+
+
+def generate_weight_rows(years, seed=DEFAULT_SEED):
+    """生成 (日期, 时间类型, 体重) 记录，体重为带噪声的缓慢下降的随机游走"""
+    rng = random.Random(seed)
+    weight = 180.0
+    for day in _dates(years):
+        weight += rng.gauss(-0.02, 0.3)
+        weight = min(max(weight, 90.0), 260.0)
+        date_str = day.strftime('%Y/%m/%d')
+        if rng.random() >= MISSING_RATE:
+            yield date_str, 'morning', round(weight + rng.gauss(0, 0.4), 1)
+        if rng.random() >= MISSING_RATE:
+            yield date_str, 'evening', round(weight + 1.2 + rng.gauss(0, 0.5), 1)
+
+
+def generate_diary_rows(years, seed=DEFAULT_SEED):
+    """生成 (日期, 饮食记录, 减肥心得) 日记"""
+    rng = random.Random(seed + 1)
+    for day in _dates(years):
+        if rng.random() >= DIARY_RATE:
+            continue
+        food = '，'.join(rng.sample(FOODS, rng.randint(2, 4)))
+        thoughts = '。'.join(rng.sample(THOUGHTS, rng.randint(1, 3)))
+        yield day.strftime('%Y/%m/%d'), food, thoughts
+
+
+def create_database(db_path, years, seed=DEFAULT_SEED):
+    """生成一个包含合成数据的数据库文件，返回 (体重记录数, 日记数)"""
+    import main
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    # 通过WeightDatabase建表，保证索引和触发器与应用一致
+    db = main.WeightDatabase(db_path=db_path)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        weight_rows = list(generate_weight_rows(years, seed))
+        diary_rows = list(generate_diary_rows(years, seed))
+        conn.executemany(
+            'INSERT INTO weight_records (date, weight_type, weight) VALUES (?, ?, ?)', weight_rows
+        )
+        conn.executemany(
+            'INSERT INTO diary_entries (date, food, thoughts) VALUES (?, ?, ?)', diary_rows
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    db.rebuild_rollups()
+    return len(weight_rows), len(diary_rows)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='生成合成的体重数据库')
+    parser.add_argument('--years', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--output', required=True, help='数据库文件路径')
+    args = parser.parse_args(argv)
+
+    weight_count, diary_count = create_database(args.output, args.years, args.seed)
+    print(f"{args.output}: {weight_count} 条体重记录, {diary_count} 条日记")
+
+
+if __name__ == '__main__':
+    main_cli()
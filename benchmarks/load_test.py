@@ -0,0 +1,136 @@
+"""多写入者并发压力测试
+
+    python -m benchmarks.load_test --workers 8 --mode process --duration 10
+
+多个线程或进程同时对同一个数据库文件混合执行 add_weight_record 和
+get_chart_data，模拟应用与同步、维护脚本同时运行的情况，
+输出吞吐量、各操作的p50/p99延迟和失败次数。
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+
+from benchmarks import common
+from benchmarks import datagen
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_worker(worker_id, db_path, duration, write_ratio, busy_timeout, write_retries, seed):
+    """在指定时间内循环执行混合读写，返回 {操作: {'latencies': [...], 'failures': n}}"""
+    import main
+
+    rng = random.Random(seed + worker_id)
+    db = main.WeightDatabase(db_path=db_path, busy_timeout=busy_timeout, write_retries=write_retries)
+    results = {
+        'add_weight_record': {'latencies': [], 'failures': 0},
+        'get_chart_data': {'latencies': [], 'failures': 0},
+    }
+
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        if rng.random() < write_ratio:
+            op = 'add_weight_record'
+            day = datagen.END_DATE - timedelta(days=rng.randint(0, 365))
+            start = time.perf_counter()
+            ok = db.add_weight_record(
+                day.strftime('%Y/%m/%d'), rng.choice(['morning', 'evening']), round(rng.uniform(140, 160), 1)
+            )
+        else:
+            op = 'get_chart_data'
+            start = time.perf_counter()
+            # 数据库中预置了数据，返回空结果说明读取失败
+            ok = bool(db.get_chart_data(30)['labels'])
+        results[op]['latencies'].append((time.perf_counter() - start) * 1000.0)
+        if not ok:
+            results[op]['failures'] += 1
+    return results
+
+
+def summarize(worker_results, elapsed):
+    summary = {}
+    for op in ('add_weight_record', 'get_chart_data'):
+        latencies = sorted(l for r in worker_results for l in r[op]['latencies'])
+        failures = sum(r[op]['failures'] for r in worker_results)
+        summary[op] = {
+            'count': len(latencies),
+            'failures': failures,
+            'throughput_ops': len(latencies) / elapsed if elapsed else 0.0,
+            'p50_ms': _percentile(latencies, 0.50),
+            'p99_ms': _percentile(latencies, 0.99),
+            'mean_ms': statistics.mean(latencies) if latencies else 0.0,
+            'max_ms': latencies[-1] if latencies else 0.0,
+        }
+    return summary
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='多写入者并发压力测试')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--mode', choices=['thread', 'process'], default='process')
+    parser.add_argument('--duration', type=float, default=10.0, help='每个写入者运行的秒数')
+    parser.add_argument('--write-ratio', type=float, default=0.5, help='写操作占比')
+    parser.add_argument('--years', type=float, default=1, help='预置数据的年数')
+    parser.add_argument('--busy-timeout', type=float, default=None, help='默认使用WeightDatabase.BUSY_TIMEOUT')
+    parser.add_argument('--write-retries', type=int, default=None, help='默认使用WeightDatabase.WRITE_RETRIES')
+    parser.add_argument('--seed', type=int, default=datagen.DEFAULT_SEED)
+    parser.add_argument('--output', help='结果JSON路径，默认写入benchmarks/results/')
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix='weight_load_')
+    try:
+        db_path = os.path.join(work_dir, 'weight_data.db')
+        datagen.create_database(db_path, args.years, args.seed)
+
+        executor_class = ProcessPoolExecutor if args.mode == 'process' else ThreadPoolExecutor
+        start = time.perf_counter()
+        with executor_class(max_workers=args.workers) as executor:
+            futures = [
+                executor.submit(
+                    run_worker, worker_id, db_path, args.duration, args.write_ratio,
+                    args.busy_timeout, args.write_retries, args.seed,
+                )
+                for worker_id in range(args.workers)
+            ]
+            worker_results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    summary = summarize(worker_results, elapsed)
+    common.print_table(
+        [
+            {
+                'op': op,
+                'count': s['count'],
+                'ops/s': f"{s['throughput_ops']:.1f}",
+                'p50_ms': f"{s['p50_ms']:.2f}",
+                'p99_ms': f"{s['p99_ms']:.2f}",
+                'failures': s['failures'],
+            }
+            for op, s in summary.items()
+        ],
+        ['op', 'count', 'ops/s', 'p50_ms', 'p99_ms', 'failures'],
+    )
+
+    params = {key: value for key, value in vars(args).items() if key != 'output'}
+    output = common.write_results(
+        'load', params, [dict(label=f"{args.mode}x{args.workers}", elapsed_s=elapsed, operations=summary)],
+        args.output,
+    )
+    print(f"结果已写入 {output}")
+
+
+if __name__ == '__main__':
+    main_cli()
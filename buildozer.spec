@@ -6,7 +6,7 @@ source.dir = .
 source.include_exts = py,png,jpg,kv,atlas,ttf,txt,csv,xlsx,json
 
 # 排除不需要的文件
-source.exclude_dirs = venv,.git,__pycache__,.idea
+source.exclude_dirs = venv,.git,__pycache__,.idea,benchmarks
 source.exclude_exts = spec,pyc,pyo
 
 # 确保必要的文件被包含
@@ -39,7 +39,7 @@ orientation = portrait
 fullscreen = 0
 
 # 依赖配置 - 使用更稳定的版本
-requirements = python3,kivy==2.1.0,android,pyjnius==1.5.0,pandas==1.5.3,openpyxl==3.0.10,pillow
+requirements = python3,kivy==2.1.0,android,pyjnius==1.5.0,openpyxl==3.0.10,pillow
 
 # 优化设置
 android.no_debug_bridge = True
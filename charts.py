@@ -0,0 +1,122 @@
+"""趋势图的布局计算
+
+应用内的SimpleChart（kivy画布）和reports（Pillow生成PNG）共用同一套布局：
+纵轴范围、边距、网格线位置和每个数据点的坐标。
+坐标原点在左下角、纵轴向上，与kivy一致；绘制到图片时由调用方翻转纵坐标。
+本模块只依赖标准库，不涉及任何绘图库。
+"""
+
+# 边距（逻辑像素），实际像素为边距乘以scale，kivy中scale为dp(1)
+MARGIN_LEFT = 80
+MARGIN_BOTTOM = 60
+MARGIN_TOP = 50
+MARGIN_RIGHT = 40
+
+# 横向网格线把纵轴分成的段数，纵向网格线的大致条数
+H_GRID_LINES = 5
+V_GRID_LINES = 5
+
+# 颜色为0到1的RGBA
+BACKGROUND_COLOR = (1, 1, 1, 1)
+LINE_COLOR = (0.2, 0.6, 0.8, 1)
+GRID_COLOR = (0.8, 0.8, 0.8, 0.5)
+TEXT_COLOR = (0, 0, 0, 1)
+AXIS_COLOR = (0, 0, 0, 1)
+POINT_COLOR = (0.8, 0.2, 0.2, 1)
+# 预测区间的不透明度
+BAND_ALPHA = 0.2
+
+
+def value_range(data_points, forecast_band=()):
+    """纵轴范围 (最小值, 最大值)
+
+    包含全部数据和预测区间的上下限，上下各留出10%的空白；
+    所有值相同时上下各留10斤，没有数据时为 (0, 100)。
+    """
+    if not data_points:
+        return 0, 100
+    try:
+        band_values = [value for point in forecast_band or () for value in point[1:]]
+        min_value = min(min(data_points), *band_values) if band_values else min(data_points)
+        max_value = max(max(data_points), *band_values) if band_values else max(data_points)
+    except (ValueError, TypeError):
+        return 0, 100
+
+    spread = max_value - min_value
+    if spread > 0:
+        return min_value - spread * 0.1, max_value + spread * 0.1
+    return min_value - 10, max_value + 10
+
+
+class ChartLayout:
+    """给定尺寸和纵轴范围下的绘图区域与坐标换算
+
+    横轴按位置均匀排列，slots为位置数（数据点数加上预测的天数）。
+    """
+
+    def __init__(self, width, height, slots, min_value, max_value, scale=1.0):
+        self.left = MARGIN_LEFT * scale
+        self.bottom = MARGIN_BOTTOM * scale
+        self.width = max(1, width - self.left - MARGIN_RIGHT * scale)
+        self.height = max(1, height - self.bottom - MARGIN_TOP * scale)
+        self.slots = slots
+        self.min_value = min_value
+        self.max_value = max_value
+        self.step = self.width / max(1, slots - 1)
+
+    @property
+    def right(self):
+        return self.left + self.width
+
+    @property
+    def top(self):
+        return self.bottom + self.height
+
+    def x(self, index):
+        """第index个位置的横坐标，只有一个位置时居中"""
+        if self.slots > 1:
+            return self.left + self.step * index
+        return self.left + self.width * 0.5
+
+    def y(self, value):
+        """体重对应的纵坐标，纵轴范围为0时居中"""
+        value_range = self.max_value - self.min_value
+        if value_range > 0:
+            return self.bottom + ((value - self.min_value) / value_range) * self.height
+        return self.bottom + self.height * 0.5
+
+    def points(self, values, start=0):
+        """从第start个位置开始依次排列的values的坐标，展开为 [x0, y0, x1, y1, ...]"""
+        points = []
+        for offset, value in enumerate(values):
+            points.extend([self.x(start + offset), self.y(value)])
+        return points
+
+    def h_grid(self):
+        """横向网格线，返回从下到上的 [(纵坐标, 对应的体重)]"""
+        value_step = (self.max_value - self.min_value) / H_GRID_LINES
+        return [
+            (self.bottom + self.height / H_GRID_LINES * i, self.min_value + value_step * i)
+            for i in range(H_GRID_LINES + 1)
+        ]
+
+    def v_grid(self, num_points):
+        """纵向网格线所在的数据点序号，只在数据点上画线，预测部分不画"""
+        return list(range(0, num_points, max(1, num_points // V_GRID_LINES)))
+
+    def band(self, last_value, forecast_band, start):
+        """预测区间的坐标
+
+        从最后一个数据点（位置start）开始，使预测与数据线相连。
+
+        Returns:
+            tuple: ([(x, 下限y, 上限y)], 预测值的展开坐标 [x0, y0, ...])
+        """
+        band = [(last_value, last_value, last_value)] + list(forecast_band)
+        edges = []
+        center = []
+        for offset, (value, lower, upper) in enumerate(band):
+            x = self.x(start + offset)
+            edges.append((x, self.y(lower), self.y(upper)))
+            center.extend([x, self.y(value)])
+        return edges, center
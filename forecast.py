@@ -0,0 +1,173 @@
+"""体重趋势拟合和目标日期预测
+
+对最近一段时间的每日体重做两种拟合：
+    - 最小二乘直线：由滑动窗口内的累加和直接求解，新增一天只需O(1)更新累加和
+    - Theil–Sen稳健直线：所有点对斜率的中位数，不受个别异常记录影响
+
+预测区间使用最小二乘拟合的残差估计（正态近似的95%区间）。
+本模块只依赖标准库，窗口通常只有几十个点，累加和与中位数的计算量很小。
+"""
+import math
+import statistics
+from collections import OrderedDict
+
+# 95%预测区间对应的正态分位数
+Z_95 = 1.96
+
+DEFAULT_WINDOW_DAYS = 60
+
+
+class LinearTrend:
+    """可增量增删点的最小二乘直线拟合，只保存累加和"""
+
+    def __init__(self):
+        self.n = 0
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.sum_xx = 0.0
+        self.sum_xy = 0.0
+        self.sum_yy = 0.0
+
+    def add(self, x, y):
+        self.n += 1
+        self.sum_x += x
+        self.sum_y += y
+        self.sum_xx += x * x
+        self.sum_xy += x * y
+        self.sum_yy += y * y
+
+    def remove(self, x, y):
+        self.n -= 1
+        self.sum_x -= x
+        self.sum_y -= y
+        self.sum_xx -= x * x
+        self.sum_xy -= x * y
+        self.sum_yy -= y * y
+
+    def fit(self):
+        """返回 (斜率, 截距, 残差标准差, x均值, x离差平方和)，少于3个点时返回None"""
+        if self.n < 3:
+            return None
+        mean_x = self.sum_x / self.n
+        mean_y = self.sum_y / self.n
+        sxx = self.sum_xx - self.n * mean_x * mean_x
+        if sxx <= 0:
+            return None
+        sxy = self.sum_xy - self.n * mean_x * mean_y
+        syy = self.sum_yy - self.n * mean_y * mean_y
+        slope = sxy / sxx
+        intercept = mean_y - slope * mean_x
+        residual = max(0.0, syy - slope * sxy)
+        sigma = math.sqrt(residual / (self.n - 2))
+        return slope, intercept, sigma, mean_x, sxx
+
+
+def theil_sen(xs, ys):
+    """Theil–Sen稳健直线拟合，返回 (斜率, 截距)，少于2个点时返回None"""
+    slopes = [
+        (ys[j] - ys[i]) / (xs[j] - xs[i])
+        for i in range(len(xs))
+        for j in range(i + 1, len(xs))
+        if xs[j] != xs[i]
+    ]
+    if not slopes:
+        return None
+    slope = statistics.median(slopes)
+    intercept = statistics.median(y - slope * x for x, y in zip(xs, ys))
+    return slope, intercept
+
+
+class TrendModel:
+    """最近window_days天内每日体重的趋势模型
+
+    update()在新记录到达时增量维护窗口和累加和，不需要重新读取历史。
+    日期为日期序数（date.toordinal()），拟合时减去第一个日期，避免累加和数值过大损失精度。
+    """
+
+    def __init__(self, window_days=DEFAULT_WINDOW_DAYS):
+        self.window_days = window_days
+        self.points = OrderedDict()
+        self.linear = LinearTrend()
+        self.origin = None
+
+    @classmethod
+    def from_columns(cls, columns, window_days=DEFAULT_WINDOW_DAYS):
+        """从analytics.WeightColumns的最近window_days天构建"""
+        model = cls(window_days)
+        if columns.days:
+            first_day = columns.days[-1] - window_days + 1
+            for index in range(len(columns.days)):
+                if columns.days[index] < first_day:
+                    continue
+                value = columns.primary(index)
+                if value is not None:
+                    model.update(columns.days[index], value)
+        return model
+
+    def update(self, day, weight):
+        """加入或替换某天的体重，并移出窗口之外的旧数据"""
+        latest = next(reversed(self.points)) if self.points else day
+        if day < latest - self.window_days + 1:
+            return
+
+        if self.origin is None:
+            self.origin = day
+        if day in self.points:
+            self.linear.remove(day - self.origin, self.points[day])
+            self.points[day] = weight
+        elif day > latest or not self.points:
+            self.points[day] = weight
+        else:
+            # 补录窗口中间的日期，保持按日期有序
+            self.points[day] = weight
+            for later in [d for d in self.points if d > day]:
+                self.points.move_to_end(later)
+        self.linear.add(day - self.origin, weight)
+
+        cutoff = next(reversed(self.points)) - self.window_days + 1
+        while self.points:
+            oldest, value = next(iter(self.points.items()))
+            if oldest >= cutoff:
+                break
+            del self.points[oldest]
+            self.linear.remove(oldest - self.origin, value)
+
+    def forecast(self, goal_weight=None, horizon_days=14):
+        """拟合趋势并预测
+
+        Returns:
+            dict: slope（斤/天，最小二乘）、robust_slope（Theil–Sen）、points（参与拟合的天数）、
+                  goal_day（按稳健拟合预计达到目标的日期序数，趋势不朝目标方向或未设置目标时为None）、
+                  band（未来horizon_days天的 [(日期序数, 预测值, 下限, 上限)]）；
+                  数据不足时返回None
+        """
+        fitted = self.linear.fit()
+        if fitted is None:
+            return None
+        slope, intercept, sigma, mean_x, sxx = fitted
+        n = self.linear.n
+        robust = theil_sen([day - self.origin for day in self.points], list(self.points.values()))
+
+        last_day = next(reversed(self.points))
+        band = []
+        for offset in range(1, horizon_days + 1):
+            x = last_day + offset - self.origin
+            center = intercept + slope * x
+            spread = Z_95 * sigma * math.sqrt(1 + 1 / n + (x - mean_x) ** 2 / sxx)
+            band.append((last_day + offset, center, center - spread, center + spread))
+
+        # 目标日期使用稳健拟合，个别录错的记录不会让预测日期大幅跳动
+        goal_day = None
+        goal_slope, goal_intercept = robust if robust else (slope, intercept)
+        if goal_weight and goal_slope != 0:
+            current = goal_intercept + goal_slope * (last_day - self.origin)
+            if (goal_weight - current) * goal_slope > 0:
+                goal_day = self.origin + math.ceil((goal_weight - goal_intercept) / goal_slope)
+
+        return {
+            'slope': slope,
+            'robust_slope': robust[0] if robust else slope,
+            'points': n,
+            'goal_day': goal_day,
+            'band': band,
+        }
@@ -0,0 +1,353 @@
+"""导入文件的格式识别和流式解析
+
+按文件内容（而不是扩展名）识别格式，每种格式由一个注册的解析函数处理：
+    xlsx  Excel工作簿（openpyxl只读模式逐行读取）
+    csv   逗号或分号分隔的文本
+    tsv   制表符分隔的文本
+    json  JSON Lines（逐行读取），或包含记录列表的普通JSON文档
+
+解析函数逐行产生 (表名, 行)，表名为 'weight_records' 或 'diary_entries'，
+体重行为 (日期, 时间类型, 体重斤)，日记行为 (日期, 饮食记录, 减肥心得)，
+由WeightDatabase.import_rows分批校验和写入。除普通JSON文档外，内存占用与文件大小无关。
+
+列名按别名映射到导出文件使用的 日期/时间类型/体重(斤) 和 日期/饮食记录/减肥心得，
+以kg为单位的体重列会换算为斤；没有时间类型列时按日期或时间列中的时刻判断早晚。
+本模块只依赖标准库（读取xlsx时才导入openpyxl），不访问数据库。
+"""
+import codecs
+import csv
+import json
+import re
+
+WEIGHT_COLUMNS = ('日期', '时间类型', '体重(斤)')
+DIARY_COLUMNS = ('日期', '饮食记录', '减肥心得')
+
+# 标准列名 -> 可识别的别名（比较时忽略大小写和空白）
+COLUMN_ALIASES = {
+    '日期': ('日期', 'date', 'day', '记录日期', '测量日期', 'datetime', 'timestamp'),
+    '时刻': ('时间', 'time', '测量时间', '记录时间'),
+    '时间类型': ('时间类型', 'type', 'weight_type', '时段', 'period'),
+    '体重(斤)': ('体重(斤)', '体重', 'weight', 'weight(斤)', 'weight_jin'),
+    '体重(kg)': ('体重(kg)', '体重(公斤)', 'weight(kg)', 'weight_kg', 'kg'),
+    '饮食记录': ('饮食记录', 'food', '饮食', 'meals'),
+    '减肥心得': ('减肥心得', 'thoughts', '心得', 'notes', 'note', '备注'),
+}
+
+# 时间类型的别名，值为导出文件使用的中文名称
+WEIGHT_TYPES = {
+    '早晨': '早晨', '早上': '早晨', '上午': '早晨', 'morning': '早晨', 'am': '早晨',
+    '晚上': '晚上', '晚间': '晚上', '下午': '晚上', 'evening': '晚上', 'night': '晚上', 'pm': '晚上',
+}
+
+# 没有时间类型列时，记录时间早于这个小时的算作早晨
+EVENING_FROM_HOUR = 15
+
+SNIFF_BYTES = 4096
+
+_DATETIME_RE = re.compile(r'^\s*(\S+?)(?:[T\s]+(\d{1,2}):\d{2}(?::\d{2})?\S*)?\s*$')
+
+_IMPORTERS = []
+
+
+def importer(name):
+    """注册一种导入格式
+
+    被装饰的函数接收文件路径，返回 (表名, 行) 的迭代器；
+    sniff函数接收文件开头的字节，判断是否为该格式。
+    """
+    def decorator(func):
+        def register(sniff):
+            _IMPORTERS.append((name, sniff, func))
+            return sniff
+        func.sniff = register
+        return func
+    return decorator
+
+
+def formats():
+    """已注册的格式名称，按识别顺序排列"""
+    return [name for name, _, _ in _IMPORTERS]
+
+
+def detect_format(path):
+    """读取文件开头的内容识别格式，无法识别时返回None"""
+    with open(path, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+    for name, sniff, _ in _IMPORTERS:
+        if sniff(head):
+            return name
+    return None
+
+
+def read_rows(path, file_format=None):
+    """按格式流式读取文件
+
+    Args:
+        path: 文件路径
+        file_format: 格式名称，None表示按内容识别
+
+    Returns:
+        tuple: (格式名称, (表名, 行)迭代器)
+
+    Raises:
+        ValueError: 无法识别或不支持的格式，错误信息可以直接展示给用户
+    """
+    if file_format is None:
+        file_format = detect_format(path)
+    for name, _, func in _IMPORTERS:
+        if name == file_format:
+            return name, func(path)
+    raise ValueError("无法识别的文件格式，支持Excel(.xlsx)、CSV、TSV和JSON文件")
+
+
+def _normalize(name):
+    return re.sub(r'\s+', '', str(name)).lower() if name is not None else ''
+
+
+_ALIAS_LOOKUP = {
+    _normalize(alias): column for column, aliases in COLUMN_ALIASES.items() for alias in aliases
+}
+
+
+def map_columns(header):
+    """将表头映射为 {标准列名: 列序号}，同一列名重复出现时使用第一次出现的位置"""
+    mapping = {}
+    for index, name in enumerate(header):
+        column = _ALIAS_LOOKUP.get(_normalize(name))
+        if column and column not in mapping:
+            mapping[column] = index
+    return mapping
+
+
+def split_datetime(value):
+    """拆分 "2024-01-01 07:30" 这类日期时间，返回 (日期部分, 小时或None)"""
+    if value is None:
+        return None, None
+    if hasattr(value, 'hour') and hasattr(value, 'date'):
+        return value.date(), value.hour
+    match = _DATETIME_RE.match(str(value))
+    if not match:
+        return str(value).strip(), None
+    hour = match.group(2)
+    return match.group(1), int(hour) if hour is not None else None
+
+
+def _decimal(value):
+    """兼容以逗号作小数点的数字文本（分号分隔的CSV中常见）"""
+    return value.replace(',', '.') if isinstance(value, str) else value
+
+
+def _row_converter(mapping):
+    """根据列映射返回把一行转换为 (表名, 行) 的函数，表头不包含所需列时返回None"""
+    if '日期' not in mapping:
+        return None
+
+    def cell(row, column):
+        index = mapping.get(column)
+        if index is None or index >= len(row):
+            return None
+        value = row[index]
+        return value.strip() if isinstance(value, str) else value
+
+    if '体重(斤)' in mapping or '体重(kg)' in mapping:
+        def convert(row):
+            day, hour = split_datetime(cell(row, '日期'))
+            if hour is None and '时刻' in mapping:
+                _, hour = split_datetime(f"{day} {cell(row, '时刻')}")
+            weight = _decimal(cell(row, '体重(斤)'))
+            if weight in (None, '') and '体重(kg)' in mapping:
+                weight = _decimal(cell(row, '体重(kg)'))
+                try:
+                    weight = float(weight) * 2
+                except (ValueError, TypeError):
+                    pass
+            if day in (None, '') and weight in (None, ''):
+                return None
+            weight_type = cell(row, '时间类型')
+            if weight_type in (None, ''):
+                weight_type = '晚上' if hour is not None and hour >= EVENING_FROM_HOUR else '早晨'
+            else:
+                weight_type = WEIGHT_TYPES.get(_normalize(weight_type), weight_type)
+            return 'weight_records', (day, weight_type, weight)
+        return convert
+
+    if '饮食记录' in mapping or '减肥心得' in mapping:
+        def convert(row):
+            day, _ = split_datetime(cell(row, '日期'))
+            food = cell(row, '饮食记录')
+            thoughts = cell(row, '减肥心得')
+            if day in (None, '') and not food and not thoughts:
+                return None
+            return 'diary_entries', (day, food, thoughts)
+        return convert
+
+    return None
+
+
+def _convert_table(rows, source):
+    """将第一行作为表头，逐行转换后续的数据行"""
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return
+    convert = _row_converter(map_columns(header))
+    if convert is None:
+        raise ValueError(
+            f"{source}缺少必要的列，需要 {'/'.join(WEIGHT_COLUMNS)} 或 {'/'.join(DIARY_COLUMNS)}"
+        )
+    for row in rows:
+        converted = convert(row)
+        if converted is not None:
+            yield converted
+
+
+def _decode_head(head):
+    """按导入文本使用的编码解码文件开头，截断在多字节字符中间的部分会被忽略"""
+    encoding = _text_encoding(head)
+    return codecs.getincrementaldecoder(encoding)(errors='ignore').decode(head).lstrip('﻿')
+
+
+def _text_encoding(head):
+    """UTF-8（可带BOM）解码失败时按GB18030读取，兼容中文版Excel另存的CSV"""
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(head)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'gb18030'
+
+
+def _open_text(path):
+    with open(path, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+    return open(path, 'r', encoding=_text_encoding(head), newline='')
+
+
+def _is_text(head):
+    return bool(head) and b'\x00' not in head and not head.startswith(b'PK') and not head.startswith(b'\x1f\x8b')
+
+
+def _first_line(head):
+    lines = _decode_head(head).splitlines()
+    return lines[0] if lines else ''
+
+
+@importer('xlsx')
+def read_xlsx(path):
+    """逐个工作表读取，每个工作表按表头判断是体重记录还是日记"""
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValueError("系统缺少openpyxl库，无法导入Excel文件")
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            rows = worksheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None or _row_converter(map_columns(header)) is None:
+                continue
+            yield from _convert_table(_prepend(header, rows), f"工作表 {worksheet.title} ")
+    finally:
+        workbook.close()
+
+
+@read_xlsx.sniff
+def _sniff_xlsx(head):
+    return head.startswith(b'PK\x03\x04')
+
+
+@importer('tsv')
+def read_tsv(path):
+    with _open_text(path) as f:
+        yield from _convert_table(csv.reader(f, delimiter='\t'), "TSV文件")
+
+
+@read_tsv.sniff
+def _sniff_tsv(head):
+    if not _is_text(head):
+        return False
+    line = _first_line(head)
+    return '\t' in line and line.count('\t') >= line.count(',')
+
+
+@importer('csv')
+def read_csv(path):
+    with _open_text(path) as f:
+        sample = f.read(SNIFF_BYTES)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;')
+        except csv.Error:
+            dialect = csv.excel
+        yield from _convert_table(csv.reader(f, dialect), "CSV文件")
+
+
+@read_csv.sniff
+def _sniff_csv(head):
+    if not _is_text(head):
+        return False
+    line = _first_line(head)
+    return not line.lstrip().startswith(('{', '[')) and (',' in line or ';' in line)
+
+
+@importer('json')
+def read_json(path):
+    """JSON Lines每行一个对象，逐行读取；普通JSON文档需要整体解析
+
+    普通文档可以是记录列表，也可以是 {"weight_records": [...], "diary_entries": [...]}，
+    记录可以是以列名为键的对象，也可以是按标准列顺序排列的数组。
+    """
+    with _open_text(path) as f:
+        first = f.readline()
+        try:
+            record = json.loads(first)
+            lines = True
+        except ValueError:
+            lines = False
+
+        if lines and isinstance(record, dict) and map_columns(record):
+            yield from _convert_records([record])
+            yield from _convert_records(json.loads(line) for line in f if line.strip())
+            return
+
+        f.seek(0)
+        document = json.load(f)
+
+    if isinstance(document, dict):
+        for table, columns in (('weight_records', WEIGHT_COLUMNS), ('diary_entries', DIARY_COLUMNS)):
+            yield from _convert_records(document.get(table, []), columns)
+    else:
+        yield from _convert_records(document)
+
+
+@read_json.sniff
+def _sniff_json(head):
+    return _is_text(head) and _decode_head(head).lstrip().startswith(('{', '['))
+
+
+def _convert_records(records, columns=None):
+    """转换JSON记录：对象按键名映射，数组按columns给出的列顺序映射"""
+    converters = {}
+    for record in records:
+        if isinstance(record, dict):
+            keys = tuple(record)
+            convert = converters.get(keys)
+            if convert is None:
+                convert = converters[keys] = _row_converter(map_columns(keys))
+            row = list(record.values())
+        elif isinstance(record, (list, tuple)) and columns is not None:
+            convert = converters.get(columns)
+            if convert is None:
+                convert = converters[columns] = _row_converter(map_columns(columns))
+            row = record
+        else:
+            continue
+        if convert is None:
+            continue
+        converted = convert(row)
+        if converted is not None:
+            yield converted
+
+
+def _prepend(first, rows):
+    yield first
+    yield from rows
@@ -0,0 +1,167 @@
+"""可选的性能埋点
+
+通过环境变量 WEIGHTTRACKER_PROFILE=1 或应用设置中的"性能埋点"开关启用。
+未启用时，被埋点的函数只多做一次布尔判断，不记录任何数据。
+
+每个埋点名称对应一个滚动延迟直方图，保留最近 ROLLING_WINDOW 次耗时，
+可以导出为JSON文件，也可以在"数据管理"页的性能诊断窗口中查看。
+本模块只依赖标准库，可以在导入kivy之前使用，以便统计模块导入耗时。
+"""
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+ENV_VAR = 'WEIGHTTRACKER_PROFILE'
+
+# 每个埋点保留的最近样本数
+ROLLING_WINDOW = 512
+
+# 直方图各桶的上限（毫秒），最后一个桶收集超过最大上限的样本
+BUCKET_BOUNDS_MS = (0.1, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_enabled = os.environ.get(ENV_VAR, '').strip().lower() in ('1', 'true', 'yes', 'on')
+_lock = threading.Lock()
+_histograms = {}
+
+
+class LatencyHistogram:
+    """单个埋点的滚动延迟统计"""
+
+    def __init__(self, window=ROLLING_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, elapsed_ms):
+        self.samples.append(elapsed_ms)
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+
+    def summary(self):
+        """返回统计摘要，百分位数和直方图基于滚动窗口内的样本"""
+        ordered = sorted(self.samples)
+        buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        for value in ordered:
+            for index, bound in enumerate(BUCKET_BOUNDS_MS):
+                if value <= bound:
+                    buckets[index] += 1
+                    break
+            else:
+                buckets[-1] += 1
+
+        labels = [f"<={bound}ms" for bound in BUCKET_BOUNDS_MS] + [f">{BUCKET_BOUNDS_MS[-1]}ms"]
+        return {
+            'count': self.count,
+            'mean_ms': self.total_ms / self.count if self.count else 0.0,
+            'p50_ms': _percentile(ordered, 0.50),
+            'p90_ms': _percentile(ordered, 0.90),
+            'p99_ms': _percentile(ordered, 0.99),
+            'max_ms': self.max_ms,
+            'window': len(ordered),
+            'histogram': {label: n for label, n in zip(labels, buckets) if n},
+        }
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def is_enabled():
+    return _enabled
+
+
+def set_enabled(enabled):
+    """运行时开启或关闭埋点，已记录的数据保留"""
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def record(name, seconds):
+    """记录一次耗时（秒）"""
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = LatencyHistogram()
+        histogram.add(seconds * 1000.0)
+
+
+@contextmanager
+def span(name):
+    """统计with代码块的耗时"""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """统计函数调用耗时的装饰器"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def instrument_methods(prefix):
+    """类装饰器：为类中所有公开方法加上埋点，名称为 prefix.方法名
+
+    生成器方法和@contextmanager方法不加埋点，调用时只创建生成器或上下文管理器，耗时没有意义。
+    """
+    def decorator(cls):
+        for attr_name, attr in list(vars(cls).items()):
+            if attr_name.startswith('_') or not callable(attr):
+                continue
+            # @contextmanager包装的函数通过__wrapped__指向原来的生成器函数
+            if inspect.isgeneratorfunction(inspect.unwrap(attr)):
+                continue
+            setattr(cls, attr_name, timed(f"{prefix}.{attr_name}")(attr))
+        return cls
+    return decorator
+
+
+def snapshot():
+    """返回所有埋点的统计摘要，按名称排序"""
+    with _lock:
+        return {name: _histograms[name].summary() for name in sorted(_histograms)}
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def dump_json(path):
+    """将统计摘要写入JSON文件，返回写入的路径"""
+    data = {
+        'generated_at': time.strftime('%Y/%m/%d %H:%M:%S'),
+        'enabled': _enabled,
+        'metrics': snapshot(),
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return path
@@ -3,22 +3,46 @@ import os
 import sys
 import subprocess
 import json
+import gzip
+import hashlib
+import itertools
+import random
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from datetime import datetime, date, timedelta
-from kivy.app import App
-from kivy.uix.boxlayout import BoxLayout
-from kivy.uix.label import Label
-from kivy.uix.textinput import TextInput
-from kivy.uix.button import Button
-from kivy.uix.spinner import Spinner
-from kivy.uix.scrollview import ScrollView
-from kivy.uix.popup import Popup
-from kivy.uix.tabbedpanel import TabbedPanel, TabbedPanelItem
-from kivy.uix.widget import Widget
-from kivy.graphics import Color, Line, Rectangle
-from kivy.clock import Clock
-from kivy.logger import Logger
-from kivy.metrics import dp
 import platform
+import analytics
+import charts
+import forecast
+import importers
+import instrumentation
+
+with instrumentation.span('import.kivy'):
+    from kivy.app import App
+    from kivy.uix.boxlayout import BoxLayout
+    from kivy.uix.label import Label
+    from kivy.uix.textinput import TextInput
+    from kivy.uix.button import Button
+    from kivy.uix.spinner import Spinner
+    from kivy.uix.scrollview import ScrollView
+    from kivy.uix.recycleview import RecycleView
+    from kivy.uix.recycleboxlayout import RecycleBoxLayout
+    from kivy.uix.behaviors import ButtonBehavior
+    from kivy.uix.popup import Popup
+    from kivy.uix.tabbedpanel import TabbedPanel, TabbedPanelItem
+    from kivy.uix.widget import Widget
+    from kivy.graphics import Color, Line, Mesh, Rectangle
+    from kivy.clock import Clock
+    from kivy.logger import Logger
+    from kivy.metrics import dp
+    from kivy.properties import StringProperty
+
+# 启动计时起点，用于统计首帧耗时和可交互耗时
+_STARTUP_T0 = time.perf_counter()
 
 # 更可靠的Android平台检测
 IS_ANDROID = False
@@ -29,16 +53,12 @@ except ImportError:
     # 备选检测方法
     IS_ANDROID = platform.system() == "Linux" and "ANDROID_ARGUMENT" in os.environ
 
-# 数据处理库的安全导入
-pd = None
-try:
-    import pandas as pd
-except ImportError:
-    Logger.warning("pandas库未找到，导出/导入功能将不可用")
-
+# Excel库的安全导入
 openpyxl_available = False
 try:
-    import openpyxl
+    with instrumentation.span('import.openpyxl'):
+        import openpyxl
+        from openpyxl.utils import get_column_letter
     openpyxl_available = True
 except ImportError:
     Logger.warning("openpyxl库未找到，Excel文件导出/导入功能将不可用")
@@ -68,6 +88,29 @@ if IS_ANDROID:
     except Exception as e:
         Logger.warning(f"Android: 权限请求失败 - {str(e)}")
 
+# Excel导出文件的工作表和列名
+WEIGHT_SHEET_NAME = '体重记录'
+DIARY_SHEET_NAME = '减肥日记'
+WEIGHT_SHEET_COLUMNS = list(importers.WEIGHT_COLUMNS)
+DIARY_SHEET_COLUMNS = list(importers.DIARY_COLUMNS)
+# 月度汇总工作表的列，顺序与WeightDatabase.iter_monthly_summary一致；导入时会跳过这个工作表
+SUMMARY_SHEET_NAME = '月度汇总'
+SUMMARY_SHEET_COLUMNS = ['月份'] + [
+    f"{name}{column}"
+    for name in ('早晨', '晚上')
+    for column in ('记录数', '最低(斤)', '最高(斤)', '平均(斤)', '变化(斤)')
+]
+
+# 备份文件格式：gzip压缩的JSON Lines，首行为文件头，其余每行为 [表名, 列值...]
+BACKUP_FORMAT = 'weighttracker-backup'
+BACKUP_FORMAT_VERSION = 1
+BACKUP_EXTENSION = '.jsonl.gz'
+# 导出文件格式设置的可选值和对应的文件名
+EXPORT_FILENAMES = {
+    'xlsx': 'weight_data_export.xlsx',
+    'jsonl.gz': 'weight_data_export' + BACKUP_EXTENSION,
+}
+
 def format_date(date_obj):
     """将日期格式化为统一的YYYY/MM/DD格式
     
@@ -220,53 +263,105 @@ def parse_date(date_str):
         Logger.error(f"parse_date: 处理日期时出错: {str(e)}")
         return date.today()
 
+# 导入文件中接受的日期格式；年份在后的日期一律按 日/月/年 解析，01/06/2024 为2024年6月1日
+IMPORT_DATE_FORMATS = (
+    '%Y/%m/%d',     # 2024/01/07、2024/1/7
+    '%Y-%m-%d',     # 2024-01-07
+    '%Y.%m.%d',     # 2024.1.7
+    '%Y%m%d',       # 20240107
+    '%d/%m/%Y',     # 07/01/2024
+    '%d-%m-%Y',     # 07-01-2024
+    '%d.%m.%Y',     # 07.01.2024
+)
+
+def parse_import_date(value):
+    """严格解析导入文件中的日期，无法解析、早于1900年或晚于今天时抛出ValueError
+    
+    与parse_date不同，不会用今天的日期代替无效的日期，无效的行由调用方计入错误报告。
+    value可以是date/datetime、带时间部分的日期字符串（时间被忽略）或Excel日期序列号。
+    年份在后的日期总是按 日/月/年 解析（见IMPORT_DATE_FORMATS），13/31这类无法按此解析的日期视为无效。
+    
+    Returns:
+        date: 日期对象
+    """
+    if isinstance(value, datetime):
+        parsed = value.date()
+    elif isinstance(value, date):
+        parsed = value
+    else:
+        text = str(value).strip() if value is not None else ''
+        if not text:
+            raise ValueError("日期为空")
+        day_part = text.replace('T', ' ').split(' ')[0]
+        parsed = None
+        for fmt in IMPORT_DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(day_part, fmt).date()
+                break
+            except ValueError:
+                continue
+        if parsed is None:
+            try:
+                serial = float(text)
+            except ValueError:
+                raise ValueError(f"无法识别的日期: {text}（年份在后的日期按 日/月/年 解析）")
+            if not 0 < serial < 2958466:
+                raise ValueError(f"无效的Excel日期数字: {text}")
+            # 序列号1为1900-01-01；Excel把不存在的1900-02-29算作60，之后的日期多算了一天
+            serial = int(serial)
+            parsed = date(1899, 12, 31 if serial < 61 else 30) + timedelta(days=serial)
+    
+    if parsed > date.today():
+        raise ValueError(f"日期是未来日期: {format_date(parsed)}")
+    if parsed < date(1900, 1, 1):
+        raise ValueError(f"日期过于古老: {format_date(parsed)}")
+    return parsed
+
+def _shorten(text, max_length=24):
+    """将文本压缩为单行摘要"""
+    text = " ".join(str(text).split())
+    if len(text) <= max_length:
+        return text
+    return text[:max_length] + "…"
+
 class SimpleChart(Widget):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.data_points = []
         self.labels = []
+        # 数据之后的预测区间，[(预测值, 下限, 上限)]，见set_data
+        self.forecast_band = []
         self.chart_title = "体重趋势图"
         self.y_axis_label = "体重(斤)"
         self.x_axis_label = "日期"
         self.min_value = 0
         self.max_value = 0
-        self.background_color = (1, 1, 1, 1)
-        self.line_color = (0.2, 0.6, 0.8, 1)
-        self.grid_color = (0.8, 0.8, 0.8, 0.5)
-        self.text_color = (0, 0, 0, 1)
+        self.background_color = charts.BACKGROUND_COLOR
+        self.line_color = charts.LINE_COLOR
+        self.grid_color = charts.GRID_COLOR
+        self.text_color = charts.TEXT_COLOR
         
-    def set_data(self, data_points, labels=None):
-        """设置图表数据"""
+    def set_data(self, data_points, labels=None, forecast_band=None):
+        """设置图表数据
+        
+        Args:
+            data_points: 体重列表
+            labels: 每个点的标签
+            forecast_band: 接在数据之后按天排列的预测区间 [(预测值, 下限, 上限)]，None表示不绘制
+        """
         # 确保data_points是列表类型
         if not isinstance(data_points, list):
             data_points = []
             
         self.data_points = data_points
         self.labels = labels if labels else [str(i+1) for i in range(len(data_points))]
-        
-        if data_points:
-            try:
-                self.min_value = min(data_points)
-                self.max_value = max(data_points)
-                
-                value_range = self.max_value - self.min_value
-                if value_range > 0:
-                    self.min_value -= value_range * 0.1
-                    self.max_value += value_range * 0.1
-                else:
-                    # 当所有值相同时，设置合理的范围
-                    self.min_value -= 10
-                    self.max_value += 10
-            except (ValueError, TypeError):
-                # 如果计算最小值或最大值出错，设置默认值
-                self.min_value = 0
-                self.max_value = 100
-        else:
-            self.min_value = 0
-            self.max_value = 100
+        self.forecast_band = forecast_band if data_points and forecast_band else []
+        # 纵轴范围与reports生成的PNG报告使用相同的计算
+        self.min_value, self.max_value = charts.value_range(data_points, self.forecast_band)
             
         self.draw_chart()
     
+    @instrumentation.timed('chart.draw_chart')
     def draw_chart(self):
         """绘制图表"""
         self.canvas.clear()
@@ -283,108 +378,147 @@ class SimpleChart(Widget):
                 )
                 return
             
-            self.draw_grid_and_axes()
-            self.draw_data_line()
+            layout = self._layout()
+            self.draw_grid_and_axes(layout)
+            self.draw_data_line(layout)
+            if self.forecast_band:
+                self.draw_forecast_band(layout)
     
-    def draw_grid_and_axes(self):
+    def _x_slots(self):
+        """横轴上的位置数：数据点加上预测的天数"""
+        return len(self.data_points) + len(self.forecast_band)
+    
+    def _layout(self):
+        return charts.ChartLayout(
+            self.width, self.height, self._x_slots(), self.min_value, self.max_value, scale=dp(1)
+        )
+    
+    def draw_grid_and_axes(self, layout):
         """绘制网格和坐标轴"""
-        margin_left = dp(80)
-        margin_bottom = dp(60)
-        margin_top = dp(50)
-        margin_right = dp(40)
-        
-        chart_width = self.width - margin_left - margin_right
-        chart_height = self.height - margin_bottom - margin_top
-        
         Color(*self.grid_color)
         
-        num_h_lines = 5
-        for i in range(num_h_lines + 1):
-            y = margin_bottom + (chart_height / num_h_lines) * i
-            Line(
-                points=[margin_left, y, margin_left + chart_width, y],
-                width=1
-            )
-            
-        num_points = len(self.data_points)
-        if num_points > 0:
-            step = max(1, num_points // 5)
-            
-            for i in range(0, num_points, step):
-                if i < len(self.labels):
-                    x = margin_left + (chart_width / max(1, (num_points - 1))) * i
-                    Line(
-                        points=[x, margin_bottom, x, margin_bottom + chart_height],
-                        width=1
-                    )
+        for y, _ in layout.h_grid():
+            Line(points=[layout.left, y, layout.right, y], width=1)
         
-        Color(0, 0, 0, 1)
-        Line(
-            points=[margin_left, margin_bottom, margin_left, margin_bottom + chart_height],
-            width=2
-        )
-        Line(
-            points=[margin_left, margin_bottom, margin_left + chart_width, margin_bottom],
-            width=2
-        )
+        for i in layout.v_grid(len(self.data_points)):
+            if i < len(self.labels):
+                x = layout.x(i)
+                Line(points=[x, layout.bottom, x, layout.top], width=1)
+        
+        Color(*charts.AXIS_COLOR)
+        Line(points=[layout.left, layout.bottom, layout.left, layout.top], width=2)
+        Line(points=[layout.left, layout.bottom, layout.right, layout.bottom], width=2)
     
-    def draw_data_line(self):
+    def draw_data_line(self, layout):
         """绘制数据线"""
         if not self.data_points:
             return
-            
-        margin_left = dp(80)
-        margin_bottom = dp(60)
-        margin_top = dp(50)
-        margin_right = dp(40)
         
-        chart_width = max(1, self.width - margin_left - margin_right)
-        chart_height = max(1, self.height - margin_bottom - margin_top)
+        points = layout.points(self.data_points)
+        Color(*self.line_color)
+        Line(points=points, width=2)
         
-        points = []
-        num_points = len(self.data_points)
+        Color(*charts.POINT_COLOR)
+        for i in range(0, len(points), 2):
+            Rectangle(pos=(points[i] - 3, points[i + 1] - 3), size=(6, 6))
+    
+    def draw_forecast_band(self, layout):
+        """在数据线之后绘制预测值（虚线）和95%预测区间（半透明区域）"""
+        if self.max_value <= self.min_value:
+            return
         
-        for i, value in enumerate(self.data_points):
-            if num_points > 1:
-                # 避免除零错误
-                x = margin_left + (chart_width / max(1, num_points - 1)) * i
-            else:
-                x = margin_left + chart_width * 0.5
-            
-            value_range = self.max_value - self.min_value
-            # 防止除零错误，为value_range设置默认值
-            if value_range > 0:
-                y = margin_bottom + ((value - self.min_value) / value_range) * chart_height
-            else:
-                y = margin_bottom + chart_height * 0.5
-            
-            points.extend([x, y])
+        edges, center_points = layout.band(
+            self.data_points[-1], self.forecast_band, len(self.data_points) - 1
+        )
+        vertices = []
+        for x, lower, upper in edges:
+            vertices.extend([x, lower, 0, 0, x, upper, 0, 0])
         
-        Color(*self.line_color)
-        Line(points=points, width=2)
+        Color(self.line_color[0], self.line_color[1], self.line_color[2], charts.BAND_ALPHA)
+        Mesh(vertices=vertices, indices=list(range(len(vertices) // 4)), mode='triangle_strip')
         
-        for i, value in enumerate(self.data_points):
-            if num_points > 1:
-                x = margin_left + (chart_width / (num_points - 1)) * i
-            else:
-                x = margin_left + chart_width * 0.5
-            
-            value_range = self.max_value - self.min_value
-            if value_range > 0:
-                y = margin_bottom + ((value - self.min_value) / value_range) * chart_height
-            else:
-                y = margin_bottom + chart_height * 0.5
-            
-            Color(0.8, 0.2, 0.2, 1)
-            Rectangle(pos=(x-3, y-3), size=(6, 6))
+        Color(*self.line_color)
+        Line(points=center_points, width=1, dash_length=8, dash_offset=6)
     
     def on_size(self, *args):
         self.draw_chart()
 
+class _SnapshotConnection:
+    """读快照期间共享的数据库连接，close()不会真正关闭连接"""
+    
+    def __init__(self, conn):
+        self._conn = conn
+    
+    def close(self):
+        pass
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+class _Connection(sqlite3.Connection):
+    """WeightDatabase使用的连接，记录是否附加了归档数据库"""
+    archive_attached = False
+
+@instrumentation.instrument_methods('db')
 class WeightDatabase:
-    def __init__(self, app_instance=None):
+    # 数据库被其他进程锁定时，连接等待锁释放的秒数
+    BUSY_TIMEOUT = 5.0
+    # 等待超时后写操作的最大重试次数
+    WRITE_RETRIES = 3
+    # 第一次重试前的基础退避时间（秒），之后每次翻倍并加入随机抖动
+    RETRY_BASE_DELAY = 0.05
+    # 汇总表支持的周期，值为由date列计算周期起始日期(YYYY/MM/DD)的SQL表达式，周从周一开始
+    ROLLUP_PERIODS = {
+        'week': "replace(date(replace(date, '/', '-'), 'weekday 0', '-6 days'), '-', '/')",
+        'month': "substr(date, 1, 8) || '01'",
+    }
+    # 备份文件保存的表和列，恢复时按原样写回（包括id、创建时间和待核实标记）
+    BACKUP_COLUMNS = {
+        'weight_records': ('id', 'date', 'weight_type', 'weight', 'flagged', 'created_at'),
+        'diary_entries': ('id', 'date', 'food', 'thoughts', 'created_at'),
+    }
+    # 冷热分层：早于归档分界日期的记录保存在同目录下的归档数据库中（附加为archive），
+    # 两层的表结构相同，保留全部列
+    ARCHIVE_COLUMNS = {table: columns + ('import_id',) for table, columns in BACKUP_COLUMNS.items()}
+    # 归档分界日期(YYYY/MM/DD)，没有归档时为空字符串；归档库中不早于分界日期的行是已移回主库的残留，读取时忽略
+    ARCHIVE_BEFORE_SQL = "COALESCE((SELECT value FROM main.meta WHERE key = 'archive_before'), '')"
+    # 在两层之间移动记录期间meta中的moving为1，daily_weights和数据代数的触发器不执行
+    MOVING_GUARD = "NOT EXISTS (SELECT 1 FROM meta WHERE key = 'moving' AND value = 1)"
+    # 例行维护的最短间隔（天），见run_maintenance
+    MAINTENANCE_INTERVAL_DAYS = 7
+    # 增量回收空闲页时每个写事务回收的页数，避免长时间占用写锁
+    VACUUM_STEP_PAGES = 256
+    # auto_vacuum为NONE的旧数据库不超过该大小时，例行维护自动用一次完整VACUUM转换为增量回收模式；
+    # 更大的数据库完整VACUUM会长时间占用写锁，只在用户手动整理数据库时转换
+    FULL_VACUUM_MAX_BYTES = 16 * 1024 * 1024
+    
+    def __init__(self, app_instance=None, db_path=None, busy_timeout=None, write_retries=None):
         self.app = app_instance
-        self.db_path = self.get_db_path()
+        self.db_path = db_path or self.get_db_path()
+        # 归档数据库路径，内存数据库没有归档
+        self.archive_path = self._archive_path(self.db_path)
+        self.busy_timeout = self.BUSY_TIMEOUT if busy_timeout is None else busy_timeout
+        self.write_retries = self.WRITE_RETRIES if write_retries is None else write_retries
+        # 当前线程的读快照连接，见read_snapshot
+        self._local = threading.local()
+        # 日记全文索引是否可用（需要SQLite FTS5和trigram分词器）
+        self.fts_available = False
+        # 体重历史的列式缓存，见get_analytics
+        self._analytics = None
+        self._analytics_version = None
+        self._analytics_lock = threading.Lock()
+        self._version_conn = None
+        # 基于列式缓存的趋势模型，见get_forecast
+        self._trend = None
+        self._trend_source = None
+        # 写入时的异常检测，见check_weight
+        self._detector = None
+        self._detector_source = None
+        # 统计、图表和预测是否排除标记为异常的记录
+        self.exclude_flagged = False
+        # 用户指定的导出目录（空表示自动选择）和本次会话解析出的导出目录，见get_export_dir
+        self.export_dir = ''
+        self._export_dir = None
         # 立即初始化数据库，创建必要的表
         self.init_database()
     
@@ -411,168 +545,627 @@ class WeightDatabase:
             Logger.error(f"获取数据库路径失败: {str(e)}")
             return ":memory:"
     
-    def get_export_path(self, filename):
-        """获取导出文件路径，确保路径有效且有适当的访问权限"""
-        Logger.info(f"开始获取导出路径，文件名: {filename}")
+    def set_export_dir(self, directory):
+        """设置用户指定的导出目录，空字符串表示自动选择；下次获取导出路径时重新解析"""
+        self.export_dir = (directory or '').strip()
+        self.invalidate_export_dir()
+    
+    def invalidate_export_dir(self):
+        """清除缓存的导出目录，权限变化或写入失败后调用"""
+        self._export_dir = None
+    
+    def get_export_dir(self):
+        """获取导出目录
+        
+        每个会话只解析一次，之后直接返回缓存的目录；缓存的目录被删除或变为不可写时重新解析。
+        """
+        cached = self._export_dir
+        if cached and self._is_writable_dir(cached):
+            return cached
         
+        self._export_dir = self._resolve_export_dir()
+        return self._export_dir
+    
+    def get_export_path(self, filename):
+        """获取导出文件路径，目录见get_export_dir"""
         # 验证文件名
         if not filename or not isinstance(filename, str):
             Logger.error("无效的文件名")
             filename = "weight_data_export.xlsx"  # 默认文件名
         
-        try:
-            if IS_ANDROID:
-                # Android环境处理
-                Logger.info("Android环境：开始处理导出路径")
-                
-                # 尝试多种方式获取基础目录
-                base_dir = None
-                
-                # 方法1: 优先使用应用的user_data_dir
-                if self.app and hasattr(self.app, 'user_data_dir'):
-                    base_dir = self.app.user_data_dir
-                    Logger.info(f"Android环境：使用应用user_data_dir - {base_dir}")
-                
-                # 方法2: 尝试使用app_storage_path
-                if not base_dir:
-                    try:
-                        from android.storage import app_storage_path
-                        base_dir = app_storage_path()
-                        Logger.info(f"Android环境：使用app_storage_path - {base_dir}")
-                    except Exception as e:
-                        Logger.warning(f"Android环境：无法获取app_storage_path - {str(e)}")
-                
-                # 方法3: 使用通用Android路径作为备选
-                if not base_dir:
-                    base_dir = "/data/user/0/org.example.weighttracker/files"
-                    Logger.info(f"Android环境：使用通用路径 - {base_dir}")
-                
-                # 确保目录存在，处理可能的权限问题
-                return self._ensure_directory_and_get_path(base_dir, "exports", filename, is_android=True)
-            else:
-                # 非Android环境（Windows、Mac、Linux等）
-                Logger.info("非Android环境：开始处理导出路径")
-                
-                # 定义备选路径列表，按优先级排序
-                alternative_paths = []
-                
-                # 方法1: 应用的user_data_dir（如果可用）
-                if self.app and hasattr(self.app, 'user_data_dir'):
-                    alternative_paths.append((self.app.user_data_dir, "应用数据目录"))
-                
-                # 方法2: 用户文档目录（更安全的位置）
-                try:
-                    import pathlib
-                    # 获取用户文档目录，跨平台兼容
-                    docs_dir = str(pathlib.Path.home() / "Documents")
-                    alternative_paths.append((docs_dir, "用户文档目录"))
-                except Exception as e:
-                    Logger.warning(f"无法获取文档目录: {str(e)}")
-                
-                # 方法3: 用户主目录
-                user_home = os.path.expanduser("~")
-                alternative_paths.append((user_home, "用户主目录"))
-                
-                # 方法4: 当前工作目录
-                try:
-                    current_dir = os.getcwd()
-                    alternative_paths.append((current_dir, "当前工作目录"))
-                except Exception as e:
-                    Logger.warning(f"无法获取当前工作目录: {str(e)}")
-                
-                # 尝试每个备选路径
-                for base_dir, dir_type in alternative_paths:
-                    Logger.info(f"尝试使用{dir_type} - {base_dir}")
-                    result = self._ensure_directory_and_get_path(base_dir, "weight_data_exports", filename)
-                    if result:
-                        return result
-                
-                # 所有路径都失败了，返回相对路径作为最后手段
-                Logger.warning("所有备选路径都失败，使用相对路径")
-                return filename
-                
-        except Exception as e:
-            Logger.error(f"获取导出路径失败: {str(e)}")
-            # 作为最后备选，使用当前目录
+        return os.path.join(self.get_export_dir(), filename)
+    
+    def _export_dir_candidates(self):
+        """按优先级返回 (基础目录, 子目录名, 说明) 候选列表"""
+        candidates = []
+        
+        # 用户在设置中指定的目录直接使用，不再创建子目录
+        if self.export_dir:
+            candidates.append((os.path.expanduser(self.export_dir), None, "设置中的导出目录"))
+        
+        # 应用的user_data_dir在首次访问时创建目录，创建失败会抛出OSError
+        user_data_dir = None
+        if self.app:
             try:
-                return os.path.join(os.getcwd(), filename)
-            except:
-                # 完全失败时，返回文件名
-                return filename
+                user_data_dir = getattr(self.app, 'user_data_dir', None)
+            except OSError as e:
+                Logger.warning(f"无法获取应用数据目录: {str(e)}")
+        
+        if IS_ANDROID:
+            # 方法1: 优先使用应用的user_data_dir
+            if user_data_dir:
+                candidates.append((user_data_dir, "exports", "应用user_data_dir"))
+            
+            # 方法2: 尝试使用app_storage_path
+            try:
+                from android.storage import app_storage_path
+                candidates.append((app_storage_path(), "exports", "app_storage_path"))
+            except Exception as e:
+                Logger.warning(f"Android环境：无法获取app_storage_path - {str(e)}")
+            
+            # 方法3: 使用通用Android路径作为备选
+            candidates.append(("/data/user/0/org.example.weighttracker/files", "exports", "通用路径"))
+        else:
+            # 方法1: 应用的user_data_dir（如果可用）
+            if user_data_dir:
+                candidates.append((user_data_dir, "weight_data_exports", "应用数据目录"))
+            
+            # 方法2: 用户文档目录（更安全的位置）
+            candidates.append((
+                os.path.join(os.path.expanduser("~"), "Documents"), "weight_data_exports", "用户文档目录"
+            ))
+            
+            # 方法3: 用户主目录
+            candidates.append((os.path.expanduser("~"), "weight_data_exports", "用户主目录"))
+            
+            # 方法4: 当前工作目录
+            try:
+                candidates.append((os.getcwd(), "weight_data_exports", "当前工作目录"))
+            except Exception as e:
+                Logger.warning(f"无法获取当前工作目录: {str(e)}")
+        
+        return candidates
     
-    def _ensure_directory_and_get_path(self, base_dir, subdir_name, filename, is_android=False):
-        """确保目录存在并返回完整路径"""
+    def _resolve_export_dir(self):
+        """依次尝试候选目录，返回第一个可写的导出目录"""
+        for base_dir, subdir_name, dir_type in self._export_dir_candidates():
+            result = self._ensure_directory(base_dir, subdir_name)
+            if result:
+                Logger.info(f"使用{dir_type}作为导出目录 - {result}")
+                return result
+        
+        # 所有目录都不可写，使用当前目录作为最后手段
+        Logger.warning("所有备选导出目录都不可用，使用当前目录")
         try:
-            # 确保base_dir有效
-            if not base_dir or not isinstance(base_dir, str):
-                Logger.warning("无效的基础目录")
-                return None
-            
-            # 创建子目录
+            return os.getcwd()
+        except Exception:
+            return '.'
+    
+    def _ensure_directory(self, base_dir, subdir_name=None):
+        """确保导出目录存在且可写，返回目录路径；子目录无法创建时退回基础目录，都不可用时返回None"""
+        if not base_dir or not isinstance(base_dir, str):
+            return None
+        
+        if subdir_name:
             export_dir = os.path.join(base_dir, subdir_name)
-            
-            # 检查目录是否存在，如果不存在则尝试创建
-            if not os.path.exists(export_dir):
+            if not os.path.isdir(export_dir) and self._is_writable_dir(base_dir):
                 try:
-                    os.makedirs(export_dir, exist_ok=True)  # 使用exist_ok避免竞争条件
+                    os.makedirs(export_dir, exist_ok=True)
                     Logger.info(f"成功创建目录: {export_dir}")
-                except PermissionError as e:
-                    Logger.error(f"权限错误，无法创建目录 {export_dir}: {str(e)}")
-                    # 直接使用基础目录
-                    export_path = os.path.join(base_dir, filename)
-                    if self._check_write_permission(os.path.dirname(export_path)):
-                        Logger.warning(f"使用基础目录作为备选: {base_dir}")
-                        return export_path
-                    return None
-                except Exception as e:
-                    Logger.error(f"无法创建目录 {export_dir}: {str(e)}")
-                    return None
-            
-            # 构建完整路径
-            export_path = os.path.join(export_dir, filename)
+                except OSError as e:
+                    Logger.warning(f"无法创建目录 {export_dir}: {str(e)}")
+            if self._is_writable_dir(export_dir):
+                return export_dir
+        elif not os.path.isdir(base_dir):
+            try:
+                os.makedirs(base_dir, exist_ok=True)
+            except OSError as e:
+                Logger.warning(f"无法创建目录 {base_dir}: {str(e)}")
+        
+        if self._is_writable_dir(base_dir):
+            return base_dir
+        return None
+    
+    @staticmethod
+    def _is_writable_dir(directory):
+        """通过os.access检查目录是否存在且可写，不在磁盘上创建测试文件"""
+        return os.path.isdir(directory) and os.access(directory, os.W_OK | os.X_OK)
+    
+    def _create_tables(self, cursor):
+        """创建数据表和索引（已存在时跳过）"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS weight_records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT NOT NULL,
+                weight_type TEXT NOT NULL,
+                weight REAL NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS diary_entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT NOT NULL,
+                food TEXT,
+                thoughts TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # 按日期查询和分页使用的索引
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_weight_records_date
+            ON weight_records (date, weight_type)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_diary_entries_date
+            ON diary_entries (date)
+        ''')
+    
+    def _migrate_columns(self, cursor):
+        """为旧版本创建的数据库补充新增的列"""
+        cursor.execute('PRAGMA table_info(weight_records)')
+        columns = [row[1] for row in cursor.fetchall()]
+        if 'flagged' not in columns:
+            # 写入时被判定为异常、经用户确认后保存的记录
+            cursor.execute('''
+                ALTER TABLE weight_records ADD COLUMN flagged INTEGER NOT NULL DEFAULT 0
+            ''')
+        
+        # 由导入写入的记录对应的import_ledger.id，手动录入或修改过的记录为NULL
+        for table in ('weight_records', 'diary_entries'):
+            cursor.execute(f'PRAGMA table_info({table})')
+            if 'import_id' not in [row[1] for row in cursor.fetchall()]:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN import_id INTEGER')
+    
+    @staticmethod
+    def _create_trigger(cursor, name, definition):
+        """创建触发器，已存在的同名触发器定义不同（由旧版本创建）时替换为新的定义"""
+        sql = f"CREATE TRIGGER {name} {definition.strip()}"
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,))
+        row = cursor.fetchone()
+        if row is not None and row[0] == sql:
+            return
+        if row is not None:
+            cursor.execute(f'DROP TRIGGER {name}')
+        cursor.execute(sql)
+    
+    def _create_rollups(self, cursor):
+        """创建按周、按月的体重汇总表，首次创建时从已有记录回填"""
+        cursor.execute('''
+            SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'weight_rollups'
+        ''')
+        exists = cursor.fetchone() is not None
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS weight_rollups (
+                granularity TEXT NOT NULL,
+                period_start TEXT NOT NULL,
+                weight_type TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                min_weight REAL,
+                max_weight REAL,
+                sum_weight REAL,
+                first_date TEXT,
+                first_weight REAL,
+                last_date TEXT,
+                last_weight REAL,
+                PRIMARY KEY (granularity, period_start, weight_type)
+            )
+        ''')
+        
+        if not exists:
+            self._rebuild_rollups(cursor)
+    
+    def _refresh_rollup_period(self, cursor, granularity, start=None, end=None):
+        """重新计算一个周期的汇总行，start为None时重新计算该粒度的全部周期"""
+        period_sql = self.ROLLUP_PERIODS[granularity]
+        where, params = self._date_range_clause(start, end)
+        period_filter = '' if start is None else 'AND period_start = ?'
+        period_params = [granularity] if start is None else [granularity, format_date(start)]
+        source = self._source(cursor.connection, 'weight_records')
+        
+        def latest(date_column):
+            return self._latest_weight_sql(
+                cursor.connection, f'weight_rollups.{date_column}', 'weight_rollups.weight_type'
+            )
+        
+        cursor.execute(f'''
+            DELETE FROM weight_rollups WHERE granularity = ? {period_filter}
+        ''', period_params)
+        cursor.execute(f'''
+            INSERT INTO weight_rollups
+                (granularity, period_start, weight_type, count, min_weight, max_weight,
+                 sum_weight, first_date, last_date)
+            SELECT ?, {period_sql} AS period, weight_type, COUNT(*), MIN(weight), MAX(weight),
+                   SUM(weight), MIN(date), MAX(date)
+            FROM {source}
+            {where}
+            GROUP BY period, weight_type
+        ''', [granularity] + params)
+        # 同一天同一时间段有多条记录时，以最后写入的为准
+        cursor.execute(f'''
+            UPDATE weight_rollups SET
+                first_weight = {latest('first_date')},
+                last_weight = {latest('last_date')}
+            WHERE granularity = ? {period_filter}
+        ''', period_params)
+    
+    def _latest_weight_sql(self, conn, date_expr, type_expr):
+        """某天某时间段最后写入的体重的SQL表达式（相关子查询）
+        
+        相关子查询无法下推到UNION ALL的两边，附加了归档数据库时分别在两层中按索引查找，
+        同一天的记录只在一层中，先查热层。
+        """
+        def latest(table, condition=''):
+            return (f"(SELECT weight FROM {table} r WHERE r.date = {date_expr} "
+                    f"AND r.weight_type = {type_expr} {condition}ORDER BY r.id DESC LIMIT 1)")
+        
+        if not getattr(conn, 'archive_attached', False):
+            return latest('weight_records')
+        return (f"COALESCE({latest('main.weight_records')}, "
+                f"{latest('archive.weight_records', f'AND r.date < {self.ARCHIVE_BEFORE_SQL} ')})")
+    
+    def _update_rollups(self, cursor, date_str):
+        """某天的体重变化后，只重新计算该天所在的周和月"""
+        day = parse_date(date_str)
+        week_start = day - timedelta(days=day.weekday())
+        month_start = day.replace(day=1)
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        self._refresh_rollup_period(cursor, 'week', week_start, week_start + timedelta(days=6))
+        self._refresh_rollup_period(cursor, 'month', month_start, next_month - timedelta(days=1))
+    
+    def _rebuild_rollups(self, cursor):
+        for granularity in self.ROLLUP_PERIODS:
+            self._refresh_rollup_period(cursor, granularity)
+    
+    def _daily_refresh_sql(self, date_expr):
+        """重新计算某一天daily_weights行的SQL语句，同一天同一时间段有多条记录时以最后写入的为准"""
+        def latest(column, weight_type):
+            return (f"(SELECT {column} FROM weight_records WHERE date = {date_expr} "
+                    f"AND weight_type = '{weight_type}' ORDER BY id DESC LIMIT 1)")
+        
+        return f'''
+            DELETE FROM daily_weights WHERE day = {date_expr};
+            INSERT INTO daily_weights (day, morning, evening, diff, morning_flagged, evening_flagged)
+            SELECT {date_expr}, {latest('weight', 'morning')}, {latest('weight', 'evening')},
+                   {latest('weight', 'evening')} - {latest('weight', 'morning')},
+                   COALESCE({latest('flagged', 'morning')}, 0), COALESCE({latest('flagged', 'evening')}, 0)
+            WHERE EXISTS (SELECT 1 FROM weight_records WHERE date = {date_expr});
+        '''
+    
+    def _create_daily_weights(self, cursor):
+        """创建每天一行的早晚体重表，由触发器与weight_records保持同步，首次创建时回填"""
+        cursor.execute('''
+            SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'daily_weights'
+        ''')
+        exists = cursor.fetchone() is not None
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_weights (
+                day TEXT PRIMARY KEY,
+                morning REAL,
+                evening REAL,
+                diff REAL,
+                morning_flagged INTEGER NOT NULL DEFAULT 0,
+                evening_flagged INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        # 记录在冷热两层之间移动时每天的早晚体重不变，不需要刷新
+        self._create_trigger(cursor, 'daily_weights_insert', f'''
+            AFTER INSERT ON weight_records WHEN {self.MOVING_GUARD} BEGIN
+                {self._daily_refresh_sql('NEW.date')}
+            END
+        ''')
+        self._create_trigger(cursor, 'daily_weights_delete', f'''
+            AFTER DELETE ON weight_records WHEN {self.MOVING_GUARD} BEGIN
+                {self._daily_refresh_sql('OLD.date')}
+            END
+        ''')
+        self._create_trigger(cursor, 'daily_weights_update', f'''
+            AFTER UPDATE ON weight_records WHEN {self.MOVING_GUARD} BEGIN
+                {self._daily_refresh_sql('OLD.date')}
+                {self._daily_refresh_sql('NEW.date')}
+            END
+        ''')
+        
+        if not exists:
+            self._rebuild_daily_weights(cursor)
+    
+    def _rebuild_daily_weights(self, cursor):
+        source = self._source(cursor.connection, 'weight_records')
+        cursor.execute('DELETE FROM daily_weights')
+        cursor.execute(f'''
+            INSERT INTO daily_weights (day, morning, evening, diff, morning_flagged, evening_flagged)
+            SELECT days.date, m.weight, e.weight, e.weight - m.weight,
+                   COALESCE(m.flagged, 0), COALESCE(e.flagged, 0)
+            FROM (
+                SELECT date,
+                       MAX(CASE WHEN weight_type = 'morning' THEN id END) AS morning_id,
+                       MAX(CASE WHEN weight_type = 'evening' THEN id END) AS evening_id
+                FROM {source}
+                GROUP BY date
+            ) AS days
+            LEFT JOIN {source} m ON m.id = days.morning_id
+            LEFT JOIN {source} e ON e.id = days.evening_id
+        ''')
+    
+    def _create_ledger(self, cursor):
+        """创建导入导出台账和数据代数计数器
+        
+        weight_records和diary_entries的任何修改都会通过触发器使代数加一，
+        台账记录每个文件导入或导出时的代数，代数相同说明数据库在此之后没有变化。
+        direction为export（导出）、import（替换全部数据的导入和恢复）或merge（合并导入）。
+        """
+        # value不声明类型：代数和标志为整数，归档分界日期为文本，按写入时的类型保存
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value NOT NULL
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0)")
+        
+        # 记录在冷热两层之间移动不算修改
+        for table in ('weight_records', 'diary_entries'):
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                self._create_trigger(cursor, f'{table}_generation_{event.lower()}', f'''
+                    AFTER {event} ON {table} WHEN {self.MOVING_GUARD} BEGIN
+                        UPDATE meta SET value = value + 1 WHERE key = 'generation';
+                    END
+                ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS import_ledger (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                direction TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                generation INTEGER,
+                weight_count INTEGER NOT NULL DEFAULT 0,
+                diary_count INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_import_ledger_generation
+            ON import_ledger (generation)
+        ''')
+    
+    def _create_stats(self, cursor):
+        """创建维护记录表，每次例行维护记录一行数据库大小和页面统计，见run_maintenance"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS db_stats (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                page_size INTEGER NOT NULL,
+                page_count INTEGER NOT NULL,
+                freelist_count INTEGER NOT NULL,
+                db_size INTEGER NOT NULL,
+                wal_size INTEGER NOT NULL,
+                archive_size INTEGER NOT NULL DEFAULT 0,
+                reclaimed_pages INTEGER NOT NULL DEFAULT 0,
+                integrity TEXT NOT NULL,
+                seconds REAL NOT NULL
+            )
+        ''')
+    
+    def _create_diary_search(self, cursor):
+        """创建日记全文索引，由触发器与diary_entries保持同步
+        
+        使用trigram分词器，不依赖分词词典即可检索中文。
+        SQLite不支持FTS5或trigram时跳过，搜索退回LIKE匹配。
+        """
+        try:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'diary_fts'"
+            )
+            if cursor.fetchone():
+                self.fts_available = True
+                return
             
-            # 检查是否有写入权限
-            if self._check_write_permission(export_dir):
-                env_type = "Android" if is_android else "非Android"
-                Logger.info(f"{env_type}环境：成功获取导出路径 - {export_path}")
-                return export_path
-            else:
-                Logger.warning(f"没有写入权限: {export_dir}")
-                # 尝试直接使用基础目录
-                fallback_path = os.path.join(base_dir, filename)
-                if self._check_write_permission(base_dir):
-                    Logger.warning(f"使用基础目录作为备选: {fallback_path}")
-                    return fallback_path
-                return None
-        except Exception as e:
-            Logger.error(f"确保目录存在时出错: {str(e)}")
+            cursor.execute('''
+                CREATE VIRTUAL TABLE diary_fts USING fts5(
+                    food, thoughts,
+                    content='diary_entries', content_rowid='id',
+                    tokenize='trigram'
+                )
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS diary_fts_insert AFTER INSERT ON diary_entries BEGIN
+                    INSERT INTO diary_fts (rowid, food, thoughts)
+                    VALUES (new.id, new.food, new.thoughts);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS diary_fts_delete AFTER DELETE ON diary_entries BEGIN
+                    INSERT INTO diary_fts (diary_fts, rowid, food, thoughts)
+                    VALUES ('delete', old.id, old.food, old.thoughts);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS diary_fts_update AFTER UPDATE ON diary_entries BEGIN
+                    INSERT INTO diary_fts (diary_fts, rowid, food, thoughts)
+                    VALUES ('delete', old.id, old.food, old.thoughts);
+                    INSERT INTO diary_fts (rowid, food, thoughts)
+                    VALUES (new.id, new.food, new.thoughts);
+                END
+            ''')
+            # 为已有日记建立索引
+            cursor.execute("INSERT INTO diary_fts (diary_fts) VALUES ('rebuild')")
+            self.fts_available = True
+            Logger.info("Database: 日记全文索引创建成功")
+        except sqlite3.OperationalError as e:
+            Logger.warning(f"Database: 无法创建日记全文索引，搜索将使用LIKE匹配 - {str(e)}")
+            self.fts_available = False
+    
+    @staticmethod
+    def _archive_path(db_path):
+        """归档数据库的路径：与主数据库在同一目录，文件名加 _archive 后缀"""
+        if not db_path or db_path == ':memory:' or db_path.startswith('file:'):
             return None
+        root, ext = os.path.splitext(db_path)
+        return f"{root}_archive{ext or '.db'}"
     
-    def _check_write_permission(self, directory):
-        """检查目录是否有写入权限"""
-        try:
-            if not directory or not os.path.exists(directory):
-                # 如果目录不存在，尝试检查父目录
-                parent_dir = os.path.dirname(directory)
-                if parent_dir and parent_dir != directory:  # 避免无限递归
-                    return self._check_write_permission(parent_dir)
-                return False
+    def _create_archive_tables(self, cursor):
+        """在附加的归档数据库中创建与主库结构相同的表和日期索引（已存在时跳过）
+        
+        记录保留在主库中分配的id，归档表不使用AUTOINCREMENT。冷数据很少被搜索，
+        归档库不建全文索引，搜索时冷层使用LIKE匹配。
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS archive.weight_records (
+                id INTEGER PRIMARY KEY,
+                date TEXT NOT NULL,
+                weight_type TEXT NOT NULL,
+                weight REAL NOT NULL,
+                created_at TIMESTAMP,
+                flagged INTEGER NOT NULL DEFAULT 0,
+                import_id INTEGER
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS archive.diary_entries (
+                id INTEGER PRIMARY KEY,
+                date TEXT NOT NULL,
+                food TEXT,
+                thoughts TEXT,
+                created_at TIMESTAMP,
+                import_id INTEGER
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS archive.idx_weight_records_date
+            ON weight_records (date, weight_type)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS archive.idx_diary_entries_date
+            ON diary_entries (date)
+        ''')
+    
+    def _attach_archive(self, conn, create=False):
+        """把归档数据库附加到连接上，附加后两个表的查询通过_source合并冷热两层
+        
+        Args:
+            conn: get_connection返回的连接，不能处于事务中
+            create: 归档文件不存在时是否创建
             
-            # 测试写入权限
-            test_file = os.path.join(directory, "permission_test.tmp")
-            try:
-                with open(test_file, 'w') as f:
-                    f.write("test")
-                # 写入成功，清理测试文件
-                os.remove(test_file)
-                Logger.debug(f"写入权限检查通过: {directory}")
-                return True
-            except:
-                Logger.warning(f"写入权限检查失败: {directory}")
-                return False
-        except Exception as e:
-            Logger.error(f"检查写入权限时出错: {str(e)}")
+        Returns:
+            bool: 连接是否附加了归档数据库
+        """
+        if conn.archive_attached:
+            return True
+        if not self.archive_path or not (create or os.path.exists(self.archive_path)):
             return False
+        
+        conn.execute('ATTACH DATABASE ? AS archive', (self.archive_path,))
+        if create:
+            conn.execute('PRAGMA archive.auto_vacuum=INCREMENTAL')
+            conn.execute('PRAGMA archive.journal_mode=WAL')
+        self._create_archive_tables(conn.cursor())
+        conn.commit()
+        conn.archive_attached = True
+        return True
+    
+    def _source(self, conn, table):
+        """查询weight_records或diary_entries时FROM子句中的数据来源
+        
+        连接附加了归档数据库时为热层和冷层的UNION ALL子查询，冷层只取早于归档分界日期的行。
+        SQLite把外层的WHERE条件下推到两边，有ORDER BY时按各自的索引顺序归并两边的结果，
+        分页和按日期范围的查询不需要读取整个冷层。
+        """
+        if not getattr(conn, 'archive_attached', False):
+            return table
+        columns = ', '.join(self.ARCHIVE_COLUMNS[table])
+        return (f"(SELECT {columns} FROM main.{table} UNION ALL "
+                f"SELECT {columns} FROM archive.{table} WHERE date < {self.ARCHIVE_BEFORE_SQL})")
+    
+    def _archive_before(self, cursor):
+        """当前的归档分界日期，没有归档时为空字符串"""
+        cursor.execute(f'SELECT {self.ARCHIVE_BEFORE_SQL}')
+        return cursor.fetchone()[0]
+    
+    @staticmethod
+    def _set_archive_before(cursor, archive_before):
+        """设置归档分界日期，空字符串表示冷层的全部行都作废（替换全部数据后）"""
+        if archive_before:
+            cursor.execute(
+                "INSERT OR REPLACE INTO main.meta (key, value) VALUES ('archive_before', ?)",
+                (archive_before,),
+            )
+        else:
+            cursor.execute("DELETE FROM main.meta WHERE key = 'archive_before'")
+    
+    @contextmanager
+    def _moving_rows(self, cursor):
+        """在冷热两层之间移动记录期间跳过daily_weights和数据代数的触发器，须在写事务中使用"""
+        cursor.execute("INSERT OR REPLACE INTO main.meta (key, value) VALUES ('moving', 1)")
+        try:
+            yield
+        finally:
+            cursor.execute("UPDATE main.meta SET value = 0 WHERE key = 'moving'")
+    
+    def _clear_records(self, cursor):
+        """替换全部数据前清空体重记录和日记，在调用方的写事务中执行
+        
+        触发器只删除主库中日期对应的daily_weights行，已归档日期的行在这里一并清空；
+        归档库中的记录随分界日期清空一起作废，提交后由_purge_archive删除。
+        """
+        cursor.execute('DELETE FROM weight_records')
+        cursor.execute('DELETE FROM diary_entries')
+        cursor.execute('DELETE FROM daily_weights')
+        self._set_archive_before(cursor, '')
+    
+    def _purge_archive(self):
+        """删除归档库中不早于分界日期的作废记录，替换全部数据并提交后调用
+        
+        单独的事务只写归档库，中途失败时作废的记录留在归档库中，读取时被忽略，下次归档时清理。
+        """
+        if not self.archive_path or not os.path.exists(self.archive_path):
+            return
+        
+        def purge(cursor):
+            if not cursor.connection.archive_attached:
+                return
+            archive_before = self._archive_before(cursor)
+            for table in self.ARCHIVE_COLUMNS:
+                cursor.execute(f"DELETE FROM archive.{table} WHERE date >= ?", (archive_before,))
+        
+        self._write_with_retry(purge, "清理归档数据库")
+    
+    def _drop_analytics(self):
+        """丢弃列式缓存，下次使用时重新加载"""
+        with self._analytics_lock:
+            self._analytics = None
+    
+    def _thaw_archive(self, cursor, date_str):
+        """写入早于归档分界日期的记录前，把该日期及之后的冷数据移回主库，分界日期提前到date_str
+        
+        在调用方的写事务中执行，只修改主库：归档库中留下的副本不早于新的分界日期，
+        读取时被忽略，下次归档时清理。附加数据库的WAL事务不是跨文件原子提交的，
+        每个事务只写一个文件，中途崩溃时记录不会丢失也不会重复出现。
+        """
+        if not getattr(cursor.connection, 'archive_attached', False):
+            return
+        archive_before = self._archive_before(cursor)
+        if not archive_before or date_str >= archive_before:
+            return
+        
+        with self._moving_rows(cursor):
+            for table, columns in self.ARCHIVE_COLUMNS.items():
+                columns = ', '.join(columns)
+                cursor.execute(f'''
+                    INSERT INTO main.{table} ({columns})
+                    SELECT {columns} FROM archive.{table}
+                    WHERE date >= ? AND date < ?
+                    ORDER BY id
+                ''', (date_str, archive_before))
+            self._set_archive_before(cursor, date_str)
+        Logger.info(f"Database: 已将 {date_str} 及之后的归档记录移回主数据库")
     
     def init_database(self):
         """初始化数据库"""
@@ -585,28 +1178,20 @@ class WeightDatabase:
                     os.makedirs(db_dir)
                     Logger.info(f"Database: 创建目录 - {db_dir}")
                 
-                conn = sqlite3.connect(self.db_path)
+                conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
                 cursor = conn.cursor()
                 
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS weight_records (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        date TEXT NOT NULL,
-                        weight_type TEXT NOT NULL,
-                        weight REAL NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS diary_entries (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        date TEXT NOT NULL,
-                        food TEXT,
-                        thoughts TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
+                # 新建的数据库删除数据后可以增量回收空闲页，已有数据库在首次维护时转换
+                cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                # WAL模式下读写互不阻塞，多个进程同时访问时只有写操作需要排队
+                cursor.execute('PRAGMA journal_mode=WAL')
+                self._create_tables(cursor)
+                self._migrate_columns(cursor)
+                self._create_diary_search(cursor)
+                self._create_rollups(cursor)
+                self._create_daily_weights(cursor)
+                self._create_ledger(cursor)
+                self._create_stats(cursor)
                 
                 conn.commit()
                 conn.close()
@@ -619,28 +1204,17 @@ class WeightDatabase:
                     # 最后一次尝试失败，使用内存数据库
                     try:
                         self.db_path = ":memory:"
+                        self.archive_path = None
                         conn = sqlite3.connect(self.db_path)
                         cursor = conn.cursor()
                         
-                        cursor.execute('''
-                            CREATE TABLE IF NOT EXISTS weight_records (
-                                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                date TEXT NOT NULL,
-                                weight_type TEXT NOT NULL,
-                                weight REAL NOT NULL,
-                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                            )
-                        ''')
-                        
-                        cursor.execute('''
-                            CREATE TABLE IF NOT EXISTS diary_entries (
-                                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                date TEXT NOT NULL,
-                                food TEXT,
-                                thoughts TEXT,
-                                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                            )
-                        ''')
+                        self._create_tables(cursor)
+                        self._migrate_columns(cursor)
+                        self._create_diary_search(cursor)
+                        self._create_rollups(cursor)
+                        self._create_daily_weights(cursor)
+                        self._create_ledger(cursor)
+                        self._create_stats(cursor)
                         
                         conn.commit()
                         conn.close()
@@ -648,50 +1222,184 @@ class WeightDatabase:
                     except Exception as e2:
                         Logger.error(f"Database: 内存数据库也失败 - {str(e2)}")
     
+    @contextmanager
+    def read_snapshot(self):
+        """在一个读事务中执行多个查询
+        
+        with块内当前线程的所有查询共用同一个连接和同一个读事务，
+        看到的是一致的数据快照，也省去了每次查询重新建立连接的开销。
+        """
+        if getattr(self._local, 'snapshot_conn', None) is not None:
+            # 已经处于快照中，直接复用
+            yield
+            return
+        
+        conn = self.get_connection()
+        if not conn:
+            yield
+            return
+        
+        try:
+            conn.execute('BEGIN')
+            self._local.snapshot_conn = _SnapshotConnection(conn)
+            yield
+        finally:
+            self._local.snapshot_conn = None
+            try:
+                conn.rollback()
+                conn.close()
+            except Exception as e:
+                Logger.warning(f"Database: 关闭读快照失败 - {str(e)}")
+    
     def get_connection(self):
         """获取数据库连接，并确保表存在"""
+        snapshot_conn = getattr(self._local, 'snapshot_conn', None)
+        if snapshot_conn is not None:
+            return snapshot_conn
+        
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, factory=_Connection)
             
             # 额外的安全检查：确保表存在
             cursor = conn.cursor()
             
-            # 检查并创建weight_records表
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS weight_records (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    date TEXT NOT NULL,
-                    weight_type TEXT NOT NULL,
-                    weight REAL NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # 检查并创建diary_entries表
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS diary_entries (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    date TEXT NOT NULL,
-                    food TEXT,
-                    thoughts TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+            # 检查并创建数据表
+            self._create_tables(cursor)
             
             conn.commit()
+            # 已有归档数据库时附加，读取时透明地合并冷热两层
+            try:
+                self._attach_archive(conn)
+            except sqlite3.Error as e:
+                Logger.warning(f"Database: 附加归档数据库失败，只读取主数据库 - {str(e)}")
             return conn
         except Exception as e:
             Logger.error(f"Database: 获取连接失败 - {str(e)}")
             return None
     
-    def add_weight_record(self, date_str, weight_type, weight):
-        conn = self.get_connection()
-        if not conn:
-            return False
-            
-        try:
-            cursor = conn.cursor()
+    def _write_with_retry(self, write, description):
+        """在写事务中执行write(cursor)，数据库被锁定时退避后重试
+        
+        使用BEGIN IMMEDIATE在事务开始时就获取写锁，先查询再写入的操作
+        不会因为其他进程在中间插入而产生重复记录。
+        
+        Returns:
+            bool: 是否写入成功
+        """
+        for attempt in range(self.write_retries + 1):
+            conn = self.get_connection()
+            if not conn:
+                return False
             
+            try:
+                cursor = conn.cursor()
+                cursor.execute('BEGIN IMMEDIATE')
+                write(cursor)
+                conn.commit()
+                conn.close()
+                return True
+            except sqlite3.OperationalError as e:
+                try:
+                    conn.rollback()
+                    conn.close()
+                except:
+                    pass
+                
+                message = str(e).lower()
+                if ('locked' in message or 'busy' in message) and attempt < self.write_retries:
+                    delay = self.RETRY_BASE_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5)
+                    Logger.warning(f"Database: {description}时数据库被锁定，{delay:.2f}秒后重试 "
+                                   f"({attempt + 1}/{self.write_retries})")
+                    time.sleep(delay)
+                    continue
+                
+                Logger.error(f"Database: {description}失败 - {str(e)}")
+                return False
+            except Exception as e:
+                Logger.error(f"Database: {description}失败 - {str(e)}")
+                try:
+                    conn.rollback()
+                    conn.close()
+                except:
+                    pass
+                return False
+        return False
+    
+    def _data_version(self):
+        """返回PRAGMA data_version，其他连接（包括其他进程）提交修改后该值会变化
+        
+        该值只保证有变化，不反映提交的次数。调用方须持有_analytics_lock，_version_conn在线程间共用。
+        """
+        if self._version_conn is None:
+            self._version_conn = sqlite3.connect(
+                self.db_path, timeout=self.busy_timeout, check_same_thread=False
+            )
+        return self._version_conn.execute('PRAGMA data_version').fetchone()[0]
+    
+    def get_analytics(self):
+        """返回体重历史的列式缓存(analytics.WeightColumns)
+        
+        首次调用时从数据库加载；数据库被本实例以外的连接修改过时重新加载。
+        加载失败时返回None，调用方应退回到直接查询数据库。
+        """
+        with self._analytics_lock:
+            try:
+                version = self._data_version()
+                if self._analytics is None or version != self._analytics_version:
+                    self._analytics = analytics.WeightColumns.from_daily(
+                        (
+                            (day, morning, evening, morning_flagged, evening_flagged)
+                            for day, morning, evening, _, morning_flagged, evening_flagged
+                            in self.iter_daily_weights()
+                        ),
+                        exclude_flagged=self.exclude_flagged,
+                    )
+                    self._analytics_version = version
+                    Logger.info(f"Database: 加载分析缓存 - {len(self._analytics)} 天, "
+                                f"{self._analytics.memory_bytes()} 字节")
+                return self._analytics
+            except Exception as e:
+                Logger.error(f"Database: 加载分析缓存失败 - {str(e)}")
+                self._analytics = None
+                return None
+    
+    def _apply_to_analytics(self, version_before, generation, date_str, weight_type, weight, flagged=False):
+        """把本实例的写入直接更新到已加载的缓存中，避免重新加载整个历史
+        
+        version_before和generation是在写事务中（持有写锁时）读取的写入前的data_version和写入后的数据代数。
+        data_version与缓存不一致说明写入前有其他连接修改过数据库；提交后先读data_version再读数据代数，
+        代数与本次写入后的不同说明本次提交之后又有其他连接修改了记录。两种情况都丢弃缓存，下次使用时重新加载。
+        """
+        with self._analytics_lock:
+            if self._analytics is None:
+                return
+            try:
+                version_after = self._data_version()
+                row = self._version_conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+                if (version_before != self._analytics_version or row is None or row[0] != generation
+                        or (flagged and self.exclude_flagged)):
+                    # 被排除的异常记录可能覆盖了缓存中的旧值，直接重新加载
+                    self._analytics = None
+                    return
+                day = parse_date(date_str).toordinal()
+                self._analytics.set(day, weight_type, weight)
+                self._analytics_version = version_after
+                if self._trend is not None and self._trend_source is self._analytics:
+                    self._trend.update(day, self._analytics.primary_on(day))
+                if self._detector is not None and self._detector_source is self._analytics:
+                    self._detector.update(weight_type, weight)
+            except Exception as e:
+                Logger.warning(f"Database: 更新分析缓存失败 - {str(e)}")
+                self._analytics = None
+    
+    def add_weight_record(self, date_str, weight_type, weight, flagged=False):
+        versions = []
+        
+        def write(cursor):
+            # 持有写锁时其他连接无法提交，此时读到的data_version就是本次写入之前的版本
+            with self._analytics_lock:
+                version_before = self._data_version() if self._analytics is not None else None
+            self._thaw_archive(cursor, date_str)
             cursor.execute('''
                 SELECT id FROM weight_records 
                 WHERE date = ? AND weight_type = ?
@@ -702,39 +1410,59 @@ class WeightDatabase:
             if existing_record:
                 cursor.execute('''
                     UPDATE weight_records 
-                    SET weight = ?, created_at = CURRENT_TIMESTAMP
+                    SET weight = ?, flagged = ?, import_id = NULL, created_at = CURRENT_TIMESTAMP
                     WHERE id = ?
-                ''', (weight, existing_record[0]))
+                ''', (weight, int(flagged), existing_record[0]))
             else:
                 cursor.execute('''
-                    INSERT INTO weight_records (date, weight_type, weight)
-                    VALUES (?, ?, ?)
-                ''', (date_str, weight_type, weight))
+                    INSERT INTO weight_records (date, weight_type, weight, flagged)
+                    VALUES (?, ?, ?, ?)
+                ''', (date_str, weight_type, weight, int(flagged)))
             
-            conn.commit()
-            conn.close()
-            Logger.info(f"Database: 体重记录成功 - {date_str} {weight_type} {weight}斤")
-            return True
-        except Exception as e:
-            Logger.error(f"Database: 体重记录失败 - {str(e)}")
-            try:
-                conn.close()
-            except:
-                pass
+            self._update_rollups(cursor, date_str)
+            if version_before is not None:
+                cursor.execute("SELECT value FROM meta WHERE key = 'generation'")
+                versions.append((version_before, cursor.fetchone()[0]))
+        
+        if not self._write_with_retry(write, "体重记录"):
             return False
+        if versions:
+            self._apply_to_analytics(*versions[-1], date_str, weight_type, weight, flagged)
+        Logger.info(f"Database: 体重记录成功 - {date_str} {weight_type} {weight}斤")
+        return True
             
+    def set_exclude_flagged(self, exclude):
+        """设置统计时是否排除异常记录，变化时丢弃列式缓存"""
+        exclude = bool(exclude)
+        if exclude != self.exclude_flagged:
+            with self._analytics_lock:
+                self.exclude_flagged = exclude
+                self._analytics = None
+    
+    def check_weight(self, weight_type, weight):
+        """写入前检查体重是否明显偏离近期同一时间段的体重
+        
+        检测器从列式缓存回放一次历史后，每次写入只做O(1)的增量更新。
+        
+        Returns:
+            dict: 异常时返回 {'expected': 近期均值, 'sigma': 标准差, 'z': 偏离的标准差倍数}，否则返回None
+        """
+        columns = self.get_analytics()
+        if columns is None:
+            return None
+        with self._analytics_lock:
+            if self._detector is None or self._detector_source is not columns:
+                self._detector = analytics.OutlierDetector.from_columns(columns)
+                self._detector_source = columns
+            return self._detector.check(weight_type, weight)
+    
     def add_record(self, date_str, weight_type, weight):
         """add_weight_record的别名，用于兼容测试脚本"""
         return self.add_weight_record(date_str, weight_type, weight)
     
     def add_diary_entry(self, date_str, food, thoughts):
-        conn = self.get_connection()
-        if not conn:
-            return False
-            
-        try:
-            cursor = conn.cursor()
-            
+        def write(cursor):
+            self._thaw_archive(cursor, date_str)
             cursor.execute('''
                 SELECT id FROM diary_entries WHERE date = ?
             ''', (date_str,))
@@ -744,7 +1472,7 @@ class WeightDatabase:
             if existing_entry:
                 cursor.execute('''
                     UPDATE diary_entries 
-                    SET food = ?, thoughts = ?, created_at = CURRENT_TIMESTAMP
+                    SET food = ?, thoughts = ?, import_id = NULL, created_at = CURRENT_TIMESTAMP
                     WHERE id = ?
                 ''', (food, thoughts, existing_entry[0]))
             else:
@@ -752,18 +1480,11 @@ class WeightDatabase:
                     INSERT INTO diary_entries (date, food, thoughts)
                     VALUES (?, ?, ?)
                 ''', (date_str, food, thoughts))
-            
-            conn.commit()
-            conn.close()
-            Logger.info(f"Database: 日记记录成功 - {date_str}")
-            return True
-        except Exception as e:
-            Logger.error(f"Database: 日记记录失败 - {str(e)}")
-            try:
-                conn.close()
-            except:
-                pass
+        
+        if not self._write_with_retry(write, "日记记录"):
             return False
+        Logger.info(f"Database: 日记记录成功 - {date_str}")
+        return True
     
     def get_today_diary_entry(self):
         """获取今天的日记记录"""
@@ -802,9 +1523,9 @@ class WeightDatabase:
         try:
             cursor = conn.cursor()
             
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT date, weight_type, weight 
-                FROM weight_records 
+                FROM {self._source(conn, 'weight_records')} 
                 ORDER BY date DESC, weight_type ASC
                 LIMIT ?
             ''', (days * 2,))
@@ -827,40 +1548,150 @@ class WeightDatabase:
                 pass
             return []
     
-    def get_all_records(self):
+    def get_records_page(self, before=None, limit=50):
+        """按日期倒序分页获取体重记录（键集分页）
+        
+        Args:
+            before: 上一页最后一条记录，None表示获取第一页
+            limit: 每页记录数
+            
+        Returns:
+            list: (id, 日期, 时间类型, 体重, 是否异常) 元组列表，日期为数据库中的存储格式
+        """
         conn = self.get_connection()
         if not conn:
-            Logger.warning("Database: 无法获取连接，返回空记录")
             return []
             
         try:
             cursor = conn.cursor()
+            source = self._source(conn, 'weight_records')
             
-            cursor.execute('''
-                SELECT date, weight_type, weight 
-                FROM weight_records 
-                ORDER BY date ASC
-            ''')
+            if before is None:
+                cursor.execute(f'''
+                    SELECT id, date, weight_type, weight, flagged
+                    FROM {source}
+                    ORDER BY date DESC, weight_type ASC, id ASC
+                    LIMIT ?
+                ''', (limit,))
+            else:
+                record_id, date_str, weight_type = before[0], before[1], before[2]
+                cursor.execute(f'''
+                    SELECT id, date, weight_type, weight, flagged
+                    FROM {source}
+                    WHERE date < ?
+                       OR (date = ? AND (weight_type > ? OR (weight_type = ? AND id > ?)))
+                    ORDER BY date DESC, weight_type ASC, id ASC
+                    LIMIT ?
+                ''', (date_str, date_str, weight_type, weight_type, record_id, limit))
             
             records = cursor.fetchall()
             conn.close()
+            return records
+        except Exception as e:
+            Logger.error(f"Database: 分页获取体重记录失败 - {str(e)}")
+            try:
+                conn.close()
+            except:
+                pass
+            return []
+    
+    def _date_range_clause(self, since, until, column='date'):
+        """生成按日期范围过滤的WHERE子句和参数，since和until均包含在内"""
+        conditions = []
+        params = []
+        if since is not None:
+            conditions.append(f'{column} >= ?')
+            params.append(format_date(since))
+        if until is not None:
+            conditions.append(f'{column} <= ?')
+            params.append(format_date(until))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return where, params
+    
+    def iter_records(self, since=None, until=None, batch=500, include_flagged=True):
+        """按日期升序逐批读取体重记录
+        
+        每次只从游标取出batch行，调用方逐条处理时内存占用与记录总数无关。
+        生成器在遍历期间保持连接打开，遍历结束或被关闭时释放连接。
+        
+        Args:
+            since: 起始日期（包含），None表示不限制
+            until: 结束日期（包含），None表示不限制
+            batch: 每次从数据库取出的行数
+            include_flagged: 是否包含标记为异常的记录
             
-            formatted_records = []
-            for record in records:
-                date_str, weight_type, weight = record
-                formatted_date = format_date(parse_date(date_str))
-                formatted_records.append((formatted_date, weight_type, weight))
+        Yields:
+            tuple: (日期, 时间类型, 体重)
+        """
+        conn = self.get_connection()
+        if not conn:
+            Logger.warning("Database: 无法获取连接，返回空记录")
+            return
+        
+        try:
+            where, params = self._date_range_clause(since, until)
+            if not include_flagged:
+                where = f"{where} AND flagged = 0" if where else "WHERE flagged = 0"
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT date, weight_type, weight 
+                FROM {self._source(conn, 'weight_records')} 
+                {where}
+                ORDER BY date ASC
+            ''', params)
             
-            return formatted_records
+            while True:
+                rows = cursor.fetchmany(batch)
+                if not rows:
+                    break
+                for date_str, weight_type, weight in rows:
+                    yield format_date(parse_date(date_str)), weight_type, weight
+        finally:
+            try:
+                conn.close()
+            except:
+                pass
+    
+    def iter_daily_weights(self, since=None, until=None, batch=500):
+        """按日期升序逐批读取daily_weights，每天一行
+        
+        Yields:
+            tuple: (日期, 早晨体重, 晚上体重, 晚上减早晨的差值, 早晨是否异常, 晚上是否异常)，
+                   缺少的体重和差值为None
+        """
+        conn = self.get_connection()
+        if not conn:
+            return
+        
+        try:
+            where, params = self._date_range_clause(since, until, column='day')
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT day, morning, evening, diff, morning_flagged, evening_flagged
+                FROM daily_weights
+                {where}
+                ORDER BY day ASC
+            ''', params)
+            
+            while True:
+                rows = cursor.fetchmany(batch)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            try:
+                conn.close()
+            except:
+                pass
+    
+    def get_all_records(self):
+        try:
+            return list(self.iter_records())
         except sqlite3.OperationalError as e:
             error_msg = str(e)
             if "no such table" in error_msg:
                 Logger.error(f"Database: 表不存在，尝试重新创建 - {error_msg}")
                 # 尝试重新初始化数据库
-                try:
-                    conn.close()
-                except:
-                    pass
                 self.init_database()
                 # 重新尝试获取记录
                 return self.get_all_records()
@@ -868,11 +1699,6 @@ class WeightDatabase:
                 Logger.error(f"Database: 操作错误 - {error_msg}")
         except Exception as e:
             Logger.error(f"Database: 获取所有记录失败 - {str(e)}")
-        finally:
-            try:
-                conn.close()
-            except:
-                pass
         return []
     
     def get_recent_diary_entries(self, count=10):
@@ -883,9 +1709,9 @@ class WeightDatabase:
         try:
             cursor = conn.cursor()
             
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT date, food, thoughts 
-                FROM diary_entries 
+                FROM {self._source(conn, 'diary_entries')} 
                 ORDER BY date DESC
                 LIMIT ?
             ''', (count,))
@@ -908,132 +1734,430 @@ class WeightDatabase:
                 pass
             return []
     
-    def get_all_diary_entries(self):
+    def get_diary_page(self, before=None, limit=20):
+        """按日期倒序分页获取日记（键集分页）
+        
+        Args:
+            before: 上一页最后一条日记，None表示获取第一页
+            limit: 每页日记数
+            
+        Returns:
+            list: (id, 日期, 饮食记录, 减肥心得) 元组列表，日期为数据库中的存储格式
+        """
         conn = self.get_connection()
         if not conn:
             return []
             
         try:
             cursor = conn.cursor()
+            source = self._source(conn, 'diary_entries')
             
-            cursor.execute('''
-                SELECT date, food, thoughts 
-                FROM diary_entries 
-                ORDER BY date ASC
-            ''')
+            if before is None:
+                cursor.execute(f'''
+                    SELECT id, date, food, thoughts
+                    FROM {source}
+                    ORDER BY date DESC, id DESC
+                    LIMIT ?
+                ''', (limit,))
+            else:
+                entry_id, date_str = before[0], before[1]
+                cursor.execute(f'''
+                    SELECT id, date, food, thoughts
+                    FROM {source}
+                    WHERE date < ? OR (date = ? AND id < ?)
+                    ORDER BY date DESC, id DESC
+                    LIMIT ?
+                ''', (date_str, date_str, entry_id, limit))
             
             entries = cursor.fetchall()
             conn.close()
-            
-            formatted_entries = []
-            for entry in entries:
-                date_str, food, thoughts = entry
-                formatted_date = format_date(parse_date(date_str))
-                formatted_entries.append((formatted_date, food, thoughts))
-            
-            return formatted_entries
+            return entries
         except Exception as e:
-            Logger.error(f"Database: 获取所有日记失败 - {str(e)}")
+            Logger.error(f"Database: 分页获取日记失败 - {str(e)}")
             try:
                 conn.close()
             except:
                 pass
             return []
     
-    def get_weight_statistics(self):
+    def search_diary(self, query, limit=20, offset=0):
+        """按关键词搜索日记的饮食记录和减肥心得
+        
+        关键词之间用空格分隔，需要同时匹配。所有关键词都不少于3个字时
+        使用全文索引并按相关度排序，否则退回LIKE匹配并按日期倒序排列。
+        
+        Args:
+            query: 搜索关键词
+            limit: 返回的最大条数
+            offset: 跳过的条数，用于分页
+            
+        Returns:
+            list: (id, 日期, 饮食记录, 减肥心得) 元组列表
+        """
+        terms = str(query or '').split()
+        if not terms:
+            return []
+        
         conn = self.get_connection()
         if not conn:
-            return None
+            return []
             
         try:
             cursor = conn.cursor()
             
-            cursor.execute('''
-                SELECT weight FROM weight_records ORDER BY date ASC LIMIT 1
-            ''')
-            initial_record = cursor.fetchone()
-            
-            cursor.execute('''
-                SELECT MIN(weight) FROM weight_records
-            ''')
-            lightest_record = cursor.fetchone()
-            
-            cursor.execute('''
-                SELECT MAX(weight) FROM weight_records
-            ''')
-            heaviest_record = cursor.fetchone()
+            conditions = []
+            params = []
+            for term in terms:
+                pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                conditions.append("(food LIKE ? ESCAPE '\\' OR thoughts LIKE ? ESCAPE '\\')")
+                params.extend([pattern, pattern])
             
-            cursor.execute('''
-                SELECT AVG(weight) FROM weight_records
-            ''')
-            average_record = cursor.fetchone()
+            if self.fts_available and all(len(term) >= 3 for term in terms):
+                # 每个关键词作为一个短语，短语之间是AND关系
+                match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+                if conn.archive_attached:
+                    # 归档的日记没有全文索引，用LIKE匹配，排在主库的结果之后按日期倒序排列
+                    cursor.execute(f'''
+                        SELECT d.id, d.date, d.food, d.thoughts, 0 AS tier, diary_fts.rank AS rank
+                        FROM diary_fts
+                        JOIN main.diary_entries d ON d.id = diary_fts.rowid
+                        WHERE diary_fts MATCH ?
+                        UNION ALL
+                        SELECT id, date, food, thoughts, 1, NULL
+                        FROM archive.diary_entries
+                        WHERE date < {self.ARCHIVE_BEFORE_SQL} AND {" AND ".join(conditions)}
+                        ORDER BY tier, rank, date DESC
+                        LIMIT ? OFFSET ?
+                    ''', [match] + params + [limit, offset])
+                else:
+                    cursor.execute('''
+                        SELECT d.id, d.date, d.food, d.thoughts
+                        FROM diary_fts
+                        JOIN diary_entries d ON d.id = diary_fts.rowid
+                        WHERE diary_fts MATCH ?
+                        ORDER BY diary_fts.rank, d.date DESC
+                        LIMIT ? OFFSET ?
+                    ''', (match, limit, offset))
+            else:
+                cursor.execute(f'''
+                    SELECT id, date, food, thoughts
+                    FROM {self._source(conn, 'diary_entries')}
+                    WHERE {" AND ".join(conditions)}
+                    ORDER BY date DESC, id DESC
+                    LIMIT ? OFFSET ?
+                ''', params + [limit, offset])
             
+            entries = [row[:4] for row in cursor.fetchall()]
             conn.close()
-            
-            if not initial_record:
-                return None
-            
-            stats = {
-                'initial_weight': initial_record[0],
-                'lightest_weight': lightest_record[0] if lightest_record[0] else initial_record[0],
-                'heaviest_weight': heaviest_record[0] if heaviest_record[0] else initial_record[0],
-                'average_weight': average_record[0] if average_record[0] else initial_record[0],
-                'weight_difference': (heaviest_record[0] - lightest_record[0]) if heaviest_record[0] and lightest_record[0] else 0
-            }
-            
-            return stats
+            return entries
         except Exception as e:
-            Logger.error(f"Database: 获取统计信息失败 - {str(e)}")
+            Logger.error(f"Database: 搜索日记失败 - {str(e)}")
             try:
                 conn.close()
             except:
                 pass
-            return None
+            return []
     
-    def get_chart_data(self, days=30):
-        """获取图表数据"""
+    def iter_diary_entries(self, since=None, until=None, batch=200):
+        """按日期升序逐批读取日记，参数含义与iter_records相同
+        
+        Yields:
+            tuple: (日期, 饮食记录, 减肥心得)
+        """
         conn = self.get_connection()
         if not conn:
-            return {'morning_weights': [], 'evening_weights': [], 'labels': []}
-            
+            return
+        
         try:
+            where, params = self._date_range_clause(since, until)
             cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT date, weight_type, weight 
-                FROM weight_records 
+            cursor.execute(f'''
+                SELECT date, food, thoughts 
+                FROM {self._source(conn, 'diary_entries')} 
+                {where}
                 ORDER BY date ASC
-            ''')
-            
-            all_records = cursor.fetchall()
-            conn.close()
-            
-            chart_data = {}
-            labels = []
-            
-            for record in all_records:
-                date_str, weight_type, weight = record
-                
-                if date_str not in chart_data:
-                    chart_data[date_str] = {'morning': None, 'evening': None}
-                    labels.append(date_str)
-                
-                chart_data[date_str][weight_type] = weight
+            ''', params)
+            
+            while True:
+                rows = cursor.fetchmany(batch)
+                if not rows:
+                    break
+                for date_str, food, thoughts in rows:
+                    yield format_date(parse_date(date_str)), food, thoughts
+        finally:
+            try:
+                conn.close()
+            except:
+                pass
+    
+    def iter_monthly_summary(self, batch=500):
+        """按月份升序逐批读取月度汇总，每月一行
+        
+        由weight_rollups中按月汇总的行在SQL中转置得到，不需要读取原始记录。
+        
+        Yields:
+            tuple: (月份YYYY/MM, 早晨记录数, 早晨最低, 早晨最高, 早晨平均, 早晨变化,
+                    晚上记录数, 晚上最低, 晚上最高, 晚上平均, 晚上变化)，
+                   变化为当月最后一次减第一次记录的体重，该月没有对应时间段的记录时为None
+        """
+        conn = self.get_connection()
+        if not conn:
+            return
+        
+        try:
+            columns = ', '.join(
+                f"MAX(CASE WHEN weight_type = '{weight_type}' THEN {expression} END)"
+                for weight_type in analytics.SERIES
+                for expression in (
+                    'count', 'min_weight', 'max_weight',
+                    'ROUND(sum_weight / count, 2)', 'ROUND(last_weight - first_weight, 2)',
+                )
+            )
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT substr(period_start, 1, 7), {columns}
+                FROM weight_rollups
+                WHERE granularity = 'month'
+                GROUP BY period_start
+                ORDER BY period_start ASC
+            ''')
+            
+            while True:
+                rows = cursor.fetchmany(batch)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            try:
+                conn.close()
+            except:
+                pass
+    
+    def iter_table_rows(self, table, batch=500):
+        """按id顺序逐批读取一个表中BACKUP_COLUMNS列出的全部列，用于备份导出
+        
+        Yields:
+            tuple: 按BACKUP_COLUMNS[table]顺序排列的列值
+        """
+        columns = self.BACKUP_COLUMNS[table]
+        conn = self.get_connection()
+        if not conn:
+            return
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {', '.join(columns)} FROM {self._source(conn, table)} ORDER BY id ASC")
+            while True:
+                rows = cursor.fetchmany(batch)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            try:
+                conn.close()
+            except:
+                pass
+    
+    def get_all_diary_entries(self):
+        try:
+            return list(self.iter_diary_entries())
+        except Exception as e:
+            Logger.error(f"Database: 获取所有日记失败 - {str(e)}")
+            return []
+    
+    def get_export_summary(self):
+        """返回导出所需的记录数和各列最长内容的长度，用于在写入数据前确定列宽"""
+        conn = self.get_connection()
+        if not conn:
+            return None
+            
+        try:
+            cursor = conn.cursor()
+            
+            cursor.execute(f'''
+                SELECT COUNT(*), MAX(LENGTH(date)), MAX(LENGTH(CAST(weight AS TEXT)))
+                FROM {self._source(conn, 'weight_records')}
+            ''')
+            weight_count, weight_date_length, weight_length = cursor.fetchone()
+            
+            cursor.execute(f'''
+                SELECT COUNT(*), MAX(LENGTH(date)), MAX(LENGTH(food)), MAX(LENGTH(thoughts))
+                FROM {self._source(conn, 'diary_entries')}
+            ''')
+            diary_count, diary_date_length, food_length, thoughts_length = cursor.fetchone()
+            conn.close()
+            
+            return {
+                'weight_count': weight_count,
+                'diary_count': diary_count,
+                # 时间类型导出为"早晨"/"晚上"，固定两个字
+                'weight_lengths': [weight_date_length or 0, 2, weight_length or 0],
+                'diary_lengths': [diary_date_length or 0, food_length or 0, thoughts_length or 0],
+            }
+        except Exception as e:
+            Logger.error(f"Database: 获取导出信息失败 - {str(e)}")
+            try:
+                conn.close()
+            except:
+                pass
+            return None
+    
+    def get_weight_statistics(self):
+        columns = self.get_analytics()
+        if columns is not None:
+            return columns.statistics()
+        
+        conn = self.get_connection()
+        if not conn:
+            return None
+            
+        try:
+            cursor = conn.cursor()
+            source = self._source(conn, 'weight_records')
+            # 与列式缓存一致：设置了排除异常记录时不统计被标记的体重
+            where = 'WHERE flagged = 0' if self.exclude_flagged else ''
+            
+            cursor.execute(f'''
+                SELECT weight FROM {source} {where} ORDER BY date ASC LIMIT 1
+            ''')
+            initial_record = cursor.fetchone()
+            
+            cursor.execute(f'''
+                SELECT MIN(weight) FROM {source} {where}
+            ''')
+            lightest_record = cursor.fetchone()
+            
+            cursor.execute(f'''
+                SELECT MAX(weight) FROM {source} {where}
+            ''')
+            heaviest_record = cursor.fetchone()
+            
+            cursor.execute(f'''
+                SELECT AVG(weight) FROM {source} {where}
+            ''')
+            average_record = cursor.fetchone()
+            
+            conn.close()
+            
+            if not initial_record:
+                return None
+            
+            stats = {
+                'initial_weight': initial_record[0],
+                'lightest_weight': lightest_record[0] if lightest_record[0] else initial_record[0],
+                'heaviest_weight': heaviest_record[0] if heaviest_record[0] else initial_record[0],
+                'average_weight': average_record[0] if average_record[0] else initial_record[0],
+                'weight_difference': (heaviest_record[0] - lightest_record[0]) if heaviest_record[0] and lightest_record[0] else 0
+            }
+            
+            return stats
+        except Exception as e:
+            Logger.error(f"Database: 获取统计信息失败 - {str(e)}")
+            try:
+                conn.close()
+            except:
+                pass
+            return None
+    
+    def range_stats(self, start=None, end=None, weight_type=None):
+        """任意日期区间的体重统计
+        
+        Args:
+            start: 起始日期（包含），None表示不限制
+            end: 结束日期（包含），None表示不限制
+            weight_type: 'morning'、'evening'，None表示两者都包含
+            
+        Returns:
+            dict: count、mean、min、max、first_date、last_date，区间内没有记录时返回None
+        """
+        series = analytics.SERIES if weight_type is None else (weight_type,)
+        columns = self.get_analytics()
+        if columns is not None:
+            return columns.range_stats(start, end, series)
+        
+        conn = self.get_connection()
+        if not conn:
+            return None
+            
+        try:
+            where, params = self._date_range_clause(start, end)
+            placeholders = ', '.join('?' for _ in series)
+            where = f"{where} AND" if where else "WHERE"
+            if self.exclude_flagged:
+                where = f"{where} flagged = 0 AND"
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT COUNT(weight), AVG(weight), MIN(weight), MAX(weight), MIN(date), MAX(date)
+                FROM {self._source(conn, 'weight_records')}
+                {where} weight_type IN ({placeholders})
+            ''', params + list(series))
+            count, mean, lowest, highest, first_date, last_date = cursor.fetchone()
+            conn.close()
+            
+            if not count:
+                return None
+            return {
+                'count': count,
+                'mean': mean,
+                'min': lowest,
+                'max': highest,
+                'first_date': first_date,
+                'last_date': last_date,
+            }
+        except Exception as e:
+            Logger.error(f"Database: 获取区间统计失败 - {str(e)}")
+            try:
+                conn.close()
+            except:
+                pass
+            return None
+    
+    def get_forecast(self, goal_weight=None, horizon_days=14):
+        """拟合最近的体重趋势并预测，返回格式见forecast.TrendModel.forecast
+        
+        趋势模型在列式缓存重新加载后重建，本实例写入的新记录直接增量更新模型。
+        """
+        columns = self.get_analytics()
+        if columns is None:
+            return None
+        with self._analytics_lock:
+            if self._trend is None or self._trend_source is not columns:
+                self._trend = forecast.TrendModel.from_columns(columns)
+                self._trend_source = columns
+            return self._trend.forecast(goal_weight, horizon_days)
+    
+    def get_chart_data(self, days=30):
+        """获取图表数据"""
+        columns = self.get_analytics()
+        if columns is not None:
+            return columns.chart_data(days)
+        
+        conn = self.get_connection()
+        if not conn:
+            return {'morning_weights': [], 'evening_weights': [], 'labels': []}
+            
+        try:
+            cursor = conn.cursor()
+            
+            # daily_weights按天存储早晚体重，直接按主键倒序读取最近days天
+            cursor.execute('''
+                SELECT day, morning, evening FROM daily_weights
+                ORDER BY day DESC LIMIT ?
+            ''', (days,))
+            rows = cursor.fetchall()
+            conn.close()
             
             morning_weights = []
             evening_weights = []
             valid_labels = []
             
-            for date_str in labels[-days:]:
-                morning_weight = chart_data[date_str]['morning']
-                evening_weight = chart_data[date_str]['evening']
-                
+            for date_str, morning_weight, evening_weight in reversed(rows):
                 if morning_weight is not None:
                     morning_weights.append(morning_weight)
-                    valid_labels.append(format_date(parse_date(date_str)))
+                    valid_labels.append(date_str)
                 elif evening_weight is not None:
                     morning_weights.append(evening_weight)
-                    valid_labels.append(format_date(parse_date(date_str)))
+                    valid_labels.append(date_str)
                 
                 if evening_weight is not None:
                     evening_weights.append(evening_weight)
@@ -1049,244 +2173,1599 @@ class WeightDatabase:
                 conn.close()
             except:
                 pass
-            return {'morning_weights': [], 'evening_weights': [], 'labels': []}
+            return {'morning_weights': [], 'evening_weights': [], 'labels': []}
+    
+    def archive_old_records(self, keep_days):
+        """把keep_days天以前的体重记录和日记移入归档数据库，主库只保留最近的记录
+        
+        统计、图表和汇总数据来自daily_weights和weight_rollups，归档后保持不变；
+        其余查询通过_source透明地合并两层。移动分两个事务：先把记录复制到归档库并提交，
+        再在主库中确认副本一致后删除记录并推后分界日期，任一步骤中断都不会丢失记录。
+        
+        Args:
+            keep_days: 主库保留的天数，早于今天减keep_days天的记录被归档
+            
+        Returns:
+            dict: 归档分界日期archive_before和本次移入的weight_count、diary_count，
+                  内存数据库或写入失败时返回None
+        """
+        if not self.archive_path or keep_days < 1:
+            return None
+        archive_before = format_date(date.today() - timedelta(days=keep_days))
+        
+        conn = self.get_connection()
+        if not conn:
+            return None
+        try:
+            self._attach_archive(conn, create=True)
+        except sqlite3.Error as e:
+            Logger.error(f"Database: 创建归档数据库失败 - {str(e)}")
+            return None
+        finally:
+            conn.close()
+        
+        state = {'weight_count': 0, 'diary_count': 0}
+        counts = {'weight_records': 'weight_count', 'diary_entries': 'diary_count'}
+        
+        def copy(cursor):
+            state['previous'] = self._archive_before(cursor)
+            if archive_before <= state['previous']:
+                return
+            for table, columns in self.ARCHIVE_COLUMNS.items():
+                columns = ', '.join(columns)
+                # 先清理已移回主库的残留
+                cursor.execute(f"DELETE FROM archive.{table} WHERE date >= ?", (state['previous'],))
+                cursor.execute(f'''
+                    INSERT INTO archive.{table} ({columns})
+                    SELECT {columns} FROM main.{table} WHERE date < ?
+                    ORDER BY id
+                ''', (archive_before,))
+                state[counts[table]] = cursor.rowcount
+        
+        def move(cursor):
+            if self._archive_before(cursor) != state['previous']:
+                raise ValueError("复制期间其他连接修改了归档分界日期")
+            for table, columns in self.ARCHIVE_COLUMNS.items():
+                columns = ', '.join(columns)
+                cursor.execute(f'''
+                    SELECT COUNT(*) FROM (
+                        SELECT {columns} FROM main.{table} WHERE date < ?
+                        EXCEPT
+                        SELECT {columns} FROM archive.{table} WHERE date < ?
+                    )
+                ''', (archive_before, archive_before))
+                if cursor.fetchone()[0]:
+                    raise ValueError("复制期间其他连接修改了待归档的记录")
+            with self._moving_rows(cursor):
+                for table in self.ARCHIVE_COLUMNS:
+                    cursor.execute(f"DELETE FROM main.{table} WHERE date < ?", (archive_before,))
+                self._set_archive_before(cursor, archive_before)
+        
+        if not self._write_with_retry(copy, "复制记录到归档数据库"):
+            return None
+        if archive_before > state['previous'] and not self._write_with_retry(move, "归档记录"):
+            return None
+        Logger.info(f"Database: 已归档 {archive_before} 之前的 {state['weight_count']} 条体重记录和 "
+                    f"{state['diary_count']} 条日记")
+        return {'archive_before': archive_before, 'weight_count': state['weight_count'],
+                'diary_count': state['diary_count']}
+    
+    def get_archive_info(self):
+        """归档数据库的路径、文件大小、分界日期和其中的记录数，还没有归档时返回None"""
+        if not self.archive_path or not os.path.exists(self.archive_path):
+            return None
+        conn = self.get_connection()
+        if not conn:
+            return None
+        try:
+            if not conn.archive_attached:
+                return None
+            cursor = conn.cursor()
+            archive_before = self._archive_before(cursor)
+            info = {
+                'path': self.archive_path,
+                'size': os.path.getsize(self.archive_path),
+                'archive_before': archive_before,
+            }
+            for table, key in (('weight_records', 'weight_count'), ('diary_entries', 'diary_count')):
+                cursor.execute(f'SELECT COUNT(*) FROM archive.{table} WHERE date < ?', (archive_before,))
+                info[key] = cursor.fetchone()[0]
+            return info
+        except Exception as e:
+            Logger.error(f"Database: 获取归档信息失败 - {str(e)}")
+            return None
+        finally:
+            conn.close()
+    
+    def run_maintenance(self, interval_days=None, compact=False):
+        """例行维护：检查完整性、回收空闲页、更新查询优化器的统计信息，并记录数据库大小
+        
+        依次执行：
+            PRAGMA quick_check      检查页面和记录格式，不比对索引内容，比integrity_check快得多
+            ANALYZE                 首次完整分析，之后用PRAGMA optimize只重新分析统计信息过期的表
+            全文索引optimize        合并日记全文索引的段，释放出的页由下一步回收
+            增量VACUUM              见_incremental_vacuum
+            wal_checkpoint          把WAL写回数据库文件并截断
+        完整性检查发现问题时只记录结果，不做其余会改写数据库的步骤（包括检查点）。
+        附加了归档数据库时对归档库同样执行检查、回收和检查点。结果写入db_stats表。
+        
+        Args:
+            interval_days: 不为None时，距上次维护不足该天数则跳过
+            compact: 用户手动整理数据库时为True，超过FULL_VACUUM_MAX_BYTES的旧数据库也转换为增量回收模式
+            
+        Returns:
+            dict: 本次写入db_stats的一行，格式同get_db_stats；跳过或失败时返回None
+        """
+        start = time.perf_counter()
+        conn = self.get_connection()
+        if not conn:
+            return None
+        
+        try:
+            cursor = conn.cursor()
+            if interval_days is not None:
+                cursor.execute("SELECT julianday('now') - julianday(MAX(created_at)) FROM db_stats")
+                elapsed = cursor.fetchone()[0]
+                if elapsed is not None and elapsed < interval_days:
+                    return None
+            
+            schemas = ['main', 'archive'] if conn.archive_attached else ['main']
+            problems = []
+            for schema in schemas:
+                cursor.execute(f'PRAGMA {schema}.quick_check')
+                problems.extend(f"{schema}: {row[0]}" for row in cursor.fetchall() if row[0] != 'ok')
+            integrity = '; '.join(problems[:10]) if problems else 'ok'
+            
+            reclaimed = 0
+            if problems:
+                Logger.error(f"Database: 完整性检查发现问题，跳过维护 - {integrity}")
+            else:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+                cursor.execute('ANALYZE' if cursor.fetchone() is None else 'PRAGMA optimize')
+                if self.fts_available:
+                    cursor.execute("INSERT INTO diary_fts (diary_fts) VALUES ('optimize')")
+                conn.commit()
+                
+                for schema in schemas:
+                    reclaimed += self._incremental_vacuum(conn, schema, compact)
+                
+                for schema in schemas:
+                    cursor.execute(f'PRAGMA {schema}.wal_checkpoint(TRUNCATE)').fetchall()
+            
+            cursor.execute('PRAGMA page_size')
+            page_size = cursor.fetchone()[0]
+            cursor.execute('PRAGMA page_count')
+            page_count = cursor.fetchone()[0]
+            cursor.execute('PRAGMA freelist_count')
+            freelist_count = cursor.fetchone()[0]
+            stats = {
+                'page_size': page_size,
+                'page_count': page_count,
+                'freelist_count': freelist_count,
+                'db_size': self._file_size(self.db_path),
+                'wal_size': self._file_size(self.db_path + '-wal'),
+                'archive_size': self._file_size(self.archive_path),
+                'reclaimed_pages': reclaimed,
+                'integrity': integrity,
+                'seconds': time.perf_counter() - start,
+            }
+            cursor.execute(f'''
+                INSERT INTO db_stats ({', '.join(stats)}) VALUES ({', '.join('?' for _ in stats)})
+            ''', list(stats.values()))
+            stats['id'] = cursor.lastrowid
+            conn.commit()
+            stats['created_at'] = datetime.now().strftime('%Y/%m/%d %H:%M:%S')
+            Logger.info(f"Database: 例行维护完成，回收 {reclaimed} 页，数据库 {stats['db_size']} 字节，"
+                        f"完整性检查 {integrity}，耗时 {stats['seconds']:.2f} 秒")
+            return stats
+        except Exception as e:
+            Logger.error(f"Database: 例行维护失败 - {str(e)}")
+            try:
+                conn.rollback()
+            except:
+                pass
+            return None
+        finally:
+            try:
+                conn.close()
+            except:
+                pass
+    
+    def _incremental_vacuum(self, conn, schema, convert=False):
+        """回收一个数据库的空闲页，返回回收的页数
+        
+        旧版本创建的数据库auto_vacuum为NONE，需要先设为INCREMENTAL并执行一次完整VACUUM使设置生效。
+        完整VACUUM重写整个文件，期间阻塞其他连接的写入，所以只在数据库不超过FULL_VACUUM_MAX_BYTES
+        或convert为True（用户手动整理）时进行，否则跳过回收。
+        转换后每个写事务只回收VACUUM_STEP_PAGES页，其他连接的写入不需要长时间等待。
+        """
+        def freelist_count():
+            return conn.execute(f'PRAGMA {schema}.freelist_count').fetchone()[0]
+        
+        def step(cursor):
+            cursor.execute(f'PRAGMA {schema}.incremental_vacuum({self.VACUUM_STEP_PAGES})').fetchall()
+        
+        before = remaining = freelist_count()
+        if conn.execute(f'PRAGMA {schema}.auto_vacuum').fetchone()[0] != 2:
+            size = (conn.execute(f'PRAGMA {schema}.page_count').fetchone()[0]
+                    * conn.execute(f'PRAGMA {schema}.page_size').fetchone()[0])
+            if not convert and size > self.FULL_VACUUM_MAX_BYTES:
+                Logger.info(f"Database: {schema} 尚未启用增量回收（{size} 字节），等待手动整理数据库时转换")
+                return 0
+            Logger.info(f"Database: 将 {schema} 转换为增量回收模式")
+            conn.execute(f'PRAGMA {schema}.auto_vacuum=INCREMENTAL')
+            conn.execute(f'VACUUM {schema}')
+            return before
+        
+        while remaining:
+            if not self._write_with_retry(step, "回收空闲页"):
+                break
+            previous, remaining = remaining, freelist_count()
+            if remaining >= previous:
+                break
+        return before - remaining
+    
+    @staticmethod
+    def _file_size(path):
+        return os.path.getsize(path) if path and os.path.exists(path) else 0
+    
+    def get_db_stats(self, limit=10):
+        """最近的维护记录
+        
+        Returns:
+            list: 按时间倒序的字典列表，包含id、created_at（本地时间）、page_size、page_count、
+                  freelist_count、db_size、wal_size、archive_size（字节）、reclaimed_pages、
+                  integrity（'ok'或发现的问题）、seconds
+        """
+        conn = self.get_connection()
+        if not conn:
+            return []
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, strftime('%Y/%m/%d %H:%M:%S', created_at, 'localtime'), page_size, page_count,
+                       freelist_count, db_size, wal_size, archive_size, reclaimed_pages, integrity, seconds
+                FROM db_stats
+                ORDER BY id DESC
+                LIMIT ?
+            ''', (limit,))
+            keys = ('id', 'created_at', 'page_size', 'page_count', 'freelist_count', 'db_size',
+                    'wal_size', 'archive_size', 'reclaimed_pages', 'integrity', 'seconds')
+            return [dict(zip(keys, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            Logger.error(f"Database: 获取维护记录失败 - {str(e)}")
+            return []
+        finally:
+            conn.close()
+    
+    def rebuild_rollups(self):
+        """重新计算全部汇总数据，供绕过本类直接写入weight_records的脚本在写入后调用"""
+        def write(cursor):
+            self._rebuild_rollups(cursor)
+        
+        return self._write_with_retry(write, "重建汇总数据")
+    
+    def get_rollups(self, granularity='week', start=None, end=None):
+        """获取按周或按月的体重汇总
+        
+        Args:
+            granularity: 'week' 或 'month'
+            start: 起始日期（包含），按周期起始日期比较，None表示不限制
+            end: 结束日期（包含），None表示不限制
+            
+        Returns:
+            list: 按周期和时间类型排序的字典列表，包含period_start、weight_type、count、
+                  min、max、mean、first、last
+        """
+        if granularity not in self.ROLLUP_PERIODS:
+            raise ValueError(f"不支持的汇总粒度: {granularity}")
+        
+        conn = self.get_connection()
+        if not conn:
+            return []
+            
+        try:
+            conditions = ['granularity = ?']
+            params = [granularity]
+            if start is not None:
+                conditions.append('period_start >= ?')
+                params.append(format_date(start))
+            if end is not None:
+                conditions.append('period_start <= ?')
+                params.append(format_date(end))
+            
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT period_start, weight_type, count, min_weight, max_weight, sum_weight,
+                       first_weight, last_weight
+                FROM weight_rollups
+                WHERE {' AND '.join(conditions)}
+                ORDER BY period_start ASC, weight_type ASC
+            ''', params)
+            rows = cursor.fetchall()
+            conn.close()
+            
+            return [
+                {
+                    'period_start': period_start,
+                    'weight_type': weight_type,
+                    'count': count,
+                    'min': min_weight,
+                    'max': max_weight,
+                    'mean': sum_weight / count if count else None,
+                    'first': first_weight,
+                    'last': last_weight,
+                }
+                for period_start, weight_type, count, min_weight, max_weight, sum_weight,
+                    first_weight, last_weight in rows
+            ]
+        except Exception as e:
+            Logger.error(f"Database: 获取汇总数据失败 - {str(e)}")
+            try:
+                conn.close()
+            except:
+                pass
+            return []
+    
+    def get_rollup_chart_data(self, granularity='week'):
+        """按周期均值生成与get_chart_data格式相同的图表数据，用于长时间范围的图表
+        
+        早晨序列在某个周期没有早晨记录时使用晚上的均值，与get_chart_data按天的处理一致。
+        """
+        periods = {}
+        for rollup in self.get_rollups(granularity):
+            periods.setdefault(rollup['period_start'], {})[rollup['weight_type']] = rollup['mean']
+        
+        morning_weights = []
+        evening_weights = []
+        labels = []
+        for period_start in sorted(periods):
+            values = periods[period_start]
+            primary = values.get('morning', values.get('evening'))
+            if primary is not None:
+                morning_weights.append(round(primary, 1))
+                labels.append(period_start)
+            if values.get('evening') is not None:
+                evening_weights.append(round(values['evening'], 1))
+        
+        return {
+            'morning_weights': morning_weights,
+            'evening_weights': evening_weights,
+            'labels': labels
+        }
+    
+    def import_data(self, data):
+        """导入数据到数据库，替换全部体重记录和日记记录
+        
+        Args:
+            data: 包含weight_records和diary_entries的字典
+            
+        Returns:
+            tuple: (是否成功, 错误列表)
+        """
+        # 验证输入数据格式
+        if not isinstance(data, dict):
+            Logger.error("Database: 导入数据格式错误 - 必须是字典类型")
+            return False, ["导入数据格式错误 - 必须是字典类型"]
+        
+        rows = itertools.chain(
+            (('weight_records', record) for record in data.get('weight_records', [])),
+            (('diary_entries', entry) for entry in data.get('diary_entries', [])),
+        )
+        success, errors, _ = self.import_rows(rows, replace=True)
+        return success, errors
+    
+    def import_rows(self, rows, replace=True, batch=500, source=None, validated=False):
+        """分批校验并写入导入的体重记录和日记
+        
+        rows可以是生成器，边读边写入暂存表，内存占用与记录数无关。
+        同一天同一时间类型的体重、同一天的日记在文件中出现多次时以最后一条为准。
+        整个导入在一个事务中完成，失败时数据库保持原样。
+        
+        Args:
+            rows: 可迭代的 (表名, 行)，体重行为 (日期, 时间类型, 体重)，日记行为 (日期, 饮食记录, 减肥心得)，
+                  时间类型支持中英文
+            replace: True表示先清空现有数据，False表示与现有数据合并（覆盖同一天的记录）
+            batch: 每次executemany写入的行数
+            source: 来源文件的file_fingerprint，提供时写入台账，导入的记录通过import_id关联到台账
+            validated: 行已经过validate_weight_row/validate_diary_row校验时为True，跳过重复校验
+            
+        Returns:
+            tuple: (是否成功, 错误列表, {表名: 导入的记录数})
+        """
+        errors = []
+        counts = {'weight_records': 0, 'diary_entries': 0}
+        conn = self.get_connection()
+        if not conn:
+            Logger.error("Database: 无法获取数据库连接")
+            return False, ["无法获取数据库连接"], counts
+        
+        validators = {
+            'weight_records': validate_weight_row,
+            'diary_entries': validate_diary_row,
+        }
+        statements = {
+            'weight_records': 'INSERT OR REPLACE INTO temp.import_weights VALUES (?, ?, ?)',
+            'diary_entries': 'INSERT OR REPLACE INTO temp.import_diary VALUES (?, ?, ?)',
+        }
+        pending = {table: [] for table in validators}
+        
+        def flush(table):
+            if pending[table]:
+                conn.executemany(statements[table], pending[table])
+                pending[table].clear()
+        
+        try:
+            # 开始事务，立即获取写锁（等待时间由busy_timeout控制）
+            conn.execute('BEGIN IMMEDIATE')
+            
+            # 暂存表按日期去重，写入完成后一次性合并到正式表
+            conn.execute('''
+                CREATE TEMP TABLE IF NOT EXISTS import_weights (
+                    date TEXT NOT NULL,
+                    weight_type TEXT NOT NULL,
+                    weight REAL NOT NULL,
+                    PRIMARY KEY (date, weight_type)
+                )
+            ''')
+            conn.execute('''
+                CREATE TEMP TABLE IF NOT EXISTS import_diary (
+                    date TEXT PRIMARY KEY,
+                    food TEXT,
+                    thoughts TEXT
+                )
+            ''')
+            conn.execute('DELETE FROM temp.import_weights')
+            conn.execute('DELETE FROM temp.import_diary')
+            ledger_id = self._insert_ledger(conn, 'import' if replace else 'merge', source) if source else None
+            
+            for table, row in rows:
+                validate = validators.get(table)
+                if validate is None:
+                    continue
+                try:
+                    pending[table].append(row if validated else validate(row))
+                except (ValueError, TypeError) as e:
+                    Logger.warning(f"Database: {str(e)}")
+                    errors.append(str(e))
+                    continue
+                if len(pending[table]) >= batch:
+                    flush(table)
+            for table in pending:
+                flush(table)
+            
+            # 清空现有数据，归档库中的记录随分界日期清空一起作废；
+            # 合并时把导入的最早日期及之后的冷数据移回主库，合并只需要处理主库
+            cursor = conn.cursor()
+            if replace:
+                self._clear_records(cursor)
+            else:
+                cursor.execute('''
+                    SELECT MIN(date) FROM (
+                        SELECT date FROM temp.import_weights UNION ALL SELECT date FROM temp.import_diary
+                    )
+                ''')
+                earliest = cursor.fetchone()[0]
+                if earliest is not None:
+                    self._thaw_archive(cursor, earliest)
+            
+            # 合并：先更新已有日期的记录，再插入新的记录
+            conn.execute('''
+                UPDATE weight_records
+                SET weight = (
+                        SELECT i.weight FROM temp.import_weights i
+                        WHERE i.date = weight_records.date AND i.weight_type = weight_records.weight_type
+                    ),
+                    flagged = 0,
+                    import_id = ?,
+                    created_at = CURRENT_TIMESTAMP
+                WHERE EXISTS (
+                    SELECT 1 FROM temp.import_weights i
+                    WHERE i.date = weight_records.date AND i.weight_type = weight_records.weight_type
+                )
+            ''', (ledger_id,))
+            conn.execute('''
+                INSERT INTO weight_records (date, weight_type, weight, import_id)
+                SELECT date, weight_type, weight, ? FROM temp.import_weights i
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM weight_records w
+                    WHERE w.date = i.date AND w.weight_type = i.weight_type
+                )
+                ORDER BY date, weight_type
+            ''', (ledger_id,))
+            conn.execute('''
+                UPDATE diary_entries
+                SET food = (SELECT i.food FROM temp.import_diary i WHERE i.date = diary_entries.date),
+                    thoughts = (SELECT i.thoughts FROM temp.import_diary i WHERE i.date = diary_entries.date),
+                    import_id = ?,
+                    created_at = CURRENT_TIMESTAMP
+                WHERE date IN (SELECT date FROM temp.import_diary)
+            ''', (ledger_id,))
+            conn.execute('''
+                INSERT INTO diary_entries (date, food, thoughts, import_id)
+                SELECT date, food, thoughts, ? FROM temp.import_diary
+                WHERE date NOT IN (SELECT date FROM diary_entries)
+                ORDER BY date
+            ''', (ledger_id,))
+            
+            counts['weight_records'] = conn.execute('SELECT COUNT(*) FROM temp.import_weights').fetchone()[0]
+            counts['diary_entries'] = conn.execute('SELECT COUNT(*) FROM temp.import_diary').fetchone()[0]
+            conn.execute('DELETE FROM temp.import_weights')
+            conn.execute('DELETE FROM temp.import_diary')
+            
+            # 重新计算汇总表
+            self._rebuild_rollups(cursor)
+            
+            if ledger_id is not None:
+                self._finish_ledger(conn, ledger_id, counts)
+            conn.commit()
+            if replace:
+                self._purge_archive()
+                self._drop_analytics()
+            Logger.info(f"Database: 成功导入 {counts['weight_records']} 条体重记录和 "
+                        f"{counts['diary_entries']} 条日记记录")
+            return True, errors, counts
+        except Exception as e:
+            Logger.error(f"Database: 导入数据时发生错误: {str(e)}")
+            try:
+                conn.rollback()
+            except:
+                pass
+            errors.append(f"导入数据时发生错误: {str(e)}")
+            return False, errors, {table: 0 for table in counts}
+        finally:
+            try:
+                conn.close()
+            except:
+                pass
+    
+    def get_generation(self):
+        """数据代数：体重记录或日记每次被修改都会加一"""
+        conn = self.get_connection()
+        if not conn:
+            return None
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+    
+    def check_import_file(self, path, replace=True):
+        """判断导入文件是否不会改变数据库
+        
+        替换导入时要求文件与数据库当前内容一致（自上次导入或导出后文件和数据库都没有变化），
+        数据库在上次导入导出后有修改时无需读取文件。合并导入同样的内容不会改变数据，
+        所以合并导入时内容与任意一次合并导入过的文件相同也算一致，不论数据库之后是否有修改。
+        路径、大小和修改时间都与台账一致时不计算哈希；否则流式计算SHA-256与台账比对。
+        
+        Args:
+            path: 文件路径
+            replace: 是否为替换全部数据的导入
+            
+        Returns:
+            tuple: (一致时为台账记录字典否则为None, 文件的file_fingerprint)
+        """
+        fingerprint = file_fingerprint(path, with_hash=False)
+        conn = self.get_connection()
+        if not conn:
+            return None, file_fingerprint(path)
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT l.id, l.direction, l.path, l.size, l.mtime_ns, l.sha256, l.generation,
+                       l.weight_count, l.diary_count,
+                       strftime('%Y/%m/%d %H:%M:%S', l.created_at, 'localtime')
+                FROM import_ledger l JOIN meta m ON m.key = 'generation'
+                WHERE (l.generation = m.value AND l.direction != 'merge')
+                   OR (? AND l.direction = 'merge' AND l.generation IS NOT NULL)
+                ORDER BY l.id DESC
+            ''', (not replace,))
+            entries = [self._ledger_entry(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+        
+        for entry in entries:
+            if (entry['path'], entry['size'], entry['mtime_ns']) == (
+                    fingerprint['path'], fingerprint['size'], fingerprint['mtime_ns']):
+                fingerprint['sha256'] = entry['sha256']
+                return entry, fingerprint
+        
+        fingerprint = file_fingerprint(path)
+        for entry in entries:
+            if (entry['size'], entry['sha256']) == (fingerprint['size'], fingerprint['sha256']):
+                return entry, fingerprint
+        return None, fingerprint
+    
+    def record_export(self, path, generation, weight_count, diary_count):
+        """导出完成后把文件写入台账，generation为导出时读快照中的数据代数"""
+        fingerprint = file_fingerprint(path)
+        
+        def write(cursor):
+            ledger_id = self._insert_ledger(cursor, 'export', fingerprint)
+            cursor.execute('''
+                UPDATE import_ledger SET generation = ?, weight_count = ?, diary_count = ?
+                WHERE id = ?
+            ''', (generation, weight_count, diary_count, ledger_id))
+        
+        return self._write_with_retry(write, "导出台账")
+    
+    def get_import_ledger(self, limit=10):
+        """最近的导入导出台账，附带当前数据库中仍来自每次导入的记录数
+        
+        Returns:
+            list: 按时间倒序的字典列表，包含direction、path、size、sha256、weight_count、diary_count、
+                  created_at（本地时间），以及current_weight_count、current_diary_count
+        """
+        conn = self.get_connection()
+        if not conn:
+            return []
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT l.id, l.direction, l.path, l.size, l.mtime_ns, l.sha256, l.generation,
+                       l.weight_count, l.diary_count,
+                       strftime('%Y/%m/%d %H:%M:%S', l.created_at, 'localtime'),
+                       (SELECT COUNT(*) FROM {self._source(conn, 'weight_records')} WHERE import_id = l.id),
+                       (SELECT COUNT(*) FROM {self._source(conn, 'diary_entries')} WHERE import_id = l.id)
+                FROM import_ledger l
+                ORDER BY l.id DESC
+                LIMIT ?
+            ''', (limit,))
+            entries = []
+            for row in cursor.fetchall():
+                entry = self._ledger_entry(row[:10])
+                entry['current_weight_count'], entry['current_diary_count'] = row[10:]
+                entries.append(entry)
+            return entries
+        except Exception as e:
+            Logger.error(f"Database: 获取导入台账失败 - {str(e)}")
+            return []
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def _ledger_entry(row):
+        keys = ('id', 'direction', 'path', 'size', 'mtime_ns', 'sha256', 'generation',
+                'weight_count', 'diary_count', 'created_at')
+        return dict(zip(keys, row))
+    
+    @staticmethod
+    def _insert_ledger(cursor, direction, fingerprint):
+        """在当前事务中新增一条台账，返回其id"""
+        cursor = cursor.execute('''
+            INSERT INTO import_ledger (direction, path, size, mtime_ns, sha256)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (direction, fingerprint['path'], fingerprint['size'], fingerprint['mtime_ns'],
+              fingerprint['sha256']))
+        return cursor.lastrowid
+    
+    @staticmethod
+    def _finish_ledger(conn, ledger_id, counts):
+        """导入写入完成后记录数量和写入后的数据代数，必须在提交前调用"""
+        conn.execute('''
+            UPDATE import_ledger
+            SET weight_count = ?, diary_count = ?,
+                generation = (SELECT value FROM meta WHERE key = 'generation')
+            WHERE id = ?
+        ''', (counts['weight_records'], counts['diary_entries'], ledger_id))
+    
+    def restore_rows(self, rows, batch=500, source=None):
+        """用备份文件中的行替换全部体重记录和日记，保留id、创建时间和待核实标记
+        
+        rows可以是生成器，边读边写入，内存占用与记录数无关。
+        整个恢复在一个事务中完成，失败时数据库保持原样。
+        
+        Args:
+            rows: 可迭代的 (表名, 列值元组)，列值按BACKUP_COLUMNS[表名]的顺序
+            batch: 每次executemany写入的行数
+            source: 备份文件的file_fingerprint，提供时写入台账，恢复的记录通过import_id关联到台账
+            
+        Returns:
+            tuple: (是否成功, 错误列表, {表名: 写入的行数})
+        """
+        errors = []
+        counts = {table: 0 for table in self.BACKUP_COLUMNS}
+        conn = self.get_connection()
+        if not conn:
+            return False, ["无法获取数据库连接"], counts
+        
+        statements = {
+            table: f"INSERT INTO {table} ({', '.join(columns)}, import_id) VALUES "
+                   f"({', '.join('?' for _ in columns[:-1])}, COALESCE(?, CURRENT_TIMESTAMP), ?)"
+            for table, columns in self.BACKUP_COLUMNS.items()
+        }
+        pending = {table: [] for table in self.BACKUP_COLUMNS}
+        ledger_id = None
+        
+        def flush(table):
+            conn.executemany(statements[table], pending[table])
+            counts[table] += len(pending[table])
+            pending[table].clear()
+        
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            self._clear_records(conn.cursor())
+            if source:
+                ledger_id = self._insert_ledger(conn, 'import', source)
+            
+            for table, values in rows:
+                try:
+                    values = self._validate_backup_row(table, values) + (ledger_id,)
+                except (ValueError, TypeError) as e:
+                    Logger.warning(f"Database: 跳过无效的备份记录: {values} - {str(e)}")
+                    errors.append(f"跳过无效的{table}记录: {str(e)}")
+                    continue
+                pending[table].append(values)
+                if len(pending[table]) >= batch:
+                    flush(table)
+            for table in pending:
+                flush(table)
+            
+            self._rebuild_rollups(conn.cursor())
+            if ledger_id is not None:
+                self._finish_ledger(conn, ledger_id, counts)
+            conn.commit()
+            self._purge_archive()
+            self._drop_analytics()
+            Logger.info(f"Database: 从备份恢复 {counts['weight_records']} 条体重记录和 "
+                        f"{counts['diary_entries']} 条日记记录")
+            return True, errors, counts
+        except Exception as e:
+            Logger.error(f"Database: 从备份恢复时发生错误: {str(e)}")
+            try:
+                conn.rollback()
+            except:
+                pass
+            errors.append(f"恢复数据时发生错误: {str(e)}")
+            return False, errors, {table: 0 for table in self.BACKUP_COLUMNS}
+        finally:
+            try:
+                conn.close()
+            except:
+                pass
     
-    def import_data(self, data):
-        """导入数据到数据库，支持体重记录和日记记录
+    @staticmethod
+    def _backup_id(record_id):
+        """备份中的id，缺少时为None，由SQLite自动分配"""
+        return None if record_id is None else int(record_id)
+    
+    def _validate_backup_row(self, table, values):
+        """校验并规范化一行备份数据，无效时抛出ValueError"""
+        columns = self.BACKUP_COLUMNS.get(table)
+        if columns is None:
+            raise ValueError(f"未知的表: {table}")
+        if len(values) != len(columns):
+            raise ValueError("字段数量不匹配")
         
-        Args:
-            data: 包含weight_records和diary_entries的字典
-            
-        Returns:
-            tuple: (是否成功, 错误列表)
-        """
-        conn = None
-        errors = []
+        if table == 'weight_records':
+            record_id, date_str, weight_type, weight, flagged, created_at = values
+            if weight_type not in ('morning', 'evening'):
+                raise ValueError(f"无效的体重类型: {weight_type}")
+            weight = float(weight)
+            if not (20 <= weight <= 400):
+                raise ValueError(f"体重超出范围20-400: {weight}")
+            return (self._backup_id(record_id), format_date(parse_date(str(date_str))), weight_type,
+                    weight, 1 if flagged else 0, created_at)
+        
+        record_id, date_str, food, thoughts, created_at = values
+        return (self._backup_id(record_id), format_date(parse_date(str(date_str))),
+                food if food is not None else '', thoughts if thoughts is not None else '', created_at)
+
+def validate_weight_row(record):
+    """校验并规范化一条导入的体重记录，返回 (日期, 时间类型, 体重)，无效时抛出ValueError"""
+    # 验证记录长度
+    if len(record) < 3:
+        raise ValueError(f"跳过无效的体重记录 - 字段不足: {record}")
+    date_str, weight_type, weight = record[:3]
+    
+    # 验证并格式化日期，无效的日期不能用今天的日期代替，否则会覆盖当天的真实记录
+    try:
+        formatted_date = format_date(parse_import_date(date_str))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"跳过无效的日期: {date_str} - {str(e)}")
+    
+    # 验证并转换体重类型，支持中英文
+    if weight_type in ('早晨', 'morning'):
+        weight_type_en = 'morning'
+    elif weight_type in ('晚上', 'evening'):
+        weight_type_en = 'evening'
+    else:
+        raise ValueError(f"跳过无效的体重类型: {weight_type}")
+    
+    # 验证并转换体重值
+    try:
+        weight_float = float(weight)
+    except (ValueError, TypeError):
+        raise ValueError(f"跳过无效的体重值: {weight}")
+    # 验证体重范围 (20-400斤)
+    if not (20 <= weight_float <= 400):
+        raise ValueError(f"跳过无效的体重值: {weight_float} - 超出范围20-400")
+    
+    return formatted_date, weight_type_en, weight_float
+
+def validate_diary_row(entry):
+    """校验并规范化一条导入的日记，返回 (日期, 饮食记录, 减肥心得)，无效时抛出ValueError"""
+    # 验证记录长度
+    if len(entry) < 3:
+        raise ValueError(f"跳过无效的日记记录 - 字段不足: {entry}")
+    date_str, food, thoughts = entry[:3]
+    
+    # 验证并格式化日期，无效的日期不能用今天的日期代替，否则会覆盖当天的真实记录
+    try:
+        formatted_date = format_date(parse_import_date(date_str))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"跳过无效的日期: {date_str} - {str(e)}")
+    
+    # 处理空值
+    food_str = str(food) if food is not None else ''
+    thoughts_str = str(thoughts) if thoughts is not None else ''
+    return formatted_date, food_str, thoughts_str
+
+def file_fingerprint(path, with_hash=True):
+    """文件的绝对路径、大小、修改时间（纳秒）和SHA-256
+    
+    哈希按64 KB分块流式计算，内存占用与文件大小无关；with_hash为False时sha256为None。
+    """
+    stat = os.stat(path)
+    fingerprint = {
+        'path': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': None,
+    }
+    if with_hash:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(chunk)
+        fingerprint['sha256'] = digest.hexdigest()
+    return fingerprint
+
+def _set_column_widths(worksheet, headers, lengths, max_width):
+    """按表头和各列最长内容设置列宽，write_only工作表必须在写入数据前设置"""
+    for index, (header, length) in enumerate(zip(headers, lengths)):
+        column_letter = get_column_letter(index + 1)
+        worksheet.column_dimensions[column_letter].width = min(max(len(header), length) + 2, max_width)
+
+def _write_summary_sheet(workbook, db):
+    """写入月度汇总工作表，并在表格右侧添加早晚平均体重的折线图"""
+    from openpyxl.chart import LineChart, Reference
+    
+    sheet = workbook.create_sheet(SUMMARY_SHEET_NAME)
+    _set_column_widths(sheet, SUMMARY_SHEET_COLUMNS, [len('2024/01')] + [0] * 10, 20)
+    sheet.append(SUMMARY_SHEET_COLUMNS)
+    months = 0
+    for row in db.iter_monthly_summary():
+        sheet.append(list(row))
+        months += 1
+    if not months:
+        return
+    
+    chart = LineChart()
+    chart.title = "月度平均体重"
+    chart.y_axis.title = "体重(斤)"
+    chart.x_axis.title = "月份"
+    chart.width = 24
+    chart.height = 12
+    for name in ('早晨平均(斤)', '晚上平均(斤)'):
+        column = SUMMARY_SHEET_COLUMNS.index(name) + 1
+        chart.add_data(Reference(sheet, min_col=column, min_row=1, max_row=months + 1), titles_from_data=True)
+    chart.set_categories(Reference(sheet, min_col=1, min_row=2, max_row=months + 1))
+    sheet.add_chart(chart, f"{get_column_letter(len(SUMMARY_SHEET_COLUMNS) + 2)}2")
+
+@instrumentation.timed('pipeline.export_workbook')
+def export_workbook(db, export_path):
+    """将数据库中的全部体重记录和日记导出为Excel文件
+    
+    文件包含"体重记录"、"减肥日记"和"月度汇总"三个工作表，写入时完全覆盖已有文件。
+    使用openpyxl的write_only模式逐行写入，列宽由SQL预先算出，
+    内存占用与记录数无关。月度汇总直接读取数据库中按月汇总的结果，
+    并附带一个引用汇总数据的Excel折线图。导出的文件会写入台账，之后原样导入时可以直接跳过。
+    
+    Args:
+        db: WeightDatabase实例
+        export_path: 导出文件路径(.xlsx)
+        
+    Returns:
+        tuple: (导出的体重记录数, 导出的日记数)，没有数据时不写文件，返回(0, 0)
+    """
+    with db.read_snapshot():
+        summary = db.get_export_summary()
+        if not summary or (summary['weight_count'] == 0 and summary['diary_count'] == 0):
+            return 0, 0
+        generation = db.get_generation()
+        
+        workbook = openpyxl.Workbook(write_only=True)
+        
+        # 处理体重记录数据
+        weight_sheet = workbook.create_sheet(WEIGHT_SHEET_NAME)
+        _set_column_widths(weight_sheet, WEIGHT_SHEET_COLUMNS, summary['weight_lengths'], 50)
+        weight_sheet.append(WEIGHT_SHEET_COLUMNS)
         weight_count = 0
+        for day, morning, evening, _, _, _ in db.iter_daily_weights():
+            for weight_type_cn, weight in (("早晨", morning), ("晚上", evening)):
+                if weight is None:
+                    continue
+                # 验证体重数值
+                try:
+                    weight = float(weight)
+                    # 验证体重范围
+                    if 20 <= weight <= 400:
+                        weight_sheet.append([day, weight_type_cn, weight])
+                        weight_count += 1
+                    else:
+                        Logger.warning(f"跳过异常体重值: {weight} 斤")
+                except (ValueError, TypeError):
+                    Logger.warning(f"跳过无效体重值: {weight}")
+        
+        # 处理日记数据，为文本内容设置更大的宽度
+        diary_sheet = workbook.create_sheet(DIARY_SHEET_NAME)
+        _set_column_widths(diary_sheet, DIARY_SHEET_COLUMNS, summary['diary_lengths'], 80)
+        diary_sheet.append(DIARY_SHEET_COLUMNS)
         diary_count = 0
+        for entry in db.iter_diary_entries():
+            try:
+                date_str = str(entry[0])  # 日期是第一个字段
+                food = str(entry[1]) if entry[1] is not None else ''
+                thoughts = str(entry[2]) if entry[2] is not None else ''
+                diary_sheet.append([date_str, food, thoughts])
+                diary_count += 1
+            except Exception as e:
+                Logger.warning(f"跳过无效的日记记录: {entry}, 错误: {str(e)}")
+                continue
+        
+        _write_summary_sheet(workbook, db)
+    
+    # 即使某类没有数据也保留空的工作表，确保结构一致性
+    workbook.save(export_path)
+    db.record_export(export_path, generation, weight_count, diary_count)
+    return weight_count, diary_count
+
+def export_file_format(path):
+    """根据文件扩展名判断导出/导入格式：'backup'、'xlsx'，不支持的扩展名返回None"""
+    lower = path.lower()
+    if lower.endswith(BACKUP_EXTENSION):
+        return 'backup'
+    if lower.endswith('.xlsx'):
+        return 'xlsx'
+    return None
+
+@instrumentation.timed('pipeline.export_backup')
+def export_backup(db, export_path):
+    """将全部体重记录和日记导出为备份文件（gzip压缩的JSON Lines）
+    
+    与Excel导出不同，备份保留数据库中的所有列（id、创建时间、待核实标记），
+    只依赖标准库，逐行写入，内存占用与记录数无关。
+    
+    Args:
+        db: WeightDatabase实例
+        export_path: 导出文件路径(.jsonl.gz)
+        
+    Returns:
+        tuple: (导出的体重记录数, 导出的日记数)，没有数据时不写文件，返回(0, 0)
+    """
+    counts = {}
+    with db.read_snapshot():
+        summary = db.get_export_summary()
+        if not summary or (summary['weight_count'] == 0 and summary['diary_count'] == 0):
+            return 0, 0
+        generation = db.get_generation()
+        
+        header = {
+            'format': BACKUP_FORMAT,
+            'version': BACKUP_FORMAT_VERSION,
+            'created_at': datetime.now().strftime('%Y/%m/%d %H:%M:%S'),
+            'columns': {table: list(columns) for table, columns in db.BACKUP_COLUMNS.items()},
+        }
+        with gzip.open(export_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            f.write(json.dumps(header, ensure_ascii=False) + '\n')
+            for table in db.BACKUP_COLUMNS:
+                count = 0
+                for row in db.iter_table_rows(table):
+                    f.write(json.dumps([table, *row], ensure_ascii=False, separators=(',', ':')) + '\n')
+                    count += 1
+                counts[table] = count
+    
+    db.record_export(export_path, generation, counts['weight_records'], counts['diary_entries'])
+    return counts['weight_records'], counts['diary_entries']
+
+def open_backup(import_path):
+    """打开并校验备份文件的文件头
+    
+    Args:
+        import_path: 备份文件路径(.jsonl.gz)
         
+    Returns:
+        tuple: (文件头字典, 行生成器)，生成器逐行产生 (表名, 列值元组)，
+               列值已按WeightDatabase.BACKUP_COLUMNS的顺序排列，可直接传给restore_rows
+        
+    Raises:
+        ValueError: 文件不是有效的备份文件，错误信息可以直接展示给用户
+    """
+    f = gzip.open(import_path, 'rt', encoding='utf-8')
+    try:
+        header = json.loads(f.readline())
+    except (OSError, EOFError, ValueError):
+        f.close()
+        raise ValueError("文件格式错误: 文件不是有效的备份文件")
+    
+    if not isinstance(header, dict) or header.get('format') != BACKUP_FORMAT:
+        f.close()
+        raise ValueError("文件格式错误: 文件不是有效的备份文件")
+    if header.get('version', 0) > BACKUP_FORMAT_VERSION:
+        f.close()
+        raise ValueError("备份文件由更新版本的应用导出，请先升级应用")
+    
+    # 按文件头记录的列名映射到当前版本的列顺序，缺少的列为None
+    mappings = {}
+    for table, columns in WeightDatabase.BACKUP_COLUMNS.items():
+        file_columns = header.get('columns', {}).get(table, columns)
+        mappings[table] = [file_columns.index(c) if c in file_columns else None for c in columns]
+    
+    def rows():
+        with f:
+            for line_number, line in enumerate(f, 2):
+                if not line.strip():
+                    continue
+                try:
+                    table, *values = json.loads(line)
+                except (ValueError, TypeError):
+                    Logger.warning(f"跳过无法解析的备份行: 第{line_number}行")
+                    continue
+                mapping = mappings.get(table)
+                if mapping is None:
+                    yield table, tuple(values)
+                    continue
+                yield table, tuple(
+                    values[index] if index is not None and index < len(values) else None
+                    for index in mapping
+                )
+    
+    return header, rows()
+
+def _parse_import_file(path):
+    """读取并校验一个导入文件，在import_folder的工作进程中运行
+    
+    Returns:
+        dict: path、format、rows（校验后的 (表名, 行) 列表）、errors、seconds
+    """
+    validators = {'weight_records': validate_weight_row, 'diary_entries': validate_diary_row}
+    start = time.perf_counter()
+    file_format, rows = importers.read_rows(path)
+    validated = []
+    errors = []
+    for table, row in rows:
         try:
-            # 获取数据库连接
-            conn = self.get_connection()
-            if not conn:
-                Logger.error("Database: 无法获取数据库连接")
-                errors.append("无法获取数据库连接")
-                return False, errors
-            
-            # 验证输入数据格式
-            if not isinstance(data, dict):
-                Logger.error("Database: 导入数据格式错误 - 必须是字典类型")
-                errors.append("导入数据格式错误 - 必须是字典类型")
-                return False, errors
-                
-            cursor = conn.cursor()
-            
-            # 开始事务
-            conn.execute('BEGIN TRANSACTION')
-            
-            # 清空现有数据
+            validated.append((table, validators[table](row)))
+        except (ValueError, TypeError) as e:
+            errors.append(str(e))
+    return {
+        'path': path,
+        'format': file_format,
+        'rows': validated,
+        'errors': errors,
+        'seconds': time.perf_counter() - start,
+    }
+
+def parallel_results(func, items, max_workers=None):
+    """在进程池中对每个元素调用func，按items的顺序逐个产生结果，失败的元素产生异常对象
+    
+    调用方通常是后台写入线程，fork会把其他线程持有的锁（包括图形驱动的锁）原样复制到子进程中，
+    所以子进程用spawn方式启动。
+    平台不支持多进程（如Android缺少sem_open）或进程池中途崩溃时，剩余的元素在当前进程中顺序处理。
+    """
+    executor = None
+    if len(items) > 1 and max_workers != 1:
+        try:
+            executor = ProcessPoolExecutor(max_workers=max_workers,
+                                           mp_context=multiprocessing.get_context('spawn'))
+        except (NotImplementedError, OSError, ImportError) as e:
+            Logger.warning(f"无法创建进程池，改为顺序处理: {str(e)}")
+    
+    if executor is None:
+        for item in items:
             try:
-                cursor.execute('DELETE FROM weight_records')
-                cursor.execute('DELETE FROM diary_entries')
+                yield func(item)
             except Exception as e:
-                Logger.error(f"Database: 清空表数据失败: {str(e)}")
-                conn.rollback()
-                errors.append(f"清空表数据失败: {str(e)}")
-                return False, errors
-            
-            # 导入体重记录 - 添加数据验证
-            weight_records = data.get('weight_records', [])
-            
-            for record in weight_records:
+                yield e
+        return
+    
+    with executor:
+        futures = [executor.submit(func, item) for item in items]
+        for item, future in zip(items, futures):
+            try:
+                yield future.result()
+            except BrokenProcessPool:
                 try:
-                    # 验证记录长度
-                    if len(record) < 3:
-                        Logger.warning(f"Database: 跳过无效的体重记录 - 字段不足: {record}")
-                        errors.append(f"跳过无效的体重记录 - 字段不足: {record}")
-                        continue
-                        
-                    date_str, weight_type_cn, weight = record
-                    
-                    # 验证并格式化日期
-                    try:
-                        formatted_date = format_date(parse_date(str(date_str)))
-                    except (ValueError, TypeError) as date_error:
-                        Logger.warning(f"Database: 跳过无效的日期: {date_str} - {str(date_error)}")
-                        errors.append(f"跳过无效的日期: {date_str}")
-                        continue
-                    
-                    # 验证并转换体重类型
-                    weight_type_en = None
-                    # 支持中英文体重类型
-                    if weight_type_cn in ['早晨', 'morning']:
-                        weight_type_en = 'morning'
-                    elif weight_type_cn in ['晚上', 'evening']:
-                        weight_type_en = 'evening'
-                    else:
-                        Logger.warning(f"Database: 跳过无效的体重类型: {weight_type_cn}")
-                        errors.append(f"跳过无效的体重类型: {weight_type_cn}")
-                        continue
-                        
-                    # 验证并转换体重值
-                    try:
-                        weight_float = float(weight)
-                        # 验证体重范围 (20-400斤)
-                        if not (20 <= weight_float <= 400):
-                            Logger.warning(f"Database: 跳过无效的体重值: {weight_float} - 超出范围20-400")
-                            errors.append(f"跳过无效的体重值: {weight_float} - 超出范围20-400")
-                            continue
-                    except (ValueError, TypeError):
-                        Logger.warning(f"Database: 跳过无效的体重值: {weight}")
-                        errors.append(f"跳过无效的体重值: {weight}")
-                        continue
-                        
-                    # 插入有效记录
-                    try:
-                        cursor.execute('''
-                            INSERT INTO weight_records (date, weight_type, weight)
-                            VALUES (?, ?, ?)
-                        ''', (formatted_date, weight_type_en, weight_float))
-                        weight_count += 1
-                    except Exception as insert_error:
-                        Logger.warning(f"Database: 插入体重记录失败: {record} - {str(insert_error)}")
-                        errors.append(f"插入体重记录失败: {record}")
-                        continue
-                        
-                except Exception as record_error:
-                    Logger.warning(f"Database: 处理体重记录时出错: {record} - {str(record_error)}")
-                    errors.append(f"处理体重记录时出错: {record}")
-                    continue
+                    yield func(item)
+                except Exception as e:
+                    yield e
+            except Exception as e:
+                yield e
+
+@instrumentation.timed('pipeline.import_folder')
+def import_folder(db, folder, max_workers=None):
+    """并行导入文件夹中的全部Excel、CSV、TSV和JSON文件，合并到现有数据中
+    
+    文件的读取和校验在进程池中并行进行，数据库写入只在当前进程中按文件名顺序逐个进行，
+    同一天的记录以排在后面的文件为准。每个文件单独一个事务并写入台账，
+    自上次导入后没有变化的文件直接跳过，一个文件失败不影响其他文件。
+    备份文件(.jsonl.gz)会替换全部数据，不参与文件夹导入。
+    
+    Args:
+        db: WeightDatabase实例
+        folder: 文件夹路径
+        max_workers: 工作进程数，None表示按CPU核数，1表示在当前进程中顺序处理
+        
+    Returns:
+        dict: files（每个文件的 path、format、status、weight_count、diary_count、errors、seconds）、
+              weight_count、diary_count、seconds、rows_per_sec
+    """
+    start = time.perf_counter()
+    report = {'files': [], 'weight_count': 0, 'diary_count': 0}
+    
+    pending = []
+    for entry in sorted(os.scandir(folder), key=lambda entry: entry.name):
+        if not entry.is_file() or export_file_format(entry.path) == 'backup':
+            continue
+        try:
+            if importers.detect_format(entry.path) is None:
+                continue
+            unchanged, fingerprint = db.check_import_file(entry.path, replace=False)
+        except OSError as e:
+            report['files'].append({'path': entry.path, 'status': 'failed', 'errors': [str(e)]})
+            continue
+        if unchanged:
+            report['files'].append({'path': entry.path, 'status': 'skipped', 'errors': []})
+            continue
+        pending.append((entry.path, fingerprint))
+    
+    paths = [path for path, _ in pending]
+    for (path, fingerprint), result in zip(pending, parallel_results(_parse_import_file, paths, max_workers)):
+        if isinstance(result, Exception):
+            Logger.warning(f"导入文件失败: {path} - {str(result)}")
+            report['files'].append({'path': path, 'status': 'failed', 'errors': [str(result)]})
+            continue
+        
+        success, errors, counts = db.import_rows(
+            result['rows'], replace=False, source=fingerprint, validated=True
+        )
+        report['files'].append({
+            'path': path,
+            'format': result['format'],
+            'status': 'imported' if success else 'failed',
+            'weight_count': counts['weight_records'],
+            'diary_count': counts['diary_entries'],
+            'errors': result['errors'] + errors,
+            'seconds': result['seconds'],
+        })
+        report['weight_count'] += counts['weight_records']
+        report['diary_count'] += counts['diary_entries']
+    
+    report['files'].sort(key=lambda item: item['path'])
+    report['seconds'] = time.perf_counter() - start
+    rows = report['weight_count'] + report['diary_count']
+    report['rows_per_sec'] = rows / report['seconds'] if report['seconds'] > 0 else 0.0
+    Logger.info(f"文件夹导入完成: {len(report['files'])} 个文件, {rows} 条记录, "
+                f"{report['rows_per_sec']:.0f} 条/秒")
+    return report
+
+class BackgroundWriter:
+    """后台写入线程
+    
+    按key合并写入任务：同一个key在执行前被多次提交时只执行最后一次，
+    适合自动保存这类只关心最终内容的写入。任务的返回值通过callback
+    在主线程（Clock）中回传。
+    """
+    
+    def __init__(self):
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+    
+    def submit(self, key, func, *args, callback=None):
+        with self._cond:
+            self._pending[key] = (func, args, callback)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='BackgroundWriter', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+    
+    def flush(self, timeout=None):
+        """等待已提交的任务全部完成，返回是否在超时前完成"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._running, timeout)
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                key = next(iter(self._pending))
+                func, args, callback = self._pending.pop(key)
+                self._running = True
             
-            # 导入日记记录 - 添加数据验证
-            diary_entries = data.get('diary_entries', [])
+            try:
+                result = func(*args)
+            except Exception as e:
+                Logger.error(f"BackgroundWriter: 写入任务 {key} 失败 - {str(e)}")
+                result = None
             
-            for entry in diary_entries:
-                try:
-                    # 验证记录长度
-                    if len(entry) < 3:
-                        Logger.warning(f"Database: 跳过无效的日记记录 - 字段不足: {entry}")
-                        errors.append(f"跳过无效的日记记录 - 字段不足: {entry}")
-                        continue
-                        
-                    date_str, food, thoughts = entry
-                    
-                    # 验证并格式化日期
-                    try:
-                        formatted_date = format_date(parse_date(str(date_str)))
-                    except (ValueError, TypeError) as date_error:
-                        Logger.warning(f"Database: 跳过无效的日期: {date_str} - {str(date_error)}")
-                        errors.append(f"跳过无效的日期: {date_str}")
-                        continue
-                    
-                    # 处理空值
-                    food_str = str(food) if food is not None else ''
-                    thoughts_str = str(thoughts) if thoughts is not None else ''
-                    
-                    # 插入日记记录
-                    try:
-                        cursor.execute('''
-                            INSERT INTO diary_entries (date, food, thoughts)
-                            VALUES (?, ?, ?)
-                        ''', (formatted_date, food_str, thoughts_str))
-                        diary_count += 1
-                    except Exception as insert_error:
-                        Logger.warning(f"Database: 插入日记记录失败: {entry} - {str(insert_error)}")
-                        errors.append(f"插入日记记录失败: {entry}")
-                        continue
-                    
-                except Exception as entry_error:
-                    Logger.warning(f"Database: 处理日记记录时出错: {entry} - {str(entry_error)}")
-                    errors.append(f"处理日记记录时出错: {entry}")
-                    continue
+            with self._cond:
+                self._running = False
+                self._cond.notify_all()
             
-            # 提交事务
-            try:
-                conn.commit()
-                Logger.info(f"Database: 成功导入 {weight_count} 条体重记录和 {diary_count} 条日记记录")
-                return True, errors
-            except Exception as commit_error:
-                Logger.error(f"Database: 提交事务失败: {str(commit_error)}")
-                conn.rollback()
-                errors.append(f"提交事务失败: {str(commit_error)}")
-                return False, errors
-        except Exception as e:
-            Logger.error(f"Database: 导入数据时发生错误: {str(e)}")
-            if conn:
-                try:
-                    conn.rollback()
-                except:
-                    pass
-            errors.append(f"导入数据时发生错误: {str(e)}")
-            return False, errors
+            if callback is not None:
+                Clock.schedule_once(lambda dt, callback=callback, result=result: callback(result))
+
+class HistoryRow(ButtonBehavior, Label):
+    """历史列表中的一行，点击时弹窗显示完整内容"""
+    detail = StringProperty('')
+    date = StringProperty('')
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.halign = 'left'
+        self.valign = 'middle'
+        self.bind(size=self.setter('text_size'))
+    
+    def on_release(self):
+        if self.detail:
+            App.get_running_app().show_popup("详细内容", self.detail)
+
+class HistoryRecycleView(RecycleView):
+    """分页加载的历史记录列表
+    
+    只为可见的行创建控件。滚动到接近底部时调用load_more加载下一页，
+    追加数据时保持当前的滚动位置。
+    """
+    
+    def __init__(self, row_height, load_more, **kwargs):
+        super().__init__(**kwargs)
+        self.viewclass = HistoryRow
+        self.load_more = load_more
+        self.exhausted = False
+        self._loading = False
+        
+        layout = RecycleBoxLayout(
+            default_size=(None, row_height),
+            default_size_hint=(1, None),
+            size_hint_y=None,
+            orientation='vertical'
+        )
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
+        self.bind(scroll_y=self._on_scroll_y)
+    
+    def reset(self, rows, exhausted):
+        self.data = rows
+        self.exhausted = exhausted
+        self.scroll_y = 1
+    
+    def append(self, rows, exhausted):
+        self.exhausted = exhausted
+        if not rows:
+            return
+        # 记住距顶部的像素偏移，内容变高后恢复，避免列表跳动
+        scrollable = max(1, self.layout_manager.height - self.height)
+        offset = (1 - self.scroll_y) * scrollable
+        self.data.extend(rows)
+        
+        def restore(dt):
+            new_scrollable = max(1, self.layout_manager.height - self.height)
+            self.scroll_y = max(0, min(1, 1 - offset / new_scrollable))
+        Clock.schedule_once(restore)
+    
+    def _on_scroll_y(self, instance, value):
+        if value > 0.05 or self.exhausted or self._loading or not self.data:
+            return
+        self._loading = True
+        try:
+            self.load_more()
         finally:
-            if conn:
-                try:
-                    conn.close()
-                except:
-                    pass
+            self._loading = False
+
+class LazyTabbedPanel(TabbedPanel):
+    """首次切换到某个标签页时才构建其内容的TabbedPanel
+    
+    标签页头部可以设置content_factory属性（无参可调用对象），
+    在该标签页第一次被选中时调用它生成内容，之后直接复用。
+    """
+    
+    def switch_to(self, header, do_scroll=False):
+        content_factory = getattr(header, 'content_factory', None)
+        if header.content is None and content_factory is not None:
+            header.content = content_factory()
+        super().switch_to(header, do_scroll=do_scroll)
 
 class WeightTrackerApp(App):
+    # 可刷新的视图 -> 所在的标签页
+    VIEW_TABS = {
+        'records': 'record',
+        'stats': 'stats',
+        'chart': 'chart',
+        'today_diary': 'diary',
+        'diary': 'diary',
+    }
+    
+    # 日记自动保存的防抖时间（秒）
+    AUTOSAVE_DELAY = 1.0
+    # 用户停止操作多少秒后在后台进行数据库例行维护
+    MAINTENANCE_IDLE_DELAY = 60.0
+    
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.db = None
+        self.tab_panel = None
+        # 已经构建过内容的标签页
+        self._built_tabs = set()
+        # 数据已变化、等待刷新的视图，在下一帧合并刷新
+        self._dirty_views = set()
+        self._refresh_trigger = Clock.create_trigger(self._flush_refresh)
+        # 日记自动保存：输入停止AUTOSAVE_DELAY秒后在后台写入
+        self.writer = BackgroundWriter()
+        self._autosave_event = Clock.create_trigger(self.autosave_diary, self.AUTOSAVE_DELAY)
+        self._loading_diary = False
+        # 数据库例行维护：空闲MAINTENANCE_IDLE_DELAY秒后或应用进入后台时运行，见run_maintenance
+        self._maintenance_event = Clock.create_trigger(self.run_maintenance, self.MAINTENANCE_IDLE_DELAY)
+    
+    def build_config(self, config):
+        config.setdefaults('goal', {
+            'target_weight': '0',
+        })
+        config.setdefaults('stats', {
+            'exclude_flagged': '0',
+        })
+        config.setdefaults('export', {
+            'directory': '',
+            'format': 'xlsx',
+        })
+        config.setdefaults('storage', {
+            'archive_days': '365',
+        })
+        config.setdefaults('diagnostics', {
+            'profiling': '1' if instrumentation.is_enabled() else '0',
+        })
+    
+    def build_settings(self, settings):
+        settings.add_json_panel('应用设置', self.config, data=json.dumps([
+            {'type': 'title', 'title': '目标'},
+            {'type': 'numeric', 'title': '目标体重(斤)', 'desc': '用于预测达到目标的日期，0表示不设置',
+             'section': 'goal', 'key': 'target_weight'},
+            {'type': 'title', 'title': '统计'},
+            {'type': 'bool', 'title': '排除待核实记录', 'desc': '统计、图表和趋势预测中不使用被标记为异常的体重',
+             'section': 'stats', 'key': 'exclude_flagged'},
+            {'type': 'title', 'title': '导出'},
+            {'type': 'path', 'title': '导出目录', 'desc': '导出和导入文件所在的目录，留空表示自动选择',
+             'section': 'export', 'key': 'directory', 'dirselect': True},
+            {'type': 'options', 'title': '导出格式',
+             'desc': 'xlsx为Excel表格；jsonl.gz为压缩备份，速度快、文件小，保留全部字段，不需要Excel相关库',
+             'section': 'export', 'key': 'format', 'options': list(EXPORT_FILENAMES)},
+            {'type': 'title', 'title': '存储'},
+            {'type': 'numeric', 'title': '归档天数',
+             'desc': '早于该天数的记录移入归档数据库，主数据库保持精简，查询时自动合并两者；0表示不归档',
+             'section': 'storage', 'key': 'archive_days'},
+            {'type': 'title', 'title': '诊断'},
+            {'type': 'bool', 'title': '性能埋点', 'desc': '记录启动、数据库、图表和导入导出的耗时',
+             'section': 'diagnostics', 'key': 'profiling'},
+        ]))
+    
+    def on_config_change(self, config, section, key, value):
+        if section == 'diagnostics' and key == 'profiling':
+            instrumentation.set_enabled(value in ('1', 'True', True))
+        elif section == 'goal':
+            self.mark_dirty('stats', 'chart')
+        elif section == 'stats' and key == 'exclude_flagged':
+            if self.db:
+                self.db.set_exclude_flagged(value in ('1', 'True', True))
+            self.mark_dirty('stats', 'chart')
+        elif section == 'export' and key == 'directory':
+            if self.db:
+                self.db.set_export_dir(value)
+        elif section == 'storage' and key == 'archive_days':
+            self.archive_old_records()
+    
+    def export_filename(self):
+        """设置中导出格式对应的文件名，导出和导入都使用这个文件"""
+        file_format = self.config.get('export', 'format') if self.config is not None else 'xlsx'
+        return EXPORT_FILENAMES.get(file_format, EXPORT_FILENAMES['xlsx'])
+    
+    def goal_weight(self):
+        """设置中的目标体重，未设置或无效时返回None"""
+        if self.config is None:
+            return None
+        try:
+            value = float(self.config.get('goal', 'target_weight'))
+        except (ValueError, TypeError):
+            return None
+        return value if value > 0 else None
+    
+    def archive_days(self):
+        """设置中的归档天数，0或无效时不归档"""
+        if self.config is None:
+            return 0
+        try:
+            return max(0, int(float(self.config.get('storage', 'archive_days'))))
+        except (ValueError, TypeError):
+            return 0
+    
+    def archive_old_records(self):
+        """按设置在后台把旧记录移入归档数据库，界面显示的数据不变，不需要刷新"""
+        days = self.archive_days()
+        if self.db and days > 0:
+            self.writer.submit('archive', self.db.archive_old_records, days)
+    
+    def _on_user_activity(self, *args):
+        """用户每次操作都重新计时，例行维护只在空闲时运行"""
+        self._maintenance_event.cancel()
+        self._maintenance_event()
+    
+    def run_maintenance(self, dt=None):
+        """在后台进行数据库例行维护，距上次维护不足MAINTENANCE_INTERVAL_DAYS天时跳过"""
+        if self.db:
+            self.writer.submit('maintenance', self.db.run_maintenance,
+                               WeightDatabase.MAINTENANCE_INTERVAL_DAYS, callback=self._on_maintenance_done)
+    
+    def _on_maintenance_done(self, stats):
+        if stats and stats['integrity'] != 'ok':
+            self.show_popup("警告", f"数据库完整性检查发现问题，建议尽快导出备份:\n{stats['integrity']}")
     
+    def compact_database(self, instance):
+        """立即进行一次完整的例行维护，旧数据库较大时也转换为增量回收模式"""
+        if not self.db:
+            self.show_popup("错误", "数据库未初始化，请重启应用")
+            return
+        self.show_popup("提示", "正在后台整理数据库，数据较多时需要一些时间")
+        self.writer.submit('compact', self.db.run_maintenance, None, True,
+                           callback=self._on_compact_done)
+    
+    def _on_compact_done(self, stats):
+        if stats is None:
+            self.show_popup("错误", "整理数据库失败，请查看日志")
+        elif stats['integrity'] != 'ok':
+            self._on_maintenance_done(stats)
+        else:
+            self.show_popup("成功", f"整理完成，回收{stats['reclaimed_pages']}页，"
+                                  f"数据库{stats['db_size']}字节")
+    
+    @instrumentation.timed('app.build')
     def build(self):
         try:
+            if self.config is not None and self.config.getboolean('diagnostics', 'profiling'):
+                instrumentation.set_enabled(True)
+            
             # 设置应用标题
             self.title = "减肥体重记录器"
             
-            # 延迟创建数据库，确保应用完全启动
-            Clock.schedule_once(self.initialize_database, 0.5)
-            
-            # 创建主界面
-            main_layout = TabbedPanel(tab_pos='bottom_mid')
-            main_layout.do_default_tab = False
+            # 创建主界面，标签页内容在首次选中时才构建
+            main_layout = LazyTabbedPanel(tab_pos='bottom_mid', do_default_tab=False)
             main_layout.font_size = '32sp'
             
-            # 记录体重标签页
-            record_tab = TabbedPanelItem(text='记录体重')
-            record_tab.add_widget(self.create_record_tab())
-            main_layout.add_widget(record_tab)
-            
-            # 体重统计标签页
-            stats_tab = TabbedPanelItem(text='体重统计')
-            stats_tab.add_widget(self.create_stats_tab())
-            main_layout.add_widget(stats_tab)
-            
-            # 趋势图表标签页
-            chart_tab = TabbedPanelItem(text='趋势图表')
-            chart_tab.add_widget(self.create_chart_tab())
-            main_layout.add_widget(chart_tab)
-            
-            # 减肥日记标签页
-            diary_tab = TabbedPanelItem(text='减肥日记')
-            diary_tab.add_widget(self.create_diary_tab())
-            main_layout.add_widget(diary_tab)
-            
-            # 数据管理标签页
-            data_tab = TabbedPanelItem(text='数据管理')
-            data_tab.add_widget(self.create_data_tab())
-            main_layout.add_widget(data_tab)
+            tabs = [
+                ('record', '记录体重'),
+                ('stats', '体重统计'),
+                ('chart', '趋势图表'),
+                ('diary', '减肥日记'),
+                ('data', '数据管理'),
+            ]
+            for tab_key, tab_text in tabs:
+                tab = TabbedPanelItem(text=tab_text)
+                tab.tab_key = tab_key
+                tab.content_factory = lambda tab_key=tab_key: self.build_tab(tab_key)
+                main_layout.add_widget(tab)
+            main_layout.bind(current_tab=self.on_tab_switch)
+            self.tab_panel = main_layout
             
-            Logger.info("App: 应用界面初始化成功")
+            Logger.info(f"App: 应用界面初始化成功 ({(time.perf_counter() - _STARTUP_T0) * 1000:.1f} ms)")
             return main_layout
             
         except Exception as e:
             Logger.error(f"App: 应用初始化失败 - {str(e)}")
             return self.create_error_layout(str(e))
     
-    def initialize_database(self, dt):
-        """延迟初始化数据库"""
-        try:
-            self.db = WeightDatabase(self)
-            Logger.info("App: 数据库初始化成功")
-            
-            # 初始化显示数据
+    def on_start(self):
+        # 首帧绘制完成后立即初始化数据库，而不是固定延迟
+        from kivy.core.window import Window
+        Window.bind(on_flip=self._on_first_frame)
+    
+    def _on_first_frame(self, window):
+        window.unbind(on_flip=self._on_first_frame)
+        Logger.info(f"App: 首帧耗时 {(time.perf_counter() - _STARTUP_T0) * 1000:.1f} ms")
+        Clock.schedule_once(self.initialize_database)
+    
+    def build_tab(self, tab_key):
+        """构建指定标签页的内容，并在数据库就绪时填充数据"""
+        builders = {
+            'record': self.create_record_tab,
+            'stats': self.create_stats_tab,
+            'chart': self.create_chart_tab,
+            'diary': self.create_diary_tab,
+            'data': self.create_data_tab,
+        }
+        start = time.perf_counter()
+        content = builders[tab_key]()
+        self._built_tabs.add(tab_key)
+        if self.db:
+            with self.db.read_snapshot():
+                self.refresh_tab(tab_key)
+        Logger.info(f"App: 标签页 {tab_key} 构建完成 ({(time.perf_counter() - start) * 1000:.1f} ms)")
+        return content
+    
+    def refresh_tab(self, tab_key):
+        """立即刷新指定标签页的所有视图，未构建的标签页会被跳过"""
+        for view, view_tab in self.VIEW_TABS.items():
+            if view_tab == tab_key:
+                self.refresh_view(view)
+    
+    def refresh_view(self, view):
+        """立即刷新单个视图"""
+        if self.VIEW_TABS[view] not in self._built_tabs:
+            return
+        self._dirty_views.discard(view)
+        if view == 'records':
             self.update_records_display()
+        elif view == 'stats':
             self.update_statistics()
+        elif view == 'chart':
             self.update_chart()
+        elif view == 'today_diary':
             self.load_today_diary()
+        elif view == 'diary':
             self.update_diary_display()
+    
+    def mark_dirty(self, *views):
+        """标记视图需要刷新，同一帧内的多次标记合并为一次刷新"""
+        self._dirty_views.update(views)
+        self._refresh_trigger()
+    
+    def current_tab_key(self):
+        if self.tab_panel is None:
+            return None
+        return getattr(self.tab_panel.current_tab, 'tab_key', None)
+    
+    def on_tab_switch(self, panel, tab):
+        # 切换到有待刷新视图的标签页时补上延迟的刷新
+        tab_key = getattr(tab, 'tab_key', None)
+        if any(self.VIEW_TABS[view] == tab_key for view in self._dirty_views):
+            self._refresh_trigger()
+    
+    def _flush_refresh(self, dt=None):
+        """刷新当前可见标签页上的脏视图，隐藏标签页等到打开时再刷新"""
+        if not self.db:
+            return
+        visible_tab = self.current_tab_key()
+        views = [view for view in self._dirty_views
+                 if self.VIEW_TABS[view] == visible_tab and visible_tab in self._built_tabs]
+        if not views:
+            return
+        
+        with self.db.read_snapshot():
+            for view in views:
+                try:
+                    self.refresh_view(view)
+                except Exception as e:
+                    Logger.error(f"App: 刷新视图 {view} 失败 - {str(e)}")
+    
+    @instrumentation.timed('app.initialize_database')
+    def initialize_database(self, dt):
+        """首帧之后初始化数据库"""
+        try:
+            self.db = WeightDatabase(self)
+            if self.config is not None:
+                self.db.set_exclude_flagged(self.config.getboolean('stats', 'exclude_flagged'))
+                self.db.set_export_dir(self.config.get('export', 'directory'))
+            Logger.info("App: 数据库初始化成功")
+            
+            # 只刷新可见的标签页，其余标签页在首次打开时填充
+            self.mark_dirty(*self.VIEW_TABS)
+            self.archive_old_records()
+            
+            from kivy.core.window import Window
+            Window.bind(on_touch_down=self._on_user_activity, on_key_down=self._on_user_activity)
+            self._maintenance_event()
+            
+            Logger.info(f"App: 可交互耗时 {(time.perf_counter() - _STARTUP_T0) * 1000:.1f} ms")
             
         except Exception as e:
             Logger.error(f"App: 数据库初始化失败 - {str(e)}")
@@ -1359,21 +3838,16 @@ class WeightTrackerApp(App):
         
         layout.add_widget(button_layout)
         
-        self.records_label = Label(
-            text='最近体重记录：\n\n',
-            font_size=40,
-            text_size=(None, None),
-            size_hint_y=0.65,
-            halign='left',
-            valign='top'
-        )
-        self.records_label.bind(size=self.records_label.setter('text_size'))
-        
-        scroll = ScrollView()
-        scroll.add_widget(self.records_label)
-        layout.add_widget(scroll)
+        layout.add_widget(Label(text='历史体重记录：', font_size=40, size_hint_y=0.06))
         
-        Clock.schedule_once(self.update_records_display, 0.1)
+        # 全部历史按页加载，只渲染可见的行
+        self._records_cursor = None
+        self.records_view = HistoryRecycleView(
+            row_height=60,
+            load_more=self.load_more_records,
+            size_hint_y=0.59
+        )
+        layout.add_widget(self.records_view)
         
         return layout
     
@@ -1419,6 +3893,20 @@ class WeightTrackerApp(App):
         )
         stats_layout.add_widget(self.weight_diff)
         
+        self.week_change = Label(
+            text='周环比: 计算中...',
+            font_size=46,
+            color=(0.1, 0.5, 0.5, 1)
+        )
+        stats_layout.add_widget(self.week_change)
+        
+        self.trend_label = Label(
+            text='体重趋势: 计算中...',
+            font_size=40,
+            color=(0.3, 0.3, 0.3, 1)
+        )
+        stats_layout.add_widget(self.trend_label)
+        
         layout.add_widget(stats_layout)
         
         refresh_btn = Button(
@@ -1430,8 +3918,6 @@ class WeightTrackerApp(App):
         refresh_btn.bind(on_press=self.update_statistics)
         layout.add_widget(refresh_btn)
         
-        Clock.schedule_once(self.update_statistics, 0.1)
-        
         return layout
     
     def create_chart_tab(self):
@@ -1485,8 +3971,6 @@ class WeightTrackerApp(App):
         refresh_btn.bind(on_press=self.update_chart)
         layout.add_widget(refresh_btn)
         
-        Clock.schedule_once(self.update_chart, 0.1)
-        
         return layout
     
     def create_diary_tab(self):
@@ -1515,31 +3999,55 @@ class WeightTrackerApp(App):
         )
         layout.add_widget(self.thoughts_input)
         
+        # 输入内容变化后自动保存
+        self.food_input.bind(text=self.on_diary_text_change)
+        self.thoughts_input.bind(text=self.on_diary_text_change)
+        
+        save_layout = BoxLayout(orientation='horizontal', size_hint_y=0.08, spacing=15)
         save_btn = Button(
             text='保存日记',
             font_size=44,
             background_color=(0.2, 0.6, 0.8, 1),
-            size_hint_y=0.08
+            size_hint_x=0.6
         )
         save_btn.bind(on_press=self.save_diary)
-        layout.add_widget(save_btn)
+        save_layout.add_widget(save_btn)
         
-        self.diary_display = Label(
-            text='最近日记记录：\n\n',
+        self.diary_status_label = Label(text='', font_size=34, size_hint_x=0.4)
+        save_layout.add_widget(self.diary_status_label)
+        layout.add_widget(save_layout)
+        
+        search_layout = BoxLayout(orientation='horizontal', size_hint_y=0.07, spacing=15)
+        self.diary_search_input = TextInput(
+            multiline=False,
             font_size=38,
-            text_size=(None, None),
-            size_hint_y=0.5,
-            halign='left',
-            valign='top'
+            hint_text='搜索日记关键词...',
+            size_hint_x=0.6
         )
-        self.diary_display.bind(size=self.diary_display.setter('text_size'))
+        self.diary_search_input.bind(on_text_validate=self.search_diary)
+        search_layout.add_widget(self.diary_search_input)
         
-        scroll = ScrollView()
-        scroll.add_widget(self.diary_display)
-        layout.add_widget(scroll)
+        search_btn = Button(text='搜索', font_size=40, size_hint_x=0.2)
+        search_btn.bind(on_press=self.search_diary)
+        search_layout.add_widget(search_btn)
+        
+        clear_btn = Button(text='清除', font_size=40, size_hint_x=0.2)
+        clear_btn.bind(on_press=self.clear_diary_search)
+        search_layout.add_widget(clear_btn)
+        layout.add_widget(search_layout)
         
-        Clock.schedule_once(self.load_today_diary, 0.1)
-        Clock.schedule_once(self.update_diary_display, 0.1)
+        self.diary_list_title = Label(text='历史日记记录（点击查看全文）：', font_size=38, size_hint_y=0.05)
+        layout.add_widget(self.diary_list_title)
+        
+        # 当前的日记搜索关键词，为空时显示全部历史
+        self._diary_query = ''
+        self._diary_cursor = None
+        self.diary_view = HistoryRecycleView(
+            row_height=170,
+            load_more=self.load_more_diary,
+            size_hint_y=0.38
+        )
+        layout.add_widget(self.diary_view)
         
         return layout
     
@@ -1563,7 +4071,7 @@ class WeightTrackerApp(App):
         )
         
         export_btn = Button(
-            text='导出数据(Excel)',
+            text='导出数据',
             font_size=44,
             background_color=(0.2, 0.6, 0.8, 1),
             size_hint=(None, None),
@@ -1572,7 +4080,7 @@ class WeightTrackerApp(App):
         export_btn.bind(on_press=self.export_data)
         
         import_btn = Button(
-            text='导入数据(Excel)',
+            text='导入数据',
             font_size=44,
             background_color=(0.2, 0.7, 0.3, 1),
             size_hint=(None, None),
@@ -1580,6 +4088,15 @@ class WeightTrackerApp(App):
         )
         import_btn.bind(on_press=self.import_data)
         
+        import_file_btn = Button(
+            text='从其他文件导入',
+            font_size=44,
+            background_color=(0.3, 0.6, 0.5, 1),
+            size_hint=(None, None),
+            size=(450, 140)
+        )
+        import_file_btn.bind(on_press=self.choose_import_file)
+        
         file_location_btn = Button(
             text='查看文件位置',
             font_size=44,
@@ -1598,6 +4115,24 @@ class WeightTrackerApp(App):
         )
         instructions_btn.bind(on_press=self.show_instructions)
         
+        diagnostics_btn = Button(
+            text='性能诊断',
+            font_size=44,
+            background_color=(0.5, 0.5, 0.6, 1),
+            size_hint=(None, None),
+            size=(450, 140)
+        )
+        diagnostics_btn.bind(on_press=self.show_diagnostics)
+        
+        compact_btn = Button(
+            text='整理数据库',
+            font_size=44,
+            background_color=(0.4, 0.5, 0.7, 1),
+            size_hint=(None, None),
+            size=(450, 140)
+        )
+        compact_btn.bind(on_press=self.compact_database)
+        
         export_container = BoxLayout(orientation='horizontal')
         export_container.add_widget(Widget(size_hint_x=0.5))
         export_container.add_widget(export_btn)
@@ -1608,6 +4143,11 @@ class WeightTrackerApp(App):
         import_container.add_widget(import_btn)
         import_container.add_widget(Widget(size_hint_x=0.5))
         
+        import_file_container = BoxLayout(orientation='horizontal')
+        import_file_container.add_widget(Widget(size_hint_x=0.5))
+        import_file_container.add_widget(import_file_btn)
+        import_file_container.add_widget(Widget(size_hint_x=0.5))
+        
         file_location_container = BoxLayout(orientation='horizontal')
         file_location_container.add_widget(Widget(size_hint_x=0.5))
         file_location_container.add_widget(file_location_btn)
@@ -1618,10 +4158,23 @@ class WeightTrackerApp(App):
         instructions_container.add_widget(instructions_btn)
         instructions_container.add_widget(Widget(size_hint_x=0.5))
         
+        diagnostics_container = BoxLayout(orientation='horizontal')
+        diagnostics_container.add_widget(Widget(size_hint_x=0.5))
+        diagnostics_container.add_widget(diagnostics_btn)
+        diagnostics_container.add_widget(Widget(size_hint_x=0.5))
+        
+        compact_container = BoxLayout(orientation='horizontal')
+        compact_container.add_widget(Widget(size_hint_x=0.5))
+        compact_container.add_widget(compact_btn)
+        compact_container.add_widget(Widget(size_hint_x=0.5))
+        
         button_container.add_widget(export_container)
         button_container.add_widget(import_container)
+        button_container.add_widget(import_file_container)
         button_container.add_widget(file_location_container)
         button_container.add_widget(instructions_container)
+        button_container.add_widget(diagnostics_container)
+        button_container.add_widget(compact_container)
         
         center_container.add_widget(button_container)
         center_container.add_widget(Widget(size_hint_y=0.2))
@@ -1641,35 +4194,73 @@ class WeightTrackerApp(App):
                 if 20 <= weight <= 400:
                     current_date = format_date(date.today())
                     weight_type = 'morning' if self.time_spinner.text == '早晨' else 'evening'
+                    type_display = self.time_spinner.text
                     
-                    if self.db.add_weight_record(current_date, weight_type, weight):
-                        self.weight_input.text = ""
-                        self.update_records_display()
-                        self.update_statistics()
-                        self.update_chart()
-                        self.show_popup("成功", f"{self.time_spinner.text}体重记录成功！")
-                    else:
-                        self.show_popup("错误", "体重记录失败，请重试")
+                    anomaly = self.db.check_weight(weight_type, weight)
+                    if anomaly:
+                        self.show_confirm(
+                            "请确认体重",
+                            f"{weight}斤与最近的{type_display}体重（约{anomaly['expected']:.1f}斤）相差较大，"
+                            f"请检查是否输错或选错了时间。\n确认保存后该记录会标记为待核实。",
+                            lambda: self._save_weight(current_date, weight_type, weight, type_display, True)
+                        )
+                        return
+                    
+                    self._save_weight(current_date, weight_type, weight, type_display)
                 else:
                     self.show_popup("错误", "体重必须在20-400斤之间")
             except ValueError:
                 self.show_popup("错误", "请输入有效的数字")
     
+    def _save_weight(self, date_str, weight_type, weight, type_display, flagged=False):
+        if self.db.add_weight_record(date_str, weight_type, weight, flagged):
+            self.weight_input.text = ""
+            self.mark_dirty('records', 'stats', 'chart')
+            self.show_popup("成功", f"{type_display}体重记录成功！")
+        else:
+            self.show_popup("错误", "体重记录失败，请重试")
+    
+    # 历史列表每页加载的行数
+    RECORDS_PAGE_SIZE = 50
+    DIARY_PAGE_SIZE = 20
+    # "全部数据"图表按天绘制的最大天数，超过后改用周汇总
+    DAILY_CHART_LIMIT = 365
+    # 早晨体重图表中预测区间的天数
+    FORECAST_DAYS = 14
+    
     def update_records_display(self, dt=None):
-        if not self.db:
+        """从第一页重新加载体重历史"""
+        if not self.db or 'record' not in self._built_tabs:
             return
-        records = self.db.get_recent_records(7)
-        display_text = "最近体重记录：\n\n"
-        
-        for record in records:
-            date_str, weight_type, weight = record
-            weight_type_display = "早晨" if weight_type == "morning" else "晚上"
-            display_text += f"{date_str} {weight_type_display}: {weight}斤\n"
-        
-        self.records_label.text = display_text
+        records = self.db.get_records_page(None, self.RECORDS_PAGE_SIZE)
+        self._records_cursor = records[-1] if records else None
+        self.records_view.reset(
+            [self._record_row(record) for record in records],
+            exhausted=len(records) < self.RECORDS_PAGE_SIZE
+        )
+    
+    def load_more_records(self):
+        """加载体重历史的下一页"""
+        if not self.db or self._records_cursor is None:
+            return
+        records = self.db.get_records_page(self._records_cursor, self.RECORDS_PAGE_SIZE)
+        if records:
+            self._records_cursor = records[-1]
+        self.records_view.append(
+            [self._record_row(record) for record in records],
+            exhausted=len(records) < self.RECORDS_PAGE_SIZE
+        )
+    
+    def _record_row(self, record):
+        record_id, date_str, weight_type, weight, flagged = record
+        weight_type_display = "早晨" if weight_type == "morning" else "晚上"
+        text = f"{date_str} {weight_type_display}: {weight}斤"
+        if flagged:
+            text += " (待核实)"
+        return {'text': text, 'font_size': 40}
     
     def update_statistics(self, instance=None):
-        if not self.db:
+        if not self.db or 'stats' not in self._built_tabs:
             return
         stats = self.db.get_weight_statistics()
         
@@ -1685,223 +4276,252 @@ class WeightTrackerApp(App):
             self.heaviest_weight.text = "最重体重: 暂无数据"
             self.average_weight.text = "平均体重: 暂无数据"
             self.weight_diff.text = "体重差值: 暂无数据"
+        
+        # 最近7天与之前7天的平均体重对比
+        today = date.today()
+        this_week = self.db.range_stats(today - timedelta(days=6), today)
+        last_week = self.db.range_stats(today - timedelta(days=13), today - timedelta(days=7))
+        if this_week and last_week:
+            change = this_week['mean'] - last_week['mean']
+            self.week_change.text = f"周环比: 均值{this_week['mean']:.1f}斤，较上周{change:+.1f}斤"
+        elif this_week:
+            self.week_change.text = f"周环比: 均值{this_week['mean']:.1f}斤，上周无记录"
+        else:
+            self.week_change.text = "周环比: 最近7天无记录"
+        
+        goal = self.goal_weight()
+        prediction = self.db.get_forecast(goal)
+        if not prediction:
+            self.trend_label.text = "体重趋势: 记录不足，无法预测"
+        else:
+            trend = f"体重趋势: 每周{prediction['robust_slope'] * 7:+.1f}斤"
+            if goal is None:
+                trend += "（可在设置中填写目标体重）"
+            elif prediction['goal_day'] is not None:
+                trend += f"，预计{date.fromordinal(prediction['goal_day']).strftime('%Y/%m/%d')}达到{goal:g}斤"
+            else:
+                trend += f"，按当前趋势无法达到{goal:g}斤"
+            self.trend_label.text = trend
     
     def update_chart(self, instance=None):
+        if not self.db or 'chart' not in self._built_tabs:
+            return
         range_text = self.chart_range_spinner.text
+        title_suffix = ""
         if range_text == '最近7天':
-            days = 7
+            chart_data = self.db.get_chart_data(7)
         elif range_text == '最近30天':
-            days = 30
+            chart_data = self.db.get_chart_data(30)
         else:
-            days = 365
-        
-        chart_data = self.db.get_chart_data(days)
+            # 超过一年的历史按周均值绘制，点数只有按天绘制的七分之一
+            chart_data = self.db.get_chart_data(self.DAILY_CHART_LIMIT + 1)
+            if len(chart_data['labels']) > self.DAILY_CHART_LIMIT:
+                chart_data = self.db.get_rollup_chart_data('week')
+                title_suffix = "(周均值)"
         
         chart_type = self.chart_type_spinner.text
+        forecast_band = None
         if chart_type == '早晨体重':
             data_points = chart_data['morning_weights']
             labels = chart_data['labels']
-            self.chart.chart_title = "早晨体重趋势图"
+            self.chart.chart_title = "早晨体重趋势图" + title_suffix
+            if not title_suffix:
+                # 按天绘制时在数据之后画出未来的预测区间
+                prediction = self.db.get_forecast(self.goal_weight(), self.FORECAST_DAYS)
+                if prediction:
+                    forecast_band = [point[1:] for point in prediction['band']]
         elif chart_type == '晚上体重':
             data_points = chart_data['evening_weights']
             labels = chart_data['labels']
-            self.chart.chart_title = "晚上体重趋势图"
+            self.chart.chart_title = "晚上体重趋势图" + title_suffix
         else:
             data_points = chart_data['morning_weights'] + chart_data['evening_weights']
             labels = chart_data['labels'] + [f"{label}(晚)" for label in chart_data['labels']]
-            self.chart.chart_title = "全部体重趋势图"
+            self.chart.chart_title = "全部体重趋势图" + title_suffix
         
-        self.chart.set_data(data_points, labels)
+        self.chart.set_data(data_points, labels, forecast_band)
     
     def on_chart_type_change(self, spinner, text):
-        self.update_chart()
+        self.mark_dirty('chart')
     
     def on_chart_range_change(self, spinner, text):
-        self.update_chart()
+        self.mark_dirty('chart')
     
     def load_today_diary(self, dt=None):
+        if not self.db or 'diary' not in self._built_tabs:
+            return
         today_entry = self.db.get_today_diary_entry()
         if today_entry:
-            self.food_input.text = today_entry['food'] or ""
-            self.thoughts_input.text = today_entry['thoughts'] or ""
+            # 加载已保存的内容不应触发自动保存
+            self._loading_diary = True
+            try:
+                self.food_input.text = today_entry['food'] or ""
+                self.thoughts_input.text = today_entry['thoughts'] or ""
+            finally:
+                self._loading_diary = False
     
-    def save_diary(self, instance):
-        if not self.db:
-            self.show_popup("错误", "数据库未初始化，请重启应用")
+    def on_diary_text_change(self, instance, text):
+        if self._loading_diary or not self.db:
             return
+        # 重新计时，输入停止一段时间后才保存
+        self._autosave_event.cancel()
+        self._autosave_event()
+        self.diary_status_label.text = '未保存'
+    
+    def autosave_diary(self, dt=None):
+        """在后台保存当天日记，只写入最新的内容"""
+        self._submit_diary_save(on_saved=None)
+    
+    def _submit_diary_save(self, on_saved):
         food_text = self.food_input.text
         thoughts_text = self.thoughts_input.text
         current_date = format_date(date.today())
         
-        if self.db.add_diary_entry(current_date, food_text, thoughts_text):
-            self.update_diary_display()
-            self.show_popup("成功", "日记保存成功！")
+        def callback(success):
+            self._on_diary_saved(current_date, food_text, thoughts_text, success)
+            if on_saved is not None:
+                on_saved(success)
+        
+        self.writer.submit('today_diary', self.db.add_diary_entry,
+                           current_date, food_text, thoughts_text, callback=callback)
+    
+    def _on_diary_saved(self, date_str, food, thoughts, success):
+        if not success:
+            self.diary_status_label.text = '保存失败'
+            return
+        if not self._autosave_event.is_triggered:
+            self.diary_status_label.text = f"已保存 {datetime.now().strftime('%H:%M:%S')}"
+        
+        # 显示搜索结果时当天的日记可能新出现在结果中、移出结果或改变排名，重新搜索
+        if self._diary_query:
+            self.mark_dirty('diary')
+            return
+        # 只有当天的日记变化，直接更新列表中的对应行，不重新加载整个列表
+        row = self._diary_row((None, date_str, food, thoughts))
+        data = self.diary_view.data
+        if data and data[0].get('date') == date_str:
+            data[0] = row
         else:
-            self.show_popup("错误", "日记保存失败，请重试")
+            data.insert(0, row)
     
-    def update_diary_display(self, dt=None):
-        entries = self.db.get_recent_diary_entries(10)
-        diary_text = "最近日记记录：\n\n"
+    def save_diary(self, instance):
+        if not self.db:
+            self.show_popup("错误", "数据库未初始化，请重启应用")
+            return
+        self._autosave_event.cancel()
         
-        for entry in entries:
-            date_str, food, thoughts = entry
-            food = food or "无记录"
-            thoughts = thoughts or "无记录"
-            diary_text += f"日期: {date_str}\n"
-            diary_text += f"饮食: {food}\n"
-            diary_text += f"心得: {thoughts}\n"
-            diary_text += "-" * 30 + "\n"
+        def on_saved(success):
+            if success:
+                self.show_popup("成功", "日记保存成功！")
+            else:
+                self.show_popup("错误", "日记保存失败，请重试")
         
-        self.diary_display.text = diary_text
+        self._submit_diary_save(on_saved)
+    
+    def flush_diary_autosave(self):
+        """立即保存尚未写入的日记并等待后台写入完成"""
+        if self._autosave_event.is_triggered and self.db:
+            self._autosave_event.cancel()
+            self.autosave_diary()
+        self.writer.flush(timeout=5)
+    
+    def update_diary_display(self, dt=None):
+        """从第一页重新加载日记历史或搜索结果"""
+        if not self.db or 'diary' not in self._built_tabs:
+            return
+        if self._diary_query:
+            entries = self.db.search_diary(self._diary_query, self.DIARY_PAGE_SIZE, 0)
+            self.diary_list_title.text = f'搜索"{self._diary_query}"的结果（点击查看全文）：'
+        else:
+            entries = self.db.get_diary_page(None, self.DIARY_PAGE_SIZE)
+            self.diary_list_title.text = '历史日记记录（点击查看全文）：'
+        self._diary_cursor = entries[-1] if entries else None
+        self.diary_view.reset(
+            [self._diary_row(entry) for entry in entries],
+            exhausted=len(entries) < self.DIARY_PAGE_SIZE
+        )
+        if self._diary_query and not entries:
+            self.diary_list_title.text = f'没有找到包含"{self._diary_query}"的日记'
+    
+    def load_more_diary(self):
+        """加载日记历史或搜索结果的下一页"""
+        if not self.db or self._diary_cursor is None:
+            return
+        if self._diary_query:
+            entries = self.db.search_diary(self._diary_query, self.DIARY_PAGE_SIZE, len(self.diary_view.data))
+        else:
+            entries = self.db.get_diary_page(self._diary_cursor, self.DIARY_PAGE_SIZE)
+        if entries:
+            self._diary_cursor = entries[-1]
+        self.diary_view.append(
+            [self._diary_row(entry) for entry in entries],
+            exhausted=len(entries) < self.DIARY_PAGE_SIZE
+        )
+    
+    def search_diary(self, instance):
+        self._diary_query = self.diary_search_input.text.strip()
+        self.update_diary_display()
     
+    def clear_diary_search(self, instance):
+        self.diary_search_input.text = ''
+        self._diary_query = ''
+        self.update_diary_display()
+    
+    def _diary_row(self, entry):
+        entry_id, date_str, food, thoughts = entry
+        food = food or "无记录"
+        thoughts = thoughts or "无记录"
+        detail = f"日期: {date_str}\n\n饮食: {food}\n\n心得: {thoughts}"
+        # 列表中每项只显示摘要，完整内容点击后查看
+        summary = f"日期: {date_str}\n饮食: {_shorten(food)}\n心得: {_shorten(thoughts)}"
+        return {'text': summary, 'detail': detail, 'date': date_str, 'font_size': 38}
+    
+    @instrumentation.timed('pipeline.export')
     def export_data(self, instance):
         if not self.db:
             self.show_popup("错误", "数据库未初始化，请重启应用")
             return
         
-        # 检查必要的库是否可用
-        if pd is None:
-            self.show_popup("导出失败", "系统缺少pandas库，无法导出数据")
-            return
-        
-        if not openpyxl_available:
-            self.show_popup("导出失败", "系统缺少openpyxl库，无法导出Excel文件")
-            return
-            
         try:
-            # 获取数据
-            weight_records = self.db.get_all_records()
-            diary_entries = self.db.get_all_diary_entries()
-            
-            # 数据计数
-            weight_count = len(weight_records) if weight_records else 0
-            diary_count = len(diary_entries) if diary_entries else 0
-            
-            # 验证是否有数据可导出
-            if weight_count == 0 and diary_count == 0:
-                self.show_popup("导出失败", "没有数据可导出")
-                return
+            # 获取导出路径，导出目录在解析时已确认存在并可写
+            export_path = self.db.get_export_path(self.export_filename())
             
-            # 处理体重记录数据
-            weight_data = []
-            if weight_records:
-                for record in weight_records:
-                    try:
-                        # 确保记录格式正确
-                        if len(record) >= 3:
-                            date_str = str(record[0])  # 日期是第一个字段
-                            weight_type_en = str(record[1])  # 时间类型是第二个字段
-                            
-                            # 转换时间类型为中文
-                            weight_type_cn = "早晨" if weight_type_en.lower() == "morning" else "晚上"
-                            
-                            # 验证体重数值
-                            try:
-                                weight = float(record[2])
-                                # 验证体重范围
-                                if 20 <= weight <= 400:
-                                    weight_data.append([date_str, weight_type_cn, weight])
-                                else:
-                                    Logger.warning(f"跳过异常体重值: {weight} 斤")
-                            except (ValueError, TypeError):
-                                Logger.warning(f"跳过无效体重值: {record[2]}")
-                                continue
-                    except Exception as e:
-                        Logger.warning(f"跳过无效的体重记录: {record}, 错误: {str(e)}")
-                        continue
-            
-            # 处理日记数据
-            diary_data = []
-            if diary_entries:
-                for entry in diary_entries:
-                    try:
-                        # 确保记录格式正确
-                        if len(entry) >= 3:
-                            date_str = str(entry[0])  # 日期是第一个字段
-                            food = str(entry[1]) if entry[1] is not None else ''
-                            thoughts = str(entry[2]) if entry[2] is not None else ''
-                            diary_data.append([date_str, food, thoughts])
-                    except Exception as e:
-                        Logger.warning(f"跳过无效的日记记录: {entry}, 错误: {str(e)}")
-                        continue
-            
-            # 创建DataFrame
-            weight_df = pd.DataFrame(weight_data, columns=['日期', '时间类型', '体重(斤)']) if weight_data else pd.DataFrame(columns=['日期', '时间类型', '体重(斤)'])
-            diary_df = pd.DataFrame(diary_data, columns=['日期', '饮食记录', '减肥心得']) if diary_data else pd.DataFrame(columns=['日期', '饮食记录', '减肥心得'])
-            
-            # 获取并验证导出路径
-            export_path = self.db.get_export_path("weight_data_export.xlsx")
-            
-            # 确保目录存在并可写
-            export_dir = os.path.dirname(export_path)
-            if not os.path.exists(export_dir):
-                try:
-                    os.makedirs(export_dir, exist_ok=True)
-                except Exception as e:
-                    self.show_popup("导出失败", f"无法创建导出目录: {str(e)}")
-                    return
+            # 添加对导出文件扩展名的验证
+            file_format = export_file_format(export_path)
+            if file_format is None:
+                export_path += '.xlsx'
+                file_format = 'xlsx'
+                Logger.warning(f"修正了导出文件扩展名: {export_path}")
             
-            if not os.access(export_dir, os.W_OK):
-                self.show_popup("导出失败", f"无法写入导出目录，请检查权限: {export_dir}")
+            # 检查必要的库是否可用，备份格式只依赖标准库
+            if file_format == 'xlsx' and not openpyxl_available:
+                self.show_popup("导出失败", "系统缺少openpyxl库，无法导出Excel文件")
                 return
             
-            # 写入Excel文件，使用mode='w'确保完全覆盖
+            # 写入导出文件
             try:
-                # 添加对Excel文件扩展名的验证
-                if not export_path.lower().endswith('.xlsx'):
-                    export_path += '.xlsx'
-                    Logger.warning(f"修正了导出文件扩展名: {export_path}")
-                
-                with pd.ExcelWriter(export_path, engine='openpyxl', mode='w') as writer:
-                    # 即使没有数据也创建空的工作表，确保结构一致性
-                    # 创建体重记录表
-                    weight_df.to_excel(writer, sheet_name='体重记录', index=False)
-                    worksheet = writer.sheets['体重记录']
-                    # 优化列宽
-                    for column in worksheet.columns:
-                        max_length = 0
-                        column_letter = column[0].column_letter
-                        try:
-                            for cell in column:
-                                try:
-                                    if cell.value:
-                                        max_length = max(max_length, len(str(cell.value)))
-                                except:
-                                    pass
-                            adjusted_width = min(max_length + 2, 50)
-                            worksheet.column_dimensions[column_letter].width = adjusted_width
-                        except Exception as col_error:
-                            Logger.warning(f"优化体重记录列宽时出错: {column_letter}, 错误: {str(col_error)}")
-                    
-                    # 创建减肥日记表
-                    diary_df.to_excel(writer, sheet_name='减肥日记', index=False)
-                    worksheet = writer.sheets['减肥日记']
-                    # 优化列宽
-                    for column in worksheet.columns:
-                        max_length = 0
-                        column_letter = column[0].column_letter
-                        try:
-                            for cell in column:
-                                try:
-                                    if cell.value:
-                                        max_length = max(max_length, len(str(cell.value)))
-                                except:
-                                    pass
-                            adjusted_width = min(max_length + 2, 80)  # 为文本内容设置更大的宽度
-                            worksheet.column_dimensions[column_letter].width = adjusted_width
-                        except Exception as col_error:
-                            Logger.warning(f"优化日记记录列宽时出错: {column_letter}, 错误: {str(col_error)}")
+                if file_format == 'backup':
+                    weight_count, diary_count = export_backup(self.db, export_path)
+                else:
+                    weight_count, diary_count = export_workbook(self.db, export_path)
             except PermissionError:
                 Logger.error("没有写入权限")
+                self.db.invalidate_export_dir()
                 self.show_popup("导出失败", f"没有写入权限: {export_path}\n请检查文件是否被其他程序占用")
                 return
             except FileNotFoundError:
                 Logger.error("文件路径无效")
+                self.db.invalidate_export_dir()
                 self.show_popup("导出失败", f"文件路径无效或无法访问: {export_path}")
                 return
             except Exception as e:
-                Logger.error(f"Excel写入错误: {str(e)}")
-                self.show_popup("导出失败", f"创建Excel文件时出错: {str(e)}")
+                Logger.error(f"导出文件写入错误: {str(e)}")
+                self.show_popup("导出失败", f"创建导出文件时出错: {str(e)}")
+                return
+            
+            # 验证是否有数据可导出
+            if weight_count == 0 and diary_count == 0:
+                self.show_popup("导出失败", "没有数据可导出")
                 return
             
             # 验证文件是否成功创建
@@ -1909,6 +4529,25 @@ class WeightTrackerApp(App):
                 file_size = os.path.getsize(export_path) / 1024  # KB
                 current_time = datetime.now().strftime('%Y/%m/%d %H:%M:%S')
                 
+                message = f"数据已成功导出！\n\n"
+                message += f"导出路径: {export_path}\n"
+                message += f"文件大小: {file_size:.2f} KB\n"
+                message += f"导出时间: {current_time}\n"
+                message += f"体重记录: {weight_count} 条\n"
+                message += f"日记记录: {diary_count} 条\n"
+                
+                if file_format == 'backup':
+                    # 备份文件不能直接查看，不尝试打开
+                    message += "\n备份文件保留了全部字段，可在导入时恢复。"
+                    self.show_popup("导出成功", message)
+                    return
+                
+                message += "\nExcel文件包含的工作表:\n"
+                if weight_count:
+                    message += "1. 体重记录 - 包含所有体重数据\n"
+                if diary_count:
+                    message += "2. 减肥日记 - 包含所有日记数据\n"
+                
                 # 尝试打开文件
                 try:
                     if sys.platform == 'win32':
@@ -1918,31 +4557,9 @@ class WeightTrackerApp(App):
                     elif sys.platform.startswith('linux'):
                         subprocess.call(['xdg-open', export_path])
                     
-                    message = f"数据已成功导出！\n\n"
-                    message += f"导出路径: {export_path}\n"
-                    message += f"文件大小: {file_size:.2f} KB\n"
-                    message += f"导出时间: {current_time}\n"
-                    message += f"体重记录: {len(weight_data)} 条\n"
-                    message += f"日记记录: {len(diary_data)} 条\n\n"
-                    message += "Excel文件包含的工作表:\n"
-                    if not weight_df.empty:
-                        message += "1. 体重记录 - 包含所有体重数据\n"
-                    if not diary_df.empty:
-                        message += "2. 减肥日记 - 包含所有日记数据\n"
                     message += "\n文件正在打开..."
                     self.show_popup("导出成功", message)
                 except Exception as e:
-                    message = f"数据已成功导出！\n\n"
-                    message += f"导出路径: {export_path}\n"
-                    message += f"文件大小: {file_size:.2f} KB\n"
-                    message += f"导出时间: {current_time}\n"
-                    message += f"体重记录: {len(weight_data)} 条\n"
-                    message += f"日记记录: {len(diary_data)} 条\n\n"
-                    message += "Excel文件包含的工作表:\n"
-                    if not weight_df.empty:
-                        message += "1. 体重记录 - 包含所有体重数据\n"
-                    if not diary_df.empty:
-                        message += "2. 减肥日记 - 包含所有日记数据\n"
                     message += f"\n但无法自动打开文件: {str(e)}\n"
                     message += "请手动打开导出文件查看数据。"
                     self.show_popup("导出成功", message)
@@ -1956,7 +4573,7 @@ class WeightTrackerApp(App):
     def show_file_location(self, instance):
         """显示文件位置信息"""
         db_path = self.db.db_path
-        export_path = self.db.get_export_path("weight_data_export.xlsx")
+        export_path = self.db.get_export_path(self.export_filename())
         
         message = "文件位置信息:\n\n"
         message += f"数据库文件: {db_path}\n"
@@ -1968,6 +4585,13 @@ class WeightTrackerApp(App):
         else:
             message += "数据库状态: 尚未创建\n"
         
+        archive = self.db.get_archive_info()
+        if archive:
+            message += f"归档文件: {archive['path']} ({archive['size']} 字节)\n"
+            if archive['archive_before']:
+                message += (f"归档内容: {archive['archive_before']} 之前的体重{archive['weight_count']}条, "
+                            f"日记{archive['diary_count']}条\n")
+        
         if os.path.exists(export_path):
             export_size = os.path.getsize(export_path)
             mod_time = datetime.fromtimestamp(os.path.getmtime(export_path))
@@ -1976,6 +4600,29 @@ class WeightTrackerApp(App):
         else:
             message += "导出文件状态: 尚未导出\n"
         
+        stats = self.db.get_db_stats(limit=3)
+        if stats:
+            message += "\n最近的维护:\n"
+            for entry in stats:
+                integrity = "正常" if entry['integrity'] == 'ok' else entry['integrity']
+                message += (f"{entry['created_at']} 数据库{entry['db_size']}字节, "
+                            f"空闲页{entry['freelist_count']}/{entry['page_count']}, "
+                            f"回收{entry['reclaimed_pages']}页, 完整性: {integrity}\n")
+        else:
+            message += "\n尚未进行数据库维护\n"
+        
+        ledger = self.db.get_import_ledger(limit=3)
+        if ledger:
+            message += "\n最近的导入导出:\n"
+            for entry in ledger:
+                action = "导出" if entry['direction'] == 'export' else "导入"
+                message += (f"{entry['created_at']} {action} {os.path.basename(entry['path'])}: "
+                            f"体重{entry['weight_count']}条, 日记{entry['diary_count']}条")
+                if entry['direction'] != 'export':
+                    message += (f"（当前仍来自该文件: 体重{entry['current_weight_count']}条, "
+                                f"日记{entry['current_diary_count']}条）")
+                message += "\n"
+        
         message += "\n在Android设备上查找文件的方法:\n"
         message += "1. 使用文件管理器应用\n"
         message += "2. 查找应用数据目录\n"
@@ -1983,7 +4630,9 @@ class WeightTrackerApp(App):
         
         self.show_popup("文件位置", message)
     
+    @instrumentation.timed('pipeline.import')
     def import_data(self, instance):
+        """从导出目录中设置的导出文件恢复数据，替换现有的全部数据"""
         Logger.info("开始导入数据操作")
         
         # 检查数据库初始化
@@ -1992,211 +4641,219 @@ class WeightTrackerApp(App):
             self.show_popup("错误", "数据库未初始化，请重启应用")
             return
         
-        # 检查必要的库是否可用
-        if pd is None:
-            Logger.error("导入失败: 系统缺少pandas库")
-            self.show_popup("导入失败", "系统缺少pandas库，无法导入数据")
+        # 获取导入路径
+        import_path = self.db.get_export_path(self.export_filename())
+        self.import_file(import_path, replace=True)
+    
+    def choose_import_file(self, instance):
+        """选择任意Excel、CSV、TSV或JSON文件，合并导入到现有数据中"""
+        from kivy.uix.filechooser import FileChooserListView
+        
+        if not self.db:
+            self.show_popup("错误", "数据库未初始化，请重启应用")
+            return
+        
+        content = BoxLayout(orientation='vertical', spacing=10)
+        chooser = FileChooserListView(
+            path=self.db.get_export_dir(),
+            filters=['*.xlsx', '*.csv', '*.tsv', '*.txt', '*.json', '*.jsonl', '*' + BACKUP_EXTENSION],
+            size_hint_y=0.85
+        )
+        content.add_widget(chooser)
+        
+        button_row = BoxLayout(orientation='horizontal', spacing=10, size_hint_y=0.15)
+        cancel_btn = Button(text='取消', font_size=40)
+        folder_btn = Button(text='导入整个文件夹', font_size=40, background_color=(0.2, 0.6, 0.8, 1))
+        import_btn = Button(text='导入', font_size=40, background_color=(0.2, 0.7, 0.3, 1))
+        button_row.add_widget(cancel_btn)
+        button_row.add_widget(folder_btn)
+        button_row.add_widget(import_btn)
+        content.add_widget(button_row)
+        
+        popup = Popup(title='选择导入文件', content=content, size_hint=(0.95, 0.9))
+        
+        def on_import(*args):
+            if not chooser.selection:
+                return
+            popup.dismiss()
+            self.import_file(chooser.selection[0], replace=False)
+        
+        def on_import_folder(*args):
+            popup.dismiss()
+            self.import_folder(chooser.path)
+        
+        cancel_btn.bind(on_press=popup.dismiss)
+        folder_btn.bind(on_press=on_import_folder)
+        import_btn.bind(on_press=on_import)
+        chooser.bind(on_submit=on_import)
+        popup.open()
+    
+    def import_folder(self, folder):
+        """在后台并行导入文件夹中的全部文件，完成后弹窗汇报每个文件的结果"""
+        if not os.path.isdir(folder) or not os.access(folder, os.R_OK):
+            self.show_popup("导入失败", f"无法读取文件夹:\n{folder}")
             return
         
-        if not openpyxl_available:
-            Logger.error("导入失败: 系统缺少openpyxl库")
-            self.show_popup("导入失败", "系统缺少openpyxl库，无法导入Excel文件")
+        Logger.info(f"开始导入文件夹: {folder}")
+        self.show_popup("正在导入", f"正在后台导入文件夹中的文件，完成后会显示结果。\n{folder}")
+        self.writer.submit('import_folder', import_folder, self.db, folder,
+                           callback=self._on_folder_imported)
+    
+    def _on_folder_imported(self, report):
+        if report is None:
+            self.show_popup("导入失败", "导入文件夹时出错，请查看日志")
+            return
+        if not report['files']:
+            self.show_popup("导入完成", "文件夹中没有可以导入的Excel、CSV、TSV或JSON文件")
             return
         
+        lines = []
+        for item in report['files']:
+            name = os.path.basename(item['path'])
+            if item['status'] == 'skipped':
+                lines.append(f"{name}: 没有变化，已跳过")
+            elif item['status'] == 'failed':
+                lines.append(f"{name}: 导入失败 - {item['errors'][-1] if item['errors'] else '未知错误'}")
+            else:
+                line = f"{name}: {item['weight_count']} 条体重记录, {item['diary_count']} 条日记"
+                if item['errors']:
+                    line += f", 跳过 {len(item['errors'])} 行无效数据"
+                lines.append(line)
+        lines.append(
+            f"\n共导入 {report['weight_count']} 条体重记录和 {report['diary_count']} 条日记，"
+            f"用时 {report['seconds']:.1f} 秒（{report['rows_per_sec']:.0f} 条/秒）"
+        )
+        self.show_popup("导入完成", "\n".join(lines))
+        
+        if report['weight_count'] or report['diary_count']:
+            self.mark_dirty(*self.VIEW_TABS)
+    
+    @instrumentation.timed('pipeline.import_file')
+    def import_file(self, import_path, replace=True):
+        """导入一个文件，格式按文件内容识别
+        
+        Args:
+            import_path: 文件路径
+            replace: True表示替换现有的全部数据（恢复导出文件），False表示与现有数据合并
+        """
         try:
-            # 获取导入路径
-            import_path = self.db.get_export_path("weight_data_export.xlsx")
             Logger.info(f"尝试导入文件: {import_path}")
             
-            if os.path.exists(import_path):
-                # 添加文件存在性和可读性检查
-                try:
-                    # 首先验证文件是否可读
-                    if os.access(import_path, os.R_OK):
-                        # 获取文件信息
-                        file_size = os.path.getsize(import_path) / 1024  # KB
-                        Logger.info(f"文件存在且可读，大小: {file_size:.2f} KB")
-                        
-                        # 读取Excel文件
-                        try:
-                            # 首先检查Excel文件格式
-                            if not import_path.lower().endswith('.xlsx'):
-                                raise ValueError("不支持的文件格式，请使用.xlsx格式的Excel文件")
-                            
-                            # 检查文件是否真的是Excel文件（基本检查）
-                            with open(import_path, 'rb') as f:
-                                header = f.read(8)
-                            # Excel文件的魔术数字检查
-                            if header != b'PK\x03\x04' and header != b'PK\x05\x06' and header != b'PK\x07\x08':
-                                raise ValueError("文件不是有效的Excel文件")
-                            
-                            # 读取体重记录
-                            try:
-                                weight_df = pd.read_excel(import_path, sheet_name='体重记录')
-                                Logger.info("成功读取体重记录表")
-                            except KeyError:
-                                weight_df = pd.DataFrame()  # 创建空DataFrame
-                                Logger.warning("Excel文件中未找到体重记录表")
-                            except Exception as weight_error:
-                                weight_df = pd.DataFrame()
-                                Logger.error(f"读取体重记录表时出错: {str(weight_error)}")
-                            
-                            # 读取日记记录
-                            try:
-                                diary_df = pd.read_excel(import_path, sheet_name='减肥日记')
-                                Logger.info("成功读取减肥日记表")
-                            except KeyError:
-                                diary_df = pd.DataFrame()  # 创建空DataFrame
-                                Logger.warning("Excel文件中未找到减肥日记表")
-                            except Exception as diary_error:
-                                diary_df = pd.DataFrame()
-                                Logger.error(f"读取减肥日记表时出错: {str(diary_error)}")
-                        except ValueError as ve:
-                            Logger.error(f"文件验证错误: {str(ve)}")
-                            self.show_popup("导入失败", f"文件格式错误: {str(ve)}")
-                            return
-                        
-                        # 清理和验证体重记录数据
-                        validated_weight_records = []
-                        if weight_df is not None and not weight_df.empty:
-                            # 验证列是否存在
-                            required_columns = ['日期', '时间类型', '体重(斤)']
-                            if all(col in weight_df.columns for col in required_columns):
-                                Logger.info(f"开始验证体重记录，共 {len(weight_df)} 行数据")
-                                
-                                for _, row in weight_df.iterrows():
-                                    try:
-                                        # 验证日期格式
-                                        date_str = str(row['日期']).strip()
-                                        # 检查时间类型
-                                        weight_type = str(row['时间类型']).strip()
-                                        if weight_type not in ['早晨', '晚上']:
-                                            Logger.warning(f"跳过无效的时间类型: {weight_type}")
-                                            continue
-                                        # 验证体重是否为数字
-                                        weight = float(row['体重(斤)'])
-                                        # 验证体重范围
-                                        if 20 <= weight <= 400:
-                                            validated_weight_records.append([date_str, weight_type, weight])
-                                        else:
-                                            Logger.warning(f"跳过超出范围的体重值: {weight}")
-                                    except (ValueError, TypeError, AttributeError) as e:
-                                        Logger.warning(f"跳过无效的体重记录行: {str(e)}")
-                                        continue  # 跳过无效行
-                                
-                                Logger.info(f"体重记录验证完成，有效记录: {len(validated_weight_records)} 条")
-                            else:
-                                missing_cols = [col for col in required_columns if col not in weight_df.columns]
-                                Logger.error(f"Excel文件格式错误，缺少必要的列: {', '.join(missing_cols)}")
-                                self.show_popup("导入失败", f"Excel文件格式错误，缺少必要的列: {', '.join(missing_cols)}")
-                                return
-                        else:
-                            Logger.info("Excel文件中没有体重记录数据")
-                        
-                        # 清理日记数据
-                        validated_diary_entries = []
-                        if diary_df is not None and not diary_df.empty:
-                            diary_required_columns = ['日期', '饮食记录', '减肥心得']
-                            if all(col in diary_df.columns for col in diary_required_columns):
-                                Logger.info(f"开始验证日记记录，共 {len(diary_df)} 行数据")
-                                
-                                for _, row in diary_df.iterrows():
-                                    try:
-                                        date_str = str(row['日期']).strip()
-                                        food = str(row['饮食记录']) if pd.notna(row['饮食记录']) else ''
-                                        thoughts = str(row['减肥心得']) if pd.notna(row['减肥心得']) else ''
-                                        validated_diary_entries.append([date_str, food, thoughts])
-                                    except (ValueError, TypeError, AttributeError) as e:
-                                        Logger.warning(f"跳过无效的日记记录行: {str(e)}")
-                                        continue  # 跳过无效行
-                                
-                                Logger.info(f"日记记录验证完成，有效记录: {len(validated_diary_entries)} 条")
-                            else:
-                                missing_cols = [col for col in diary_required_columns if col not in diary_df.columns]
-                                Logger.error(f"Excel文件格式错误，缺少必要的日记列: {', '.join(missing_cols)}")
-                                self.show_popup("导入失败", f"Excel文件格式错误，缺少必要的日记列: {', '.join(missing_cols)}")
-                                return
-                        else:
-                            Logger.info("Excel文件中没有日记记录数据")
-                        
-                        # 验证是否有数据要导入
-                        if not validated_weight_records and not validated_diary_entries:
-                            Logger.warning("没有有效的数据可导入")
-                            self.show_popup("导入警告", "Excel文件中没有找到有效的数据记录")
-                            return
-                        
-                        # 构建导入数据
-                        data = {
-                            'weight_records': validated_weight_records,
-                            'diary_entries': validated_diary_entries
-                        }
-                        
-                        # 调用数据库导入方法并处理返回值
-                        Logger.info("开始导入数据到数据库")
-                        success, errors = self.db.import_data(data)
-                        
-                        if success:
-                            # 导入成功
-                            Logger.info("数据导入数据库成功")
-                            # 显示导入统计信息
-                            message = f"Excel数据导入成功！\n\n"
-                            message += f"导入体重记录: {len(validated_weight_records)} 条\n"
-                            message += f"导入日记记录: {len(validated_diary_entries)} 条\n"
-                            if errors:
-                                message += f"\n注意事项: {len(errors)} 条记录有警告\n"
-                                for i, error in enumerate(errors[:5], 1):  # 只显示前5条警告
-                                    message += f"- {error}\n"
-                                if len(errors) > 5:
-                                    message += f"- ...等{len(errors) - 5}条警告\n"
-                            message += "\n数据已更新到系统中。"
-                            self.show_popup("导入成功", message)
-                            
-                            # 更新显示
-                            try:
-                                self.update_records_display()
-                                self.update_statistics()
-                                self.update_chart()
-                                self.update_diary_display()
-                                self.load_today_diary()
-                                Logger.info("成功更新UI显示")
-                            except Exception as ui_error:
-                                Logger.error(f"更新UI显示时出错: {str(ui_error)}")
-                                self.show_popup("警告", "数据导入成功，但更新显示时出错，请手动刷新")
-                        else:
-                            # 导入失败
-                            Logger.error("数据导入数据库失败")
-                            error_message = "数据导入数据库失败\n\n"
-                            if errors:
-                                error_message += "错误详情:\n"
-                                for i, error in enumerate(errors[:5], 1):  # 只显示前5条错误
-                                    error_message += f"- {error}\n"
-                                if len(errors) > 5:
-                                    error_message += f"- ...等{len(errors) - 5}条错误\n"
-                            else:
-                                error_message += "请查看日志获取详细信息"
-                            self.show_popup("导入失败", error_message)
-                    else:
-                        Logger.error(f"无法读取文件，请检查文件权限: {import_path}")
-                        self.show_popup("导入失败", f"无法读取文件，请检查文件权限: {import_path}")
-                except ValueError as ve:
-                    Logger.error(f"Excel文件格式错误: {str(ve)}")
-                    self.show_popup("导入失败", f"Excel文件格式错误: {str(ve)}")
-                except pd.errors.EmptyDataError:
-                    Logger.error("Excel文件为空或格式不正确")
-                    self.show_popup("导入失败", "Excel文件为空或格式不正确")
-                except pd.errors.ParserError:
-                    Logger.error("Excel文件格式错误，无法解析")
-                    self.show_popup("导入失败", "Excel文件格式错误，无法解析")
-                except Exception as e:
-                    Logger.error(f"读取Excel文件时出错: {str(e)}")
-                    self.show_popup("导入失败", f"读取Excel文件时出错: {str(e)}")
-            else:
+            if not os.path.exists(import_path):
                 Logger.error(f"未找到导入文件: {import_path}")
                 self.show_popup("导入失败", f"未找到导入文件:\n{import_path}\n\n请先导出数据再尝试导入。")
+                return
+            
+            # 首先验证文件是否可读
+            if not os.access(import_path, os.R_OK):
+                Logger.error(f"无法读取文件，请检查文件权限: {import_path}")
+                self.show_popup("导入失败", f"无法读取文件，请检查文件权限: {import_path}")
+                return
+            
+            # 获取文件信息
+            file_size = os.path.getsize(import_path) / 1024  # KB
+            Logger.info(f"文件存在且可读，大小: {file_size:.2f} KB")
+            
+            # 文件和数据库自上次导入或导出后都没有变化时，导入不会改变任何数据
+            unchanged, fingerprint = self.db.check_import_file(import_path, replace)
+            if unchanged:
+                Logger.info(f"文件与台账记录一致，跳过导入: {import_path}")
+                action = "导出" if unchanged['direction'] == 'export' else "导入"
+                self.show_popup(
+                    "无需导入",
+                    f"该文件自{unchanged['created_at']}{action}后没有变化，数据库中的数据已是最新，已跳过导入。"
+                )
+                return
+            
+            # 备份文件保留全部字段，总是整体恢复
+            if export_file_format(import_path) == 'backup':
+                self._import_backup(import_path, fingerprint)
+                return
+            
+            # 按文件内容识别格式，逐行读取并分批写入数据库
+            try:
+                file_format, rows = importers.read_rows(import_path)
+            except ValueError as ve:
+                Logger.error(f"导入文件格式错误: {str(ve)}")
+                self.show_popup("导入失败", str(ve))
+                return
+            
+            Logger.info(f"开始导入{file_format}文件到数据库")
+            success, errors, counts = self.db.import_rows(rows, replace=replace, source=fingerprint)
+            
+            if success and counts['weight_records'] == 0 and counts['diary_entries'] == 0:
+                Logger.warning("没有有效的数据可导入")
+                self.show_popup("导入警告", "文件中没有找到有效的数据记录")
+                return
+            
+            if success:
+                # 导入成功
+                Logger.info("数据导入数据库成功")
+                # 显示导入统计信息
+                message = f"{file_format.upper()}数据导入成功！\n\n"
+                message += f"导入体重记录: {counts['weight_records']} 条\n"
+                message += f"导入日记记录: {counts['diary_entries']} 条\n"
+                if errors:
+                    message += f"\n注意事项: {len(errors)} 条记录有警告\n"
+                    for i, error in enumerate(errors[:5], 1):  # 只显示前5条警告
+                        message += f"- {error}\n"
+                    if len(errors) > 5:
+                        message += f"- ...等{len(errors) - 5}条警告\n"
+                message += "\n数据已更新到系统中。"
+                self.show_popup("导入成功", message)
+                
+                # 标记所有视图需要刷新
+                self.mark_dirty(*self.VIEW_TABS)
+            else:
+                # 导入失败
+                Logger.error("数据导入数据库失败")
+                error_message = "数据导入数据库失败，数据库未被修改\n\n"
+                if errors:
+                    error_message += "错误详情:\n"
+                    for i, error in enumerate(errors[-5:], 1):  # 只显示最后5条，最后一条是失败原因
+                        error_message += f"- {error}\n"
+                else:
+                    error_message += "请查看日志获取详细信息"
+                self.show_popup("导入失败", error_message)
         except Exception as e:
             Logger.error(f"导入数据异常: {str(e)}")
             self.show_popup("导入失败", f"发生意外错误: {str(e)}")
     
+    def _import_backup(self, import_path, fingerprint=None):
+        """从备份文件恢复全部数据，边读边写入数据库"""
+        try:
+            header, rows = open_backup(import_path)
+        except ValueError as ve:
+            Logger.error(f"备份文件格式错误: {str(ve)}")
+            self.show_popup("导入失败", str(ve))
+            return
+        
+        Logger.info(f"开始从备份恢复数据，备份时间: {header.get('created_at')}")
+        success, errors, counts = self.db.restore_rows(rows, source=fingerprint)
+        
+        if success:
+            message = "备份数据导入成功！\n\n"
+            message += f"导入体重记录: {counts['weight_records']} 条\n"
+            message += f"导入日记记录: {counts['diary_entries']} 条\n"
+            if errors:
+                message += f"\n注意事项: {len(errors)} 条记录有警告\n"
+                for error in errors[:5]:  # 只显示前5条警告
+                    message += f"- {error}\n"
+                if len(errors) > 5:
+                    message += f"- ...等{len(errors) - 5}条警告\n"
+            message += "\n数据已更新到系统中。"
+            self.show_popup("导入成功", message)
+            
+            # 标记所有视图需要刷新
+            self.mark_dirty(*self.VIEW_TABS)
+        else:
+            error_message = "备份数据导入失败，数据库未被修改\n\n"
+            if errors:
+                error_message += "错误详情:\n"
+                for error in errors[:5]:  # 只显示前5条错误
+                    error_message += f"- {error}\n"
+            self.show_popup("导入失败", error_message)
+    
     def show_instructions(self, instance):
         instructions = """
 使用说明：
@@ -2224,8 +4881,9 @@ class WeightTrackerApp(App):
 - 当天日记可以随时修改
 
 功能五：数据管理
-- 导出数据到Excel文件
-- 从Excel文件导入数据
+- 导出数据到Excel文件或压缩备份文件（在设置中选择格式）
+- 从导出的文件导入数据
+- 从其他文件（Excel、CSV、TSV、JSON）合并导入体重和日记
 - 查看导出文件位置
 - 数据备份和恢复
 
@@ -2278,6 +4936,116 @@ class WeightTrackerApp(App):
         ok_btn.bind(on_press=popup.dismiss)
         popup.open()
     
+    def format_diagnostics(self):
+        """将埋点统计格式化为文本"""
+        metrics = instrumentation.snapshot()
+        status = "已开启" if instrumentation.is_enabled() else "未开启"
+        text = f"性能埋点: {status}\n"
+        if not instrumentation.is_enabled():
+            text += f"可在设置中开启，或设置环境变量 {instrumentation.ENV_VAR}=1\n"
+        text += "\n"
+        
+        if not metrics:
+            return text + "暂无统计数据"
+        
+        for name, summary in metrics.items():
+            text += f"{name}\n"
+            text += f"  次数: {summary['count']}  平均: {summary['mean_ms']:.2f} ms\n"
+            text += f"  p50: {summary['p50_ms']:.2f}  p90: {summary['p90_ms']:.2f}  "
+            text += f"p99: {summary['p99_ms']:.2f}  最大: {summary['max_ms']:.2f} ms\n"
+        return text
+    
+    def dump_diagnostics(self):
+        """将埋点统计写入导出目录下的JSON文件，返回文件路径"""
+        if self.db:
+            dump_path = self.db.get_export_path("performance_profile.json")
+        else:
+            dump_path = os.path.join(self.user_data_dir, "performance_profile.json")
+        return instrumentation.dump_json(dump_path)
+    
+    def show_diagnostics(self, instance):
+        """显示性能诊断窗口"""
+        content = BoxLayout(orientation='vertical', spacing=10)
+        
+        title_label = Label(
+            text="性能诊断",
+            font_size=48,
+            size_hint_y=0.1
+        )
+        content.add_widget(title_label)
+        
+        scroll = ScrollView()
+        metrics_label = Label(
+            text=self.format_diagnostics(),
+            font_size=32,
+            text_size=(550, None),
+            size_hint_y=None,
+            halign='left',
+            valign='top'
+        )
+        metrics_label.bind(size=metrics_label.setter('text_size'))
+        metrics_label.bind(texture_size=lambda instance, value: setattr(metrics_label, 'height', value[1]))
+        scroll.add_widget(metrics_label)
+        content.add_widget(scroll)
+        
+        button_layout = BoxLayout(orientation='horizontal', size_hint_y=0.12, spacing=10)
+        
+        dump_btn = Button(text='导出JSON', font_size=40)
+        reset_btn = Button(text='清空', font_size=40)
+        settings_btn = Button(text='设置', font_size=40)
+        ok_btn = Button(text='确定', font_size=40)
+        for btn in (dump_btn, reset_btn, settings_btn, ok_btn):
+            button_layout.add_widget(btn)
+        content.add_widget(button_layout)
+        
+        popup = Popup(
+            title='',
+            content=content,
+            size_hint=(0.9, 0.9)
+        )
+        
+        def on_dump(btn):
+            try:
+                dump_path = self.dump_diagnostics()
+                self.show_popup("导出成功", f"性能数据已写入:\n{dump_path}")
+            except Exception as e:
+                Logger.error(f"App: 导出性能数据失败 - {str(e)}")
+                self.show_popup("导出失败", f"导出性能数据失败: {str(e)}")
+        
+        def on_reset(btn):
+            instrumentation.reset()
+            metrics_label.text = self.format_diagnostics()
+        
+        def on_settings(btn):
+            popup.dismiss()
+            self.open_settings()
+        
+        dump_btn.bind(on_press=on_dump)
+        reset_btn.bind(on_press=on_reset)
+        settings_btn.bind(on_press=on_settings)
+        ok_btn.bind(on_press=popup.dismiss)
+        popup.open()
+    
+    def on_pause(self):
+        self.flush_diary_autosave()
+        self._maintenance_event.cancel()
+        self.run_maintenance()
+        return True
+    
+    def on_resume(self):
+        # 暂停期间可能在系统设置中修改了存储权限，重新解析导出目录
+        if self.db:
+            self.db.invalidate_export_dir()
+    
+    def on_stop(self):
+        self.flush_diary_autosave()
+        if instrumentation.is_enabled():
+            try:
+                dump_path = self.dump_diagnostics()
+                Logger.info(f"App: 性能数据已写入 {dump_path}")
+            except Exception as e:
+                Logger.error(f"App: 写入性能数据失败 - {str(e)}")
+    
     def show_popup(self, title, message):
         content = BoxLayout(orientation='vertical', spacing=10)
         
@@ -2317,6 +5085,52 @@ class WeightTrackerApp(App):
         
         ok_btn.bind(on_press=popup.dismiss)
         popup.open()
+    
+    def show_confirm(self, title, message, on_confirm):
+        """显示带取消和确认按钮的对话框，点击确认后调用on_confirm()"""
+        content = BoxLayout(orientation='vertical', spacing=10)
+        
+        title_label = Label(
+            text=title,
+            font_size=46,
+            size_hint_y=0.2
+        )
+        content.add_widget(title_label)
+        
+        scroll = ScrollView()
+        message_label = Label(
+            text=message,
+            font_size=42,
+            text_size=(450, None),
+            size_hint_y=None,
+            halign='center',
+            valign='middle'
+        )
+        message_label.bind(size=message_label.setter('text_size'))
+        message_label.bind(texture_size=lambda instance, value: setattr(message_label, 'height', value[1]))
+        scroll.add_widget(message_label)
+        content.add_widget(scroll)
+        
+        button_row = BoxLayout(orientation='horizontal', spacing=10, size_hint_y=0.2)
+        cancel_btn = Button(text='取消', font_size=44)
+        confirm_btn = Button(text='确认保存', font_size=44, background_color=(0.8, 0.4, 0.2, 1))
+        button_row.add_widget(cancel_btn)
+        button_row.add_widget(confirm_btn)
+        content.add_widget(button_row)
+        
+        popup = Popup(
+            title='',
+            content=content,
+            size_hint=(0.8, 0.7)
+        )
+        
+        def confirm(instance):
+            popup.dismiss()
+            on_confirm()
+        
+        cancel_btn.bind(on_press=popup.dismiss)
+        confirm_btn.bind(on_press=confirm)
+        popup.open()
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,405 @@
+"""不需要窗口的体重报告渲染
+
+为一个日期区间生成PNG报告：上半部分是与应用内趋势图相同的折线图（布局由charts.ChartLayout计算，
+包括预测区间），下半部分是统计摘要。批量模式在进程池中为多个数据库文件并行生成报告：
+
+    python reports.py --since 2024/01/01 --until 2024/12/31 --output reports/ a.db b.db
+
+本模块渲染时才导入Pillow；读取数据库的批量模式会导入main（只导入kivy模块，不创建窗口）。
+"""
+import argparse
+import math
+import os
+import time
+from datetime import date
+
+import analytics
+import charts
+import forecast
+import instrumentation
+
+DEFAULT_SIZE = (1080, 900)
+FORECAST_DAYS = 14
+
+# 依次尝试的中文字体，都不存在时使用Pillow的默认字体（无法显示中文）
+FONT_CANDIDATES = (
+    '/system/fonts/NotoSansCJK-Regular.ttc',
+    '/system/fonts/DroidSansFallback.ttf',
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
+    '/usr/share/fonts/wenquanyi/wqy-microhei/wqy-microhei.ttc',
+    '/System/Library/Fonts/PingFang.ttc',
+    'C:/Windows/Fonts/msyh.ttc',
+    'C:/Windows/Fonts/simhei.ttf',
+)
+
+TITLE_FONT_SIZE = 28
+LABEL_FONT_SIZE = 16
+SUMMARY_FONT_SIZE = 26
+SUMMARY_LINE_HEIGHT = 40
+SUMMARY_PADDING = 30
+# 数据点标记的边长，与SimpleChart相同
+POINT_SIZE = 6
+
+
+def _pil():
+    try:
+        from PIL import Image, ImageDraw, ImageFont
+    except ImportError:
+        raise ValueError("系统缺少Pillow库，无法生成PNG报告")
+    return Image, ImageDraw, ImageFont
+
+
+def find_font():
+    """第一个存在的中文字体路径，没有时返回None"""
+    for path in FONT_CANDIDATES:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def load_font(size, font_path=None):
+    _, _, ImageFont = _pil()
+    font_path = font_path or find_font()
+    if font_path:
+        try:
+            return ImageFont.truetype(font_path, size)
+        except OSError:
+            pass
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # Pillow 10.1之前的默认字体不能指定大小
+        return ImageFont.load_default()
+
+
+def _rgba(color, alpha=None):
+    """charts中0到1的颜色转换为Pillow使用的0到255"""
+    red, green, blue, opacity = color
+    opacity = opacity if alpha is None else alpha
+    return tuple(int(round(channel * 255)) for channel in (red, green, blue, opacity))
+
+
+def _dashed_line(draw, points, fill, width, dash, gap):
+    """沿折线画虚线，points为kivy的展开坐标格式"""
+    remaining = dash
+    drawing = True
+    for i in range(0, len(points) - 2, 2):
+        x0, y0, x1, y1 = points[i:i + 4]
+        length = math.hypot(x1 - x0, y1 - y0)
+        position = 0.0
+        while position < length:
+            step = min(remaining, length - position)
+            if drawing:
+                start = position / length
+                end = (position + step) / length
+                draw.line(
+                    [(x0 + (x1 - x0) * start, y0 + (y1 - y0) * start),
+                     (x0 + (x1 - x0) * end, y0 + (y1 - y0) * end)],
+                    fill=fill, width=width,
+                )
+            position += step
+            remaining -= step
+            if remaining <= 0:
+                drawing = not drawing
+                remaining = dash if drawing else gap
+
+
+def render_chart(data_points, labels=None, forecast_band=None, title="体重趋势图",
+                 size=DEFAULT_SIZE, scale=1.0, font_path=None):
+    """按SimpleChart的布局绘制趋势图，返回Pillow的RGB图片
+
+    参数含义与SimpleChart.set_data相同，另外绘制了标题、纵轴刻度和日期标签。
+    数据点间距小于标记的大小时不画数据点标记，只画折线。
+    """
+    Image, ImageDraw, _ = _pil()
+    width, height = size
+    image = Image.new('RGB', size, _rgba(charts.BACKGROUND_COLOR)[:3])
+    # RGBA模式绘制时半透明的颜色与背景混合
+    draw = ImageDraw.Draw(image, 'RGBA')
+    title_font = load_font(int(TITLE_FONT_SIZE * scale), font_path)
+    label_font = load_font(int(LABEL_FONT_SIZE * scale), font_path)
+    text_color = _rgba(charts.TEXT_COLOR)
+
+    draw.text((width / 2, charts.MARGIN_TOP * scale / 2), title, fill=text_color, font=title_font, anchor='mm')
+    if not data_points:
+        draw.text((width / 2, height / 2), "没有数据", fill=text_color, font=title_font, anchor='mm')
+        return image
+
+    labels = labels or [str(i + 1) for i in range(len(data_points))]
+    forecast_band = list(forecast_band or [])
+    min_value, max_value = charts.value_range(data_points, forecast_band)
+    layout = charts.ChartLayout(width, height, len(data_points) + len(forecast_band),
+                                min_value, max_value, scale)
+
+    # charts的纵轴向上，图片的纵轴向下
+    def flip(y):
+        return height - y
+
+    def flip_points(points):
+        return [(points[i], flip(points[i + 1])) for i in range(0, len(points), 2)]
+
+    grid_color = _rgba(charts.GRID_COLOR)
+    for y, value in layout.h_grid():
+        draw.line([(layout.left, flip(y)), (layout.right, flip(y))], fill=grid_color, width=1)
+        draw.text((layout.left - 8 * scale, flip(y)), f"{value:.1f}", fill=text_color, font=label_font, anchor='rm')
+
+    for i in layout.v_grid(len(data_points)):
+        if i < len(labels):
+            x = layout.x(i)
+            draw.line([(x, flip(layout.bottom)), (x, flip(layout.top))], fill=grid_color, width=1)
+            # 标签居中对齐网格线，但不超出图片边缘
+            half = draw.textlength(str(labels[i]), font=label_font) / 2
+            label_x = min(max(x, half), width - half)
+            draw.text((label_x, flip(layout.bottom) + 8 * scale), str(labels[i]), fill=text_color, font=label_font, anchor='ma')
+
+    axis_color = _rgba(charts.AXIS_COLOR)
+    line_width = max(1, int(round(2 * scale)))
+    draw.line([(layout.left, flip(layout.bottom)), (layout.left, flip(layout.top))], fill=axis_color, width=line_width)
+    draw.line([(layout.left, flip(layout.bottom)), (layout.right, flip(layout.bottom))], fill=axis_color, width=line_width)
+
+    if forecast_band and max_value > min_value:
+        edges, center = layout.band(data_points[-1], forecast_band, len(data_points) - 1)
+        outline = [(x, flip(upper)) for x, _, upper in edges] + [(x, flip(lower)) for x, lower, _ in reversed(edges)]
+        draw.polygon(outline, fill=_rgba(charts.LINE_COLOR, charts.BAND_ALPHA))
+        _dashed_line(draw, [value if i % 2 == 0 else flip(value) for i, value in enumerate(center)],
+                     _rgba(charts.LINE_COLOR), max(1, int(round(scale))), 8 * scale, 6 * scale)
+
+    points = flip_points(layout.points(data_points))
+    if len(points) > 1:
+        draw.line(points, fill=_rgba(charts.LINE_COLOR), width=line_width, joint='curve')
+    if layout.step >= POINT_SIZE * scale:
+        point_color = _rgba(charts.POINT_COLOR)
+        half = POINT_SIZE * scale / 2
+        for x, y in points:
+            draw.rectangle([x - half, y - half, x + half, y + half], fill=point_color)
+    return image
+
+
+def report_stats(columns, prediction=None):
+    """区间内的统计摘要
+
+    Args:
+        columns: 区间内数据的analytics.WeightColumns
+        prediction: forecast.TrendModel.forecast的返回值，None表示不包含趋势
+
+    Returns:
+        dict: days、first_date、last_date、all/morning/evening（range_stats的结果或None）、
+              first_weight、last_weight、change、slope_per_week、goal_date；没有数据时返回None
+    """
+    if not len(columns):
+        return None
+    first_weight = columns.primary(0)
+    last_weight = columns.primary(len(columns) - 1)
+    stats = {
+        'days': len(columns),
+        'first_date': analytics.from_ordinal(columns.days[0]),
+        'last_date': analytics.from_ordinal(columns.days[-1]),
+        'all': columns.range_stats(),
+        'morning': columns.range_stats(series='morning'),
+        'evening': columns.range_stats(series='evening'),
+        'first_weight': first_weight,
+        'last_weight': last_weight,
+        'change': last_weight - first_weight,
+        'slope_per_week': None,
+        'goal_date': None,
+    }
+    if prediction:
+        stats['slope_per_week'] = prediction['robust_slope'] * 7
+        if prediction['goal_day'] is not None:
+            stats['goal_date'] = analytics.from_ordinal(prediction['goal_day'])
+    return stats
+
+
+def summary_lines(stats, goal_weight=None):
+    """把report_stats的结果整理成报告中的文字"""
+    if stats is None:
+        return ["区间内没有体重记录"]
+    lines = [f"日期区间: {stats['first_date']} - {stats['last_date']}（{stats['days']} 天有记录）"]
+    for key, name in (('morning', '早晨'), ('evening', '晚上')):
+        part = stats[key]
+        if part:
+            lines.append(f"{name}体重: 平均 {part['mean']:.1f} 斤, 最低 {part['min']:.1f}, "
+                         f"最高 {part['max']:.1f}（{part['count']} 次）")
+    lines.append(f"区间变化: {stats['first_weight']:.1f} → {stats['last_weight']:.1f} 斤"
+                 f"（{stats['change']:+.1f}）")
+    if stats['slope_per_week'] is not None:
+        lines.append(f"近期趋势: 每周 {stats['slope_per_week']:+.2f} 斤")
+    if goal_weight and stats['goal_date']:
+        lines.append(f"预计 {stats['goal_date']} 达到目标体重 {goal_weight:g} 斤")
+    return lines
+
+
+def render_summary(lines, width, scale=1.0, font_path=None):
+    """把摘要文字绘制成与趋势图同宽的图片"""
+    Image, ImageDraw, _ = _pil()
+    padding = SUMMARY_PADDING * scale
+    line_height = SUMMARY_LINE_HEIGHT * scale
+    image = Image.new('RGB', (width, int(padding * 2 + line_height * len(lines))), _rgba(charts.BACKGROUND_COLOR)[:3])
+    draw = ImageDraw.Draw(image)
+    font = load_font(int(SUMMARY_FONT_SIZE * scale), font_path)
+    for index, line in enumerate(lines):
+        draw.text((charts.MARGIN_LEFT * scale, padding + line_height * index), line,
+                  fill=_rgba(charts.TEXT_COLOR), font=font)
+    return image
+
+
+@instrumentation.timed('report.render_report')
+def render_report(db, output_path, since=None, until=None, goal_weight=None,
+                  size=DEFAULT_SIZE, scale=1.0, font_path=None):
+    """为日期区间 [since, until] 生成PNG报告
+
+    趋势图按天绘制代表体重（优先早晨），与应用内的早晨体重趋势图一致；
+    until为None（区间包含最新数据）时在数据之后绘制预测区间。
+
+    Args:
+        db: WeightDatabase实例，统计是否排除异常记录跟随db.exclude_flagged
+        output_path: PNG文件路径
+
+    Returns:
+        dict: path、stats（见report_stats）、seconds
+    """
+    Image, _, _ = _pil()
+    start = time.perf_counter()
+    columns = analytics.WeightColumns.from_daily(
+        ((day, morning, evening, morning_flagged, evening_flagged)
+         for day, morning, evening, _, morning_flagged, evening_flagged
+         in db.iter_daily_weights(since, until)),
+        exclude_flagged=db.exclude_flagged,
+    )
+
+    data_points = []
+    labels = []
+    for index in range(len(columns)):
+        value = columns.primary(index)
+        if value is not None:
+            data_points.append(value)
+            labels.append(analytics.from_ordinal(columns.days[index]))
+
+    prediction = None
+    forecast_band = None
+    if len(columns):
+        prediction = forecast.TrendModel.from_columns(columns).forecast(goal_weight, FORECAST_DAYS)
+        if prediction and until is None:
+            forecast_band = [point[1:] for point in prediction['band']]
+
+    stats = report_stats(columns, prediction)
+    chart = render_chart(data_points, labels, forecast_band, "体重趋势图", size, scale, font_path)
+    summary = render_summary(summary_lines(stats, goal_weight), size[0], scale, font_path)
+
+    report = Image.new('RGB', (size[0], chart.height + summary.height), _rgba(charts.BACKGROUND_COLOR)[:3])
+    report.paste(chart, (0, 0))
+    report.paste(summary, (0, chart.height))
+    directory = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(directory, exist_ok=True)
+    report.save(output_path, 'PNG', optimize=False)
+
+    return {
+        'path': output_path,
+        'stats': stats,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def _render_file(job):
+    """在工作进程中打开一个数据库文件并生成报告"""
+    import main
+
+    db_path, output_path, since, until, goal_weight, size, exclude_flagged = job
+    if not os.path.isfile(db_path):
+        # WeightDatabase会为不存在的路径创建新数据库
+        raise ValueError(f"数据库文件不存在: {db_path}")
+    start = time.perf_counter()
+    db = main.WeightDatabase(db_path=db_path)
+    db.exclude_flagged = exclude_flagged
+    result = render_report(db, output_path, since, until, goal_weight, size)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def _output_paths(db_paths, output_dir):
+    """每个数据库对应的报告文件名，不同目录下的同名数据库加序号区分"""
+    used = set()
+    paths = []
+    for db_path in db_paths:
+        stem = os.path.splitext(os.path.basename(db_path))[0]
+        name = f"{stem}-report.png"
+        counter = 2
+        while name in used:
+            name = f"{stem}-{counter}-report.png"
+            counter += 1
+        used.add(name)
+        paths.append(os.path.join(output_dir, name))
+    return paths
+
+
+def render_reports(db_paths, output_dir, since=None, until=None, goal_weight=None,
+                   size=DEFAULT_SIZE, exclude_flagged=False, max_workers=None):
+    """为多个数据库文件并行生成报告
+
+    每个报告在单独的工作进程中打开数据库并渲染，一个文件失败不影响其他文件；
+    平台不支持多进程时顺序生成。
+
+    Returns:
+        dict: reports（每个数据库的 db_path、path、status、seconds、stats 或 error）、seconds、reports_per_sec
+    """
+    import main
+
+    start = time.perf_counter()
+    jobs = [
+        (db_path, output_path, since, until, goal_weight, tuple(size), exclude_flagged)
+        for db_path, output_path in zip(db_paths, _output_paths(db_paths, output_dir))
+    ]
+    results = []
+    for job, result in zip(jobs, main.parallel_results(_render_file, jobs, max_workers)):
+        if isinstance(result, Exception):
+            results.append({'db_path': job[0], 'path': job[1], 'status': 'failed', 'error': str(result)})
+        else:
+            results.append(dict(result, db_path=job[0], status='rendered'))
+
+    seconds = time.perf_counter() - start
+    return {
+        'reports': results,
+        'seconds': seconds,
+        'reports_per_sec': len(results) / seconds if seconds > 0 else 0.0,
+    }
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='为一个或多个数据库文件生成PNG体重报告')
+    parser.add_argument('databases', nargs='+', help='数据库文件路径')
+    parser.add_argument('--output', default='reports', help='报告输出目录')
+    parser.add_argument('--since', help='起始日期（包含），如 2024/01/01')
+    parser.add_argument('--until', help='结束日期（包含），不指定时绘制预测区间')
+    parser.add_argument('--days', type=int, help='只包含最近的天数，与--since同时指定时忽略')
+    parser.add_argument('--goal', type=float, help='目标体重（斤）')
+    parser.add_argument('--size', type=int, nargs=2, default=DEFAULT_SIZE, metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--exclude-flagged', action='store_true', help='统计和趋势图排除标记为异常的记录')
+    parser.add_argument('--workers', type=int, help='工作进程数，默认按CPU核数，1表示顺序生成')
+    args = parser.parse_args(argv)
+
+    # 无界面运行：kivy不解析命令行参数，不输出日志
+    os.environ.setdefault('KIVY_NO_ARGS', '1')
+    os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+    since = args.since
+    if since is None and args.days:
+        since = date.fromordinal(date.today().toordinal() - args.days + 1)
+
+    result = render_reports(args.databases, args.output, since, args.until, args.goal,
+                            args.size, args.exclude_flagged, args.workers)
+    for item in result['reports']:
+        if item['status'] == 'failed':
+            print(f"{item['db_path']}: 失败 - {item['error']}")
+        else:
+            days = item['stats']['days'] if item['stats'] else 0
+            print(f"{item['db_path']}: {item['path']}（{days} 天, {item['seconds'] * 1000.0:.0f} ms）")
+    print(f"共 {len(result['reports'])} 份报告, 用时 {result['seconds']:.2f} 秒"
+          f"（{result['reports_per_sec']:.1f} 份/秒）")
+    if find_font() is None:
+        print("警告: 没有找到中文字体，报告中的中文无法正常显示")
+
+
+if __name__ == '__main__':
+    main_cli()
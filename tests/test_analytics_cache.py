@@ -0,0 +1,51 @@
+"""列式缓存的增量更新和失效"""
+import os
+import sqlite3
+
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+os.environ.setdefault('KIVY_NO_FILELOG', '1')
+
+import main
+
+
+def _foreign_insert(db, date_str, weight):
+    conn = sqlite3.connect(db.db_path)
+    conn.execute("INSERT INTO weight_records (date, weight_type, weight) VALUES (?, 'morning', ?)",
+                 (date_str, weight))
+    conn.commit()
+    conn.close()
+
+
+def test_own_write_updates_cache_in_place(tmp_path):
+    db = main.WeightDatabase(db_path=str(tmp_path / 'weight_data.db'))
+    db.add_weight_record('2024/01/01', 'morning', 150)
+    columns = db.get_analytics()
+    db.add_weight_record('2024/01/02', 'morning', 151)
+    assert db.get_analytics() is columns
+    assert columns.chart_data(10)['labels'] == ['2024/01/01', '2024/01/02']
+
+
+def test_foreign_write_before_ours_drops_cache(tmp_path):
+    db = main.WeightDatabase(db_path=str(tmp_path / 'weight_data.db'))
+    db.add_weight_record('2024/01/01', 'morning', 150)
+    db.get_analytics()
+    _foreign_insert(db, '2024/01/02', 151)
+    db.add_weight_record('2024/01/03', 'morning', 152)
+    assert db.get_analytics().chart_data(10)['labels'] == ['2024/01/01', '2024/01/02', '2024/01/03']
+
+
+def test_foreign_write_right_after_our_commit_drops_cache(tmp_path):
+    db = main.WeightDatabase(db_path=str(tmp_path / 'weight_data.db'))
+    db.add_weight_record('2024/01/01', 'morning', 150)
+    db.get_analytics()
+    write_with_retry = db._write_with_retry
+
+    def commit_then_foreign_write(write, description):
+        success = write_with_retry(write, description)
+        _foreign_insert(db, '2024/01/03', 152)
+        return success
+
+    db._write_with_retry = commit_then_foreign_write
+    db.add_weight_record('2024/01/02', 'morning', 151)
+    assert db.get_analytics().chart_data(10)['labels'] == ['2024/01/01', '2024/01/02', '2024/01/03']
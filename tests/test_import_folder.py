@@ -0,0 +1,48 @@
+"""import_folder的台账跳过逻辑
+
+    python -m pytest tests
+"""
+import os
+
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+os.environ.setdefault('KIVY_NO_FILELOG', '1')
+
+import main
+
+
+def _write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write('日期,时间类型,体重(斤)\n')
+        for row in rows:
+            f.write(','.join(row) + '\n')
+
+
+def test_unchanged_files_are_skipped_on_second_run(tmp_path):
+    folder = tmp_path / 'folder'
+    folder.mkdir()
+    _write_csv(folder / 'a.csv', [('2024/01/01', '早晨', '150'), ('2024/01/02', '早晨', '149.5')])
+    _write_csv(folder / 'b.csv', [('2024/01/03', '晚上', '151')])
+    _write_csv(folder / 'c.csv', [('2024/01/04', '早晨', '148.8')])
+    db = main.WeightDatabase(db_path=str(tmp_path / 'weight_data.db'))
+
+    first = main.import_folder(db, str(folder), max_workers=1)
+    assert [item['status'] for item in first['files']] == ['imported'] * 3
+
+    for _ in range(2):
+        report = main.import_folder(db, str(folder), max_workers=1)
+        assert [item['status'] for item in report['files']] == ['skipped'] * 3
+        assert report['weight_count'] == 0
+
+
+def test_changed_file_is_imported_again(tmp_path):
+    folder = tmp_path / 'folder'
+    folder.mkdir()
+    _write_csv(folder / 'a.csv', [('2024/01/01', '早晨', '150')])
+    _write_csv(folder / 'b.csv', [('2024/01/02', '早晨', '149')])
+    db = main.WeightDatabase(db_path=str(tmp_path / 'weight_data.db'))
+    main.import_folder(db, str(folder), max_workers=1)
+
+    _write_csv(folder / 'b.csv', [('2024/01/02', '早晨', '148')])
+    report = main.import_folder(db, str(folder), max_workers=1)
+    assert [item['status'] for item in report['files']] == ['skipped', 'imported']
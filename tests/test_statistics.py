@@ -0,0 +1,27 @@
+"""列式缓存不可用时SQL统计与缓存统计一致"""
+import os
+
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+os.environ.setdefault('KIVY_NO_FILELOG', '1')
+
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize('exclude_flagged', [False, True])
+def test_sql_fallback_matches_cache(tmp_path, exclude_flagged):
+    db = main.WeightDatabase(db_path=str(tmp_path / 'weight_data.db'))
+    db.add_weight_record('2024/01/01', 'morning', 150)
+    db.add_weight_record('2024/01/02', 'morning', 149)
+    db.add_weight_record('2024/01/02', 'evening', 190, flagged=True)
+    db.add_weight_record('2024/01/03', 'morning', 148)
+    db.set_exclude_flagged(exclude_flagged)
+
+    cached = (db.get_weight_statistics(), db.range_stats('2024/01/01', '2024/01/03'))
+    db.get_analytics = lambda: None
+    fallback = (db.get_weight_statistics(), db.range_stats('2024/01/01', '2024/01/03'))
+
+    assert fallback == cached
+    assert (cached[0]['heaviest_weight'] == 150) == exclude_flagged
@@ -0,0 +1,42 @@
+"""导入行校验"""
+import os
+
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+os.environ.setdefault('KIVY_NO_FILELOG', '1')
+
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2024/01/07', '2024/01/07'),
+    ('2024.1.7', '2024/01/07'),
+    ('2024-01-07 07:30', '2024/01/07'),
+    ('01/06/2024', '2024/06/01'),
+    (45000, '2023/03/15'),
+])
+def test_valid_dates(value, expected):
+    assert main.validate_weight_row((value, '早晨', 150))[0] == expected
+    assert main.validate_diary_row((value, '', ''))[0] == expected
+
+
+@pytest.mark.parametrize('value', ['garbage', '2099/01/01', '01/13/2024', '', None])
+def test_invalid_dates_are_rejected(value):
+    with pytest.raises(ValueError):
+        main.validate_weight_row((value, '早晨', 150))
+    with pytest.raises(ValueError):
+        main.validate_diary_row((value, '', ''))
+
+
+def test_invalid_dates_land_in_error_report(tmp_path):
+    db = main.WeightDatabase(db_path=str(tmp_path / 'weight_data.db'))
+    success, errors, counts = db.import_rows(
+        [('weight_records', ('garbage', '早晨', 150)), ('weight_records', ('2024/01/07', '早晨', 151))],
+        replace=False,
+    )
+    assert success
+    assert counts['weight_records'] == 1
+    assert len(errors) == 1
+    assert db.get_records_page(limit=10)[0][1] == '2024/01/07'